@@ -1,33 +1,44 @@
 from aws_cdk import Stack, CfnOutput, Duration
-from aws_cdk import aws_lambda as _lambda
 import aws_cdk.aws_s3 as s3
-from aws_cdk import aws_events as events
-from aws_cdk import aws_events_targets as targets
-from aws_cdk import aws_iam as iam
 import aws_cdk.aws_s3_notifications as s3_notifications
-from aws_cdk import aws_sns as sns
-import aws_cdk as cdk
 
 
 from stack.lambda_functions import (
+    add_submission_worker_source,
+    chat_environment,
+    chat_stream_environment,
+    create_lambda_function,
     create_lambda_role,
-    test_batch_video_chat_lambda_function,
-    test_batch_video_execution_lambda_function,
-    test_batch_video_transcript_lambda_function,
-    test_get_status_by_id_lambda_function,
-    test_events_lambda_function
+    create_shared_layer,
+    events_environment,
+    execution_environment,
+    execution_worker_environment,
+    performance_profile,
+    sdk_pandas_layer,
+    status_environment,
+    status_indexer_environment,
+    transcript_environment,
+    web_adapter_layer
 )
 
 # API Gateway
 from stack.api_gateway import (
-    build_batch_chat_testing_api_gateway
+    build_batch_chat_testing_api_gateway,
+    build_batch_chat_stream_url
 )
 
 # Tables
 from stack.table import (
-    get_inference_setting_table
+    get_inference_setting_table,
+    create_execution_status_table
 )
 
+# Queues
+from stack.queue import create_submission_queue
+
+# Bucket the lambdas cache chunks and transcripts in, unless cdk.json names another
+DEFAULT_CACHE_BUCKET_NAME = "cache-us-east-1-054037105643-15bd31e070bd"
+
 class BatchTestingCdkStack(Stack):
 
     def __init__(self, scope, construct_id: str, **kwargs) -> None:
@@ -37,21 +48,88 @@ class BatchTestingCdkStack(Stack):
         lambda_role = create_lambda_role(self)
         
         # Create the Layer once
-        pandas_layer = _lambda.LayerVersion.from_layer_version_arn(
-            self, "AWSSDKPandasLayer",
-            "arn:aws:lambda:us-east-1:336392948345:layer:AWSSDKPandas-Python312:16"
-        )
+        shared_layer = create_shared_layer(self)
         
         #tables
         inference_table=get_inference_setting_table(self)
+        status_table = create_execution_status_table(self)
+
+        # memory, architecture, storage, concurrency and timeout per function, from cdk.json
+        chat_profile = performance_profile(self, "chat")
+        chat_stream_profile = performance_profile(self, "chat_stream")
+        execution_profile = performance_profile(self, "execution")
+        execution_worker_profile = performance_profile(self, "execution_worker")
+        transcript_profile = performance_profile(self, "transcript")
+        status_profile = performance_profile(self, "status")
+        status_indexer_profile = performance_profile(self, "status_indexer")
+        events_profile = performance_profile(self, "events")
+
+        # the worker runs as many submissions at once as the GPU backend can take, unless its profile says otherwise
+        max_concurrency = int(self.node.try_get_context("max_concurrency") or 4)
+        if execution_worker_profile['reserved_concurrency'] is None:
+            execution_worker_profile['reserved_concurrency'] = max_concurrency
+
+        #queues
+        submission_queue, submission_dlq = create_submission_queue(self, Duration.seconds(execution_worker_profile['timeout_secs']))
 
         
         #actual lambda called by lambda function
-        batch_video_chat_test_lambda= test_batch_video_chat_lambda_function(self,"BatchVideTestChatLambda", "batch-video-chat-testing", lambda_role, inference_table)
-        batch_video_execution_test_lambda = test_batch_video_execution_lambda_function(self,"BatchVideoTestExecutionLambda", "batch-video-execution-testing", lambda_role, pandas_layer, inference_table)
-        batch_video_transcript_test_lambda= test_batch_video_transcript_lambda_function(self, "BatchVideoTestTranscriptLambda", "batch-video-transcript-testing",lambda_role, inference_table )
-        batch_video_get_status_by_id_test_lambda = test_get_status_by_id_lambda_function(self, "BatchVideoGetStatusByIdTestLambda", "batch-video-get-status-by-id-test", lambda_role, inference_table )
-        events_config_test_lambda = test_events_lambda_function(self,"EventsConfigsTestLambda","events-configs-test",lambda_role)
+        batch_video_chat_test_lambda = create_lambda_function(
+            self, "BatchVideTestChatLambda", "batch-video-chat-testing", lambda_role, chat_profile,
+            environment=chat_environment(inference_table),
+            layers=[shared_layer]
+        )
+        batch_video_chat_stream_test_lambda = create_lambda_function(
+            self, "BatchVideoTestChatStreamLambda", "batch-video-chat-testing", lambda_role, chat_stream_profile,
+            environment=chat_stream_environment(inference_table),
+            layers=[shared_layer, web_adapter_layer(self, "BatchVideoTestChatStreamLambda", chat_stream_profile['architecture'])],
+            handler="run.sh"
+        )
+        batch_video_execution_test_lambda = create_lambda_function(
+            self, "BatchVideoTestExecutionLambda", "batch-video-execution-testing", lambda_role, execution_profile,
+            environment=execution_environment(inference_table, submission_queue),
+            layers=[sdk_pandas_layer(self, execution_profile['architecture']), shared_layer]
+        )
+        batch_video_execution_worker_test_lambda = create_lambda_function(
+            self, "BatchVideoTestExecutionWorkerLambda", "batch-video-execution-testing", lambda_role, execution_worker_profile,
+            environment=execution_worker_environment(inference_table),
+            layers=[sdk_pandas_layer(self, execution_worker_profile['architecture']), shared_layer],
+            handler="batch-video-execution-testing.worker_handler"
+        )
+        batch_video_transcript_test_lambda = create_lambda_function(
+            self, "BatchVideoTestTranscriptLambda", "batch-video-transcript-testing", lambda_role, transcript_profile,
+            environment=transcript_environment(inference_table),
+            layers=[shared_layer]
+        )
+        batch_video_get_status_by_id_test_lambda = create_lambda_function(
+            self, "BatchVideoGetStatusByIdTestLambda", "batch-video-get-status-by-id-test", lambda_role, status_profile,
+            environment=status_environment(inference_table, status_table),
+            layers=[shared_layer]
+        )
+        status_indexer_test_lambda = create_lambda_function(
+            self, "BatchVideoStatusIndexerTestLambda", "batch-video-status-indexer", lambda_role, status_indexer_profile,
+            environment=status_indexer_environment(status_table),
+            layers=[shared_layer]
+        )
+        events_config_test_lambda = create_lambda_function(
+            self, "EventsConfigsTestLambda", "events-configs-test", lambda_role, events_profile,
+            environment=events_environment(inference_table),
+            layers=[shared_layer]
+        )
+
+        # queued submissions reach the backend only through the worker
+        submission_queue.grant_send_messages(batch_video_execution_test_lambda)
+        add_submission_worker_source(batch_video_execution_worker_test_lambda, submission_queue, execution_worker_profile['reserved_concurrency'])
+        
+        # index chunk arrivals in the cache bucket so status polls are a single query
+        cache_bucket_name = self.node.try_get_context("cache_bucket_name") or DEFAULT_CACHE_BUCKET_NAME
+        cache_bucket = s3.Bucket.from_bucket_name(self, "CacheBucket", cache_bucket_name)
+        for suffix in (".mp4", ".json", ".json.gz"):
+            cache_bucket.add_event_notification(
+                s3.EventType.OBJECT_CREATED,
+                s3_notifications.LambdaDestination(status_indexer_test_lambda),
+                s3.NotificationKeyFilter(prefix="batch-videos/", suffix=suffix)
+            )
         
         #lambda attached to apigateway
         api= build_batch_chat_testing_api_gateway(
@@ -60,8 +138,18 @@ class BatchTestingCdkStack(Stack):
             batch_video_execution_test_lambda,
             batch_video_transcript_test_lambda,
             batch_video_get_status_by_id_test_lambda,
-            events_config_test_lambda
+            events_config_test_lambda,
+            cache_settings=self.node.try_get_context("api_cache"),
+            min_compression_bytes=self.node.try_get_context("api_min_compression_bytes"),
+            binary_media_types=self.node.try_get_context("api_binary_media_types")
         )
          
         CfnOutput(self, "BatchVideoTestUrl", value=api.url)
+
+        # streamed chat answers, served next to the buffered /batch-video-chat-test route
+        chat_stream_url = build_batch_chat_stream_url(batch_video_chat_stream_test_lambda)
+        CfnOutput(self, "BatchVideoChatStreamTestUrl", value=chat_stream_url.url)
+
+        # queued submissions that failed every retry
+        CfnOutput(self, "BatchVideoSubmissionDLQUrl", value=submission_dlq.queue_url)
          
@@ -0,0 +1,185 @@
+"""Offline cold-start benchmark for the batch-video lambdas.
+
+Each scenario runs in a fresh interpreter, as a new Lambda container would, against the
+in-memory fakes in fake_aws.py. It records:
+
+  init_ms            importing the handler module (everything Lambda runs during init)
+  init_clients       boto3 clients/resources constructed during init, including by threads
+                     init starts (such as the inference-settings prefetch)
+  first_invoke_ms    the first handler call, including any lazily built clients
+
+Construction of each fake client sleeps --client-cost-ms to stand in for boto3's own
+client setup, so eager clients show up in init_ms the way they do in a real cold start.
+
+    python benchmarks/cold_start.py                     # compare against the baseline
+    python benchmarks/cold_start.py --update-baseline   # record a new baseline
+
+Exits 1 when a scenario's median exceeds baseline * (1 + --tolerance) + --slack-ms, or
+constructs more clients during init than its baseline allows.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, 'cold_start_baseline.json')
+
+VIDEO_ID = 'bench-video'
+EXECUTION_ID = 'bench-execution'
+
+# Scenario -> handler benchmark name; the only client built in init is the settings prefetch's
+SCENARIOS = {
+    'chat_greeting': 'chat',
+    'chat_question': 'chat',
+    'execution_async': 'execution',
+    'execution_sync': 'execution',
+    'transcript': 'transcript',
+    'status': 'status',
+    'status_indexer': 'status_indexer',
+    'events_config': 'events',
+}
+
+
+def scenario_event(scenario, aws):
+    import handlers
+    from fake_aws import seed_execution
+
+    bucket = aws.settings['cache_bucket']
+    keys = seed_execution(aws, bucket, VIDEO_ID, EXECUTION_ID, chunk_count=10)
+    aws.put(handlers.EVENTS_BUCKET, handlers.EVENTS_KEY, json.dumps({'events': ['parked car', 'fire']}))
+    return {
+        'chat_greeting': lambda: handlers.chat_event(VIDEO_ID, EXECUTION_ID, 'hello'),
+        'chat_question': lambda: handlers.chat_event(VIDEO_ID, EXECUTION_ID, 'What happens near the gate?'),
+        'execution_async': lambda: handlers.execution_event(VIDEO_ID, 'async', chunk_count=10),
+        'execution_sync': lambda: handlers.execution_event(VIDEO_ID, 'sync', chunk_count=10),
+        'transcript': lambda: handlers.transcript_event(VIDEO_ID, EXECUTION_ID),
+        'status': lambda: handlers.status_event(VIDEO_ID, EXECUTION_ID),
+        'status_indexer': lambda: handlers.indexer_event(bucket, keys[0]),
+        'events_config': handlers.events_config_event,
+    }[scenario]()
+
+
+def run_child(scenario, client_cost_ms):
+    """Measure one cold start in this (fresh) process and print the result as JSON."""
+    sys.path.insert(0, BENCH_DIR)
+    import fake_aws
+    import handlers
+
+    os.environ.update(handlers.environment())
+    # A fresh spill directory, so chat's disk cache from an earlier run cannot make the cold call warm
+    os.environ['VIDEO_CONTEXT_SPILL_DIR'] = tempfile.mkdtemp(prefix='bench-video-context-')
+    aws = fake_aws.install(fake_aws.FakeAWS(client_cost_ms=client_cost_ms))
+
+    started = time.perf_counter()
+    _, handler = handlers.load_handler(SCENARIOS[scenario])
+    init_ms = (time.perf_counter() - started) * 1000
+    # Lambda does not wait for threads started during init, so neither does init_ms, but the
+    # clients they build still count against init
+    init_threads = [thread for thread in threading.enumerate() if thread is not threading.main_thread()]
+    constructed_in_init = len(aws.constructed)
+
+    event = scenario_event(scenario, aws)
+    started = time.perf_counter()
+    response = handler(event, None)
+    first_invoke_ms = (time.perf_counter() - started) * 1000
+
+    for thread in init_threads:
+        thread.join(timeout=10)
+    init_thread_names = {thread.name for thread in init_threads}
+    init_clients = constructed_in_init + sum(
+        1 for _, _, thread in aws.constructed[constructed_in_init:] if thread in init_thread_names
+    )
+
+    status = response.get('statusCode') if isinstance(response, dict) else None
+    print(json.dumps({
+        'init_ms': round(init_ms, 2),
+        'init_clients': init_clients,
+        'first_invoke_ms': round(first_invoke_ms, 2),
+        'status_code': status,
+        'calls': dict(aws.calls)
+    }))
+
+
+def measure(scenario, runs, client_cost_ms):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', scenario, '--client-cost-ms', str(client_cost_ms)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'init_ms': round(statistics.median(s['init_ms'] for s in samples), 2),
+        'init_clients': max(s['init_clients'] for s in samples),
+        'first_invoke_ms': round(statistics.median(s['first_invoke_ms'] for s in samples), 2),
+        'status_code': samples[-1]['status_code'],
+        'calls': samples[-1]['calls']
+    }
+
+
+def regressions(results, baseline, tolerance, slack_ms):
+    found = []
+    for scenario, result in results.items():
+        expected = baseline.get('scenarios', {}).get(scenario)
+        if not expected:
+            continue
+        for metric in ('init_ms', 'first_invoke_ms'):
+            limit = expected[metric] * (1 + tolerance) + slack_ms
+            if result[metric] > limit:
+                found.append(f"{scenario}.{metric}: {result[metric]:.1f} ms > {limit:.1f} ms")
+        if result['init_clients'] > expected['init_clients']:
+            found.append(f"{scenario}.init_clients: {result['init_clients']} > {expected['init_clients']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument('--runs', type=int, default=5, help="Cold starts per scenario; the median is reported")
+    parser.add_argument('--client-cost-ms', type=float, default=50.0, help="Simulated cost of constructing one client")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Allowed relative slowdown against the baseline")
+    parser.add_argument('--slack-ms', type=float, default=25.0, help="Absolute allowance added to every threshold")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.client_cost_ms)
+        return 0
+
+    results = {}
+    for scenario in args.scenario or SCENARIOS:
+        results[scenario] = measure(scenario, args.runs, args.client_cost_ms)
+        result = results[scenario]
+        print(f"{scenario:<18} init {result['init_ms']:>8.1f} ms  clients {result['init_clients']}  "
+              f"first invoke {result['first_invoke_ms']:>8.1f} ms  -> {result['status_code']}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'client_cost_ms': args.client_cost_ms, 'scenarios': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Wrote {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline first")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('client_cost_ms') != args.client_cost_ms:
+        print(f"Baseline was recorded with --client-cost-ms {baseline.get('client_cost_ms')}; thresholds may not apply")
+    found = regressions(results, baseline, args.tolerance, args.slack_ms)
+    for line in found:
+        print(f"REGRESSION {line}")
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""In-memory stand-ins for boto3, botocore and requests, used by the offline benchmarks.
+
+install() registers fake modules in sys.modules before a handler is imported, so the
+handlers run unmodified without network access or AWS credentials. Every downstream call
+is counted per "service.operation", can be delayed by an injected latency, and client
+construction can be given a simulated cost.
+"""
+import gzip
+import hashlib
+import json
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_SETTINGS = {
+    'inference_setting_id': '1',
+    # The chat handler only accepts s3_dest_uri_w_prefix under this bucket
+    'cache_bucket': 'cache-us-east-1-054037105643-15bd31e070bd',
+    'inference_endpoint': 'http://inference.invalid/process_video'
+}
+
+
+class FakeAWS:
+    """Shared state behind every fake client: objects, tables, queues and call accounting."""
+
+    def __init__(self, latency=None, client_cost_ms=0.0, settings=None):
+        # latency maps "service.operation" (or just "service") to seconds per call
+        self.latency = dict(latency or {})
+        self.client_cost_ms = client_cost_ms
+        self.settings = dict(settings or DEFAULT_SETTINGS)
+        self.objects = {}
+        self.tables = {}
+        self.messages = []
+        self.calls = Counter()
+        self.constructed = []
+        self.lock = threading.Lock()
+
+    def call(self, service, operation):
+        with self.lock:
+            self.calls[f"{service}.{operation}"] += 1
+        delay = self.latency.get(f"{service}.{operation}", self.latency.get(service, 0))
+        if delay:
+            time.sleep(delay)
+
+    def construct(self, kind, service):
+        with self.lock:
+            self.constructed.append((kind, service, threading.current_thread().name))
+        if self.client_cost_ms:
+            time.sleep(self.client_cost_ms / 1000)
+
+    def put(self, bucket, key, body, last_modified=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        with self.lock:
+            self.objects.setdefault(bucket, {})[key] = {
+                'Body': body,
+                'ETag': etag,
+                'LastModified': last_modified or datetime.now(timezone.utc)
+            }
+        return etag
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+
+
+class ClientError(Exception):
+    def __init__(self, error_response, operation_name):
+        self.response = error_response
+        self.operation_name = operation_name
+        super().__init__(f"An error occurred ({error_response['Error']['Code']}) when calling the {operation_name} operation")
+
+
+class NoSuchKey(ClientError):
+    def __init__(self, key):
+        super().__init__({'Error': {'Code': 'NoSuchKey', 'Message': key}}, 'GetObject')
+
+
+class ClientExceptions:
+    ClientError = ClientError
+    NoSuchKey = NoSuchKey
+
+
+class Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class FakeS3:
+    exceptions = ClientExceptions
+
+    def __init__(self, aws):
+        self.aws = aws
+
+    def _bucket(self, bucket):
+        return self.aws.objects.setdefault(bucket, {})
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        self.aws.call('s3', 'get_object')
+        obj = self._bucket(Bucket).get(Key)
+        if obj is None:
+            raise NoSuchKey(Key)
+        if IfNoneMatch and IfNoneMatch == obj['ETag']:
+            raise ClientError({'Error': {'Code': '304'}}, 'GetObject')
+        return {'Body': Body(obj['Body']), 'ETag': obj['ETag'], 'ContentLength': len(obj['Body']),
+                'LastModified': obj['LastModified']}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self.aws.call('s3', 'put_object')
+        existing = self._bucket(Bucket).get(Key)
+        if (IfMatch and (existing is None or existing['ETag'] != IfMatch)) or (IfNoneMatch == '*' and existing):
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+        return {'ETag': self.aws.put(Bucket, Key, Body)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.aws.call('s3', 'delete_object')
+        with self.aws.lock:
+            self._bucket(Bucket).pop(Key, None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None, **kwargs):
+        self.aws.call('s3', 'list_objects_v2')
+        keys = sorted(key for key in self._bucket(Bucket) if key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {'KeyCount': len(page), 'IsTruncated': start + MaxKeys < len(keys)}
+        if page:
+            response['Contents'] = [
+                {'Key': key, 'ETag': self._bucket(Bucket)[key]['ETag'], 'Size': len(self._bucket(Bucket)[key]['Body']),
+                 'LastModified': self._bucket(Bucket)[key]['LastModified']}
+                for key in page
+            ]
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, operation):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, PaginationConfig=None, **kwargs):
+                page_size = (PaginationConfig or {}).get('PageSize', 1000)
+                token = None
+                while True:
+                    response = s3.list_objects_v2(MaxKeys=page_size, ContinuationToken=token, **kwargs)
+                    yield response
+                    if not response['IsTruncated']:
+                        return
+                    token = response['NextContinuationToken']
+
+        return Paginator()
+
+
+class FakeSQS:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self.aws.call('sqs', 'send_message')
+        self.aws.messages.append(MessageBody)
+        return {'MessageId': f"msg-{len(self.aws.messages)}"}
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        self.aws.call('sqs', 'send_message_batch')
+        successful = []
+        for entry in Entries:
+            self.aws.messages.append(entry['MessageBody'])
+            successful.append({'Id': entry['Id'], 'MessageId': f"msg-{len(self.aws.messages)}"})
+        return {'Successful': successful, 'Failed': []}
+
+
+class FakeBedrock:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def converse(self, **kwargs):
+        self.aws.call('bedrock-runtime', 'converse')
+        return {
+            'output': {'message': {'role': 'assistant', 'content': [{'text': 'Stub answer about the video.'}]}},
+            'usage': {'inputTokens': 0, 'outputTokens': 0}
+        }
+
+
+class KeyCondition:
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class Key:
+    def __init__(self, name):
+        self.name = name
+
+    def eq(self, value):
+        return KeyCondition(self.name, value)
+
+
+class FakeTable:
+    def __init__(self, aws, name):
+        self.aws = aws
+        self.name = name
+
+    def _items(self):
+        return self.aws.tables.setdefault(self.name, {})
+
+    def get_item(self, Key, **kwargs):
+        self.aws.call('dynamodb', 'get_item')
+        if Key.get('inference_setting_id') is not None:
+            return {'Item': dict(self.aws.settings)}
+        item = self._items().get(tuple(sorted(Key.items())))
+        return {'Item': item} if item else {}
+
+    def update_item(self, Key, UpdateExpression=None, ExpressionAttributeValues=None, **kwargs):
+        self.aws.call('dynamodb', 'update_item')
+        item = self._items().setdefault(tuple(sorted(Key.items())), dict(Key))
+        # "SET a = :a, b = :b" is all the indexer writes
+        for assignment in (UpdateExpression or '').replace('SET', '', 1).split(','):
+            if '=' in assignment:
+                name, value = (part.strip() for part in assignment.split('=', 1))
+                item[name] = (ExpressionAttributeValues or {}).get(value)
+        return {}
+
+    def query(self, KeyConditionExpression, **kwargs):
+        self.aws.call('dynamodb', 'query')
+        condition = KeyConditionExpression
+        items = [item for item in self._items().values() if item.get(condition.name) == condition.value]
+        return {'Items': items}
+
+
+class FakeDynamoResource:
+    def __init__(self, aws):
+        self.aws = aws
+        self.meta = types.SimpleNamespace(client=types.SimpleNamespace(
+            exceptions=types.SimpleNamespace(ResourceNotFoundException=type('ResourceNotFoundException', (Exception,), {}))
+        ))
+
+    def Table(self, name):
+        return FakeTable(self.aws, name)
+
+
+CLIENTS = {'s3': FakeS3, 'sqs': FakeSQS, 'bedrock-runtime': FakeBedrock}
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise sys.modules['requests'].exceptions.HTTPError(f"{self.status_code} Error", response=self)
+
+
+def requests_module(aws):
+    requests = types.ModuleType('requests')
+    exceptions = types.ModuleType('requests.exceptions')
+
+    class RequestException(Exception):
+        def __init__(self, *args, response=None, **kwargs):
+            super().__init__(*args)
+            self.response = response
+
+    exceptions.RequestException = RequestException
+    exceptions.ConnectionError = type('ConnectionError', (RequestException,), {})
+    exceptions.Timeout = type('Timeout', (RequestException,), {})
+    exceptions.HTTPError = type('HTTPError', (RequestException,), {})
+    exceptions.ReadTimeout = type('ReadTimeout', (exceptions.Timeout,), {})
+    exceptions.ConnectTimeout = type('ConnectTimeout', (exceptions.ConnectionError, exceptions.Timeout), {})
+    requests.exceptions = exceptions
+
+    def post(url, json=None, timeout=None, **kwargs):
+        aws.call('http', 'post')
+        return FakeResponse(200, {'status': 'accepted'})
+
+    class Session:
+        def mount(self, prefix, adapter):
+            pass
+
+        def post(self, url, json=None, timeout=None, **kwargs):
+            return post(url, json=json, timeout=timeout)
+
+    requests.post = post
+    requests.Session = Session
+    adapters = types.ModuleType('requests.adapters')
+    adapters.HTTPAdapter = lambda **kwargs: None
+    requests.adapters = adapters
+    return {'requests': requests, 'requests.exceptions': exceptions, 'requests.adapters': adapters}
+
+
+def install(aws):
+    """Register fake boto3, botocore and requests modules backed by aws."""
+    boto3 = types.ModuleType('boto3')
+
+    def client(service, config=None, **kwargs):
+        aws.construct('client', service)
+        return CLIENTS[service](aws)
+
+    def resource(service, **kwargs):
+        aws.construct('resource', service)
+        return FakeDynamoResource(aws)
+
+    boto3.client = client
+    boto3.resource = resource
+    boto3_dynamodb = types.ModuleType('boto3.dynamodb')
+    conditions = types.ModuleType('boto3.dynamodb.conditions')
+    conditions.Key = Key
+    boto3.dynamodb = boto3_dynamodb
+    boto3_dynamodb.conditions = conditions
+
+    botocore = types.ModuleType('botocore')
+    config = types.ModuleType('botocore.config')
+    config.Config = lambda **kwargs: types.SimpleNamespace(**kwargs)
+    botocore_exceptions = types.ModuleType('botocore.exceptions')
+    botocore_exceptions.ClientError = ClientError
+    botocore.config = config
+    botocore.exceptions = botocore_exceptions
+
+    sys.modules.update({
+        'boto3': boto3,
+        'boto3.dynamodb': boto3_dynamodb,
+        'boto3.dynamodb.conditions': conditions,
+        'botocore': botocore,
+        'botocore.config': config,
+        'botocore.exceptions': botocore_exceptions,
+        **requests_module(aws)
+    })
+    return aws
+
+
+def seed_execution(aws, bucket, video_id, execution_id, chunk_count, entries_per_chunk=3, chunk_seconds=10, compress=False):
+    """Write chunk videos and transcripts for one execution; returns the chunk transcript keys.
+
+    With compress the transcripts are stored gzipped as ts_chunk_start_*.json.gz.
+    """
+    prefix = f"batch-videos/{video_id}/{execution_id}/chunks/"
+    started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    keys = []
+    for index in range(chunk_count):
+        start = index * chunk_seconds
+        written = started + timedelta(seconds=index * 2)
+        aws.put(bucket, f"{prefix}det_chunk_start_{start}.mp4", b"\0" * 16, written)
+        transcript = [
+            {f"{start + offset}s": f"Segment {offset} of chunk {index}: a person walks past a parked car near the gate."}
+            for offset in range(entries_per_chunk)
+        ]
+        body = json.dumps(transcript).encode('utf-8')
+        key = f"{prefix}ts_chunk_start_{start}.json"
+        if compress:
+            body, key = gzip.compress(body), f"{key}.gz"
+        aws.put(bucket, key, body, written)
+        keys.append(key)
+    return keys
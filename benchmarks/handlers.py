@@ -0,0 +1,125 @@
+"""Handler locations and sample events shared by the offline benchmarks."""
+import importlib.util
+import json
+import os
+import sys
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(ROOT, 'lambda')
+SHARED_LAYER_DIR = os.path.join(LAMBDA_DIR, 'layers', 'batch-video-shared', 'python')
+
+# Benchmark name -> (lambda directory, module file stem, handler attribute)
+HANDLERS = {
+    'chat': ('batch-video-chat-testing', 'batch-video-chat-testing', 'handler'),
+    'execution': ('batch-video-execution-testing', 'batch-video-execution-testing', 'handler'),
+    'execution_worker': ('batch-video-execution-testing', 'batch-video-execution-testing', 'worker_handler'),
+    'transcript': ('batch-video-transcript-testing', 'batch-video-transcript-testing', 'handler'),
+    'status': ('batch-video-get-status-by-id-test', 'batch-video-get-status-by-id-test', 'handler'),
+    'status_indexer': ('batch-video-status-indexer', 'batch-video-status-indexer', 'handler'),
+    'events': ('events-configs-test', 'events-configs-test', 'handler'),
+}
+
+# Matches the bucket the chat handler validates s3_dest_uri_w_prefix against
+CHAT_BUCKET = 'cache-us-east-1-054037105643-15bd31e070bd'
+EVENTS_BUCKET = 'spectracdkstack-batchvideobucketa35fe309-p3omgtksdngd'
+EVENTS_KEY = 'artifacts/event_detection/events_to_detect.json'
+STATUS_INDEX_TABLE_NAME = 'batch-video-execution-status'
+SUBMISSION_QUEUE_URL = 'https://sqs.us-east-1.amazonaws.com/000000000000/batch-video-submissions'
+
+
+def environment():
+    """Environment variables the stack sets on the handlers, pointed at the fakes."""
+    return {
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'SUBMISSION_QUEUE_URL': SUBMISSION_QUEUE_URL,
+        'STATUS_INDEX_TABLE_NAME': STATUS_INDEX_TABLE_NAME,
+        'VIDEO_CONTEXT_SPILL_DIR': os.path.join(os.environ.get('TMPDIR', '/tmp'), 'bench-video-context-cache'),
+    }
+
+
+def load_handler(name):
+    """Import a handler module by benchmark name and return (module, handler function)."""
+    directory, stem, attribute = HANDLERS[name]
+    for path in (SHARED_LAYER_DIR, os.path.join(LAMBDA_DIR, directory)):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    module = sys.modules.get(stem)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(stem, os.path.join(LAMBDA_DIR, directory, f"{stem}.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[stem] = module
+        spec.loader.exec_module(module)
+    return module, getattr(module, attribute)
+
+
+def chat_event(video_id, execution_id, query, context_mode=None):
+    body = {
+        'videoId': video_id,
+        'executionArn': execution_id,
+        's3_dest_uri_w_prefix': f"s3://{CHAT_BUCKET}/batch-videos/{video_id}/{execution_id}/chunks/",
+        'UserQuery': query,
+        'modelId': 'bench-model',
+        'inferenceConfig': {'temperature': 0.2, 'topP': 0.9, 'maxTokens': 512},
+        'conversation': []
+    }
+    if context_mode:
+        body['contextMode'] = context_mode
+    return {'body': json.dumps(body)}
+
+
+def execution_event(video_id, submission_mode, chunk_count=None):
+    body = {
+        'video_id': video_id,
+        's3_dest_uri_w_prefix': f"s3://{CHAT_BUCKET}/batch-videos/{video_id}/{{runtime_prefix}}/chunks/",
+        'submission_mode': submission_mode
+    }
+    if chunk_count:
+        body['expected_chunk_count'] = chunk_count
+    return {'body': json.dumps(body)}
+
+
+def bulk_execution_event(video_ids, submission_mode):
+    return {'body': json.dumps({
+        's3_dest_uri_w_prefix': f"s3://{CHAT_BUCKET}/batch-videos/bulk/{{runtime_prefix}}/chunks/",
+        'submission_mode': submission_mode,
+        'videos': [{'video_id': video_id} for video_id in video_ids]
+    })}
+
+
+def worker_event(video_id):
+    # A fresh runtime_prefix per event, so the worker's submission claim is taken every time
+    runtime_prefix = str(uuid.uuid4())
+    input_data = json.loads(execution_event(video_id, 'sync')['body'])
+    input_data['s3_dest_uri_w_prefix'] = input_data['s3_dest_uri_w_prefix'].format(runtime_prefix=runtime_prefix)
+    job = {'runtime_prefix': runtime_prefix, 'input_data': input_data}
+    return {'Records': [{'messageId': 'bench-1', 'body': json.dumps(job), 'attributes': {'ApproximateReceiveCount': '1'}}]}
+
+
+def transcript_event(video_id, execution_id, limit=None, gzip=False):
+    body = {'videoId': video_id, 'executionUUID': execution_id}
+    if limit:
+        body['limit'] = limit
+    event = {'httpMethod': 'POST', 'body': json.dumps(body)}
+    if gzip:
+        event['headers'] = {'Accept': 'application/gzip', 'Accept-Encoding': 'gzip'}
+    return event
+
+
+def status_event(video_id, execution_id):
+    return {'httpMethod': 'GET', 'pathParameters': {'videoId': video_id, 'executionId': execution_id}}
+
+
+def indexer_event(bucket, *keys):
+    return {'Records': [
+        {'eventTime': '2025-01-01T00:00:00.000Z', 's3': {'bucket': {'name': bucket}, 'object': {'key': key}}}
+        for key in keys
+    ]}
+
+
+def events_config_event():
+    return {'httpMethod': 'GET'}
+
+
+def events_detect_event(video_id, execution_id):
+    return {'httpMethod': 'GET', 'pathParameters': {'videoId': video_id, 'executionId': execution_id}}
@@ -0,0 +1,181 @@
+"""Offline benchmark suite: every handler against in-memory AWS, over a grid of video sizes.
+
+Each grid point seeds fresh executions of --chunks chunk transcripts holding
+--entries-per-chunk entries each, then drives every case below and reports:
+
+  cold_ms     first call for the execution (nothing cached in the container or in S3)
+  warm_ms     the same call again
+  peak_kib    tracemalloc peak during a separate cold call on an identical execution
+  calls       downstream calls made by the cold call, per service.operation
+  resp_kib    size of the cold call's response body
+
+Latency is injected per downstream call (--s3-ms, --dynamodb-ms, --bedrock-ms,
+--inference-ms, --sqs-ms) so fan-out and call counts show up in the timings.
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py --chunks 10 --chunks 5000 --case chat_full --json results.json
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_aws  # noqa: E402
+import handlers  # noqa: E402
+
+DEFAULT_CHUNKS = (10, 100, 1000, 5000)
+DEFAULT_ENTRIES_PER_CHUNK = (3, 30)
+BULK_VIDEOS = 50
+
+
+def chunk_keys(aws, video_id, execution_id):
+    prefix = f"batch-videos/{video_id}/{execution_id}/chunks/"
+    return sorted(key for key in aws.objects.get(aws.settings['cache_bucket'], {}) if key.startswith(prefix))
+
+
+# Case name -> (handler benchmark name, build(aws, video_id, execution_id) -> event, scales with chunks)
+CASES = {
+    'chat_full': ('chat', lambda aws, v, e: handlers.chat_event(v, e, 'Summarize the whole video', 'full'), True),
+    'chat_retrieval': ('chat', lambda aws, v, e: handlers.chat_event(v, e, 'When does a person walk past the gate?', 'retrieval'), True),
+    'transcript': ('transcript', lambda aws, v, e: handlers.transcript_event(v, e), True),
+    'transcript_page': ('transcript', lambda aws, v, e: handlers.transcript_event(v, e, limit=20), True),
+    'transcript_gzip': ('transcript', lambda aws, v, e: handlers.transcript_event(v, e, gzip=True), True),
+    'status_s3': ('status', lambda aws, v, e: handlers.status_event(v, e), True),
+    'status_index': ('status', lambda aws, v, e: handlers.status_event(v, e), True),
+    'status_indexer': ('status_indexer', lambda aws, v, e: handlers.indexer_event(aws.settings['cache_bucket'], *chunk_keys(aws, v, e)), True),
+    'events_detect': ('events', lambda aws, v, e: handlers.events_detect_event(v, e), True),
+    'execution_sync': ('execution', lambda aws, v, e: handlers.execution_event(v, 'sync'), False),
+    'execution_async': ('execution', lambda aws, v, e: handlers.execution_event(v, 'async'), False),
+    'execution_bulk': ('execution', lambda aws, v, e: handlers.bulk_execution_event([f"{v}-{i}" for i in range(BULK_VIDEOS)], 'async'), False),
+    'execution_worker': ('execution_worker', lambda aws, v, e: handlers.worker_event(v), False),
+}
+
+
+class Context:
+    """Enough of the Lambda context for the handlers that check their deadline."""
+
+    def get_remaining_time_in_millis(self):
+        return 15 * 60 * 1000
+
+
+def prepare(aws, case, video_id, execution_id, chunks, entries_per_chunk, compress):
+    fake_aws.seed_execution(aws, aws.settings['cache_bucket'], video_id, execution_id, chunks, entries_per_chunk,
+                            compress=compress)
+    if case == 'status_index':
+        # Index the execution up front, as the S3-triggered indexer would have
+        _, index = handlers.load_handler('status_indexer')
+        index(handlers.indexer_event(aws.settings['cache_bucket'], *chunk_keys(aws, video_id, execution_id)), None)
+
+
+def invoke(aws, case, video_id, execution_id):
+    """(elapsed ms, response, calls) for one handler call."""
+    name, build, _ = CASES[case]
+    _, handler = handlers.load_handler(name)
+    event = build(aws, video_id, execution_id)
+    aws.reset_counters()
+    # The handlers print progress; keep it out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        response = handler(event, Context())
+        elapsed = (time.perf_counter() - started) * 1000
+    return elapsed, response, dict(aws.calls)
+
+
+def run_case(aws, case, chunks, entries_per_chunk, run_id, compress=False):
+    timed = (f"video-{run_id}", f"{case}-timed")
+    traced = (f"video-{run_id}", f"{case}-traced")
+    for video_id, execution_id in (timed, traced):
+        prepare(aws, case, video_id, execution_id, chunks, entries_per_chunk, compress)
+
+    cold_ms, response, calls = invoke(aws, case, *timed)
+    warm_ms, _, _ = invoke(aws, case, *timed)
+
+    tracemalloc.start()
+    try:
+        invoke(aws, case, *traced)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    status = response.get('statusCode') if isinstance(response, dict) else None
+    body = response.get('body') if isinstance(response, dict) else None
+    return {
+        'case': case,
+        'chunks': chunks,
+        'entries_per_chunk': entries_per_chunk,
+        'status_code': status,
+        'cold_ms': round(cold_ms, 2),
+        'warm_ms': round(warm_ms, 2),
+        'peak_kib': round(peak / 1024, 1),
+        'resp_kib': round(len(body or '') / 1024, 1),
+        'calls': calls
+    }
+
+
+def format_calls(calls):
+    return " ".join(f"{name}={count}" for name, count in sorted(calls.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--case', action='append', choices=sorted(CASES), help="Run only these cases")
+    parser.add_argument('--chunks', action='append', type=int, help=f"Chunks per video (default {DEFAULT_CHUNKS})")
+    parser.add_argument('--entries-per-chunk', action='append', type=int,
+                        help=f"Transcript entries per chunk (default {DEFAULT_ENTRIES_PER_CHUNK})")
+    parser.add_argument('--gzip-chunks', action='store_true', help="Store chunk transcripts as .json.gz")
+    parser.add_argument('--s3-ms', type=float, default=2.0, help="Injected latency per S3 call")
+    parser.add_argument('--dynamodb-ms', type=float, default=2.0, help="Injected latency per DynamoDB call")
+    parser.add_argument('--bedrock-ms', type=float, default=50.0, help="Injected latency per Bedrock converse")
+    parser.add_argument('--inference-ms', type=float, default=20.0, help="Injected latency per inference endpoint POST")
+    parser.add_argument('--sqs-ms', type=float, default=5.0, help="Injected latency per SQS call")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    os.environ.update(handlers.environment())
+    # A fresh spill directory, so chat's disk cache from an earlier run cannot make cold calls warm
+    os.environ['VIDEO_CONTEXT_SPILL_DIR'] = tempfile.mkdtemp(prefix='bench-video-context-')
+    # Keep the handlers' per-request INFO logging out of the report; warnings and errors still show
+    logging.disable(logging.INFO)
+    aws = fake_aws.install(fake_aws.FakeAWS(latency={
+        's3': args.s3_ms / 1000,
+        'dynamodb': args.dynamodb_ms / 1000,
+        'bedrock-runtime': args.bedrock_ms / 1000,
+        'http': args.inference_ms / 1000,
+        'sqs': args.sqs_ms / 1000,
+    }))
+    aws.put(handlers.EVENTS_BUCKET, handlers.EVENTS_KEY, json.dumps({'events': ['parked car', 'gate', 'fire']}))
+
+    results = []
+    run_ids = itertools.count()
+    grid = list(itertools.product(args.chunks or DEFAULT_CHUNKS, args.entries_per_chunk or DEFAULT_ENTRIES_PER_CHUNK))
+    print(f"{'case':<18} {'chunks':>6} {'entries':>7} {'status':>6} {'cold ms':>9} {'warm ms':>9} {'peak KiB':>10} "
+          f"{'resp KiB':>9}  calls")
+    for case in args.case or CASES:
+        # Cases that do not read chunk transcripts run once, at the smallest grid point
+        for chunks, entries_per_chunk in (grid if CASES[case][2] else grid[:1]):
+            result = run_case(aws, case, chunks, entries_per_chunk, next(run_ids), args.gzip_chunks)
+            results.append(result)
+            print(f"{case:<18} {chunks:>6} {entries_per_chunk:>7} {str(result['status_code']):>6} "
+                  f"{result['cold_ms']:>9.1f} {result['warm_ms']:>9.1f} {result['peak_kib']:>10.1f} {result['resp_kib']:>9.1f}  "
+                  f"{format_calls(result['calls'])}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'gzip_chunks': args.gzip_chunks, 'latency_ms': {
+                's3': args.s3_ms, 'dynamodb': args.dynamodb_ms, 'bedrock': args.bedrock_ms,
+                'inference': args.inference_ms, 'sqs': args.sqs_ms
+            }, 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,76 @@
 import json
-import boto3
 import os
-import copy
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 import uuid
 import logging
 
+from aws_clients import get_client
+from chunk_store import chunk_sort_key, decode_chunk_body, is_transcript_key, iter_chunk_objects
+from conversation_history import compact_history
+from inference_settings import get_inference_setting, prefetch_inference_settings
+from phase_metrics import instrumented, phase, record_call
+from transcript_cache import TranscriptCache, listing_fingerprint
+from transcript_retrieval import is_summary_question, select_relevant_chunks
+
 # Set up logging
 logging.getLogger().setLevel(logging.INFO)
 
-s3_client = boto3.client('s3')
-client = boto3.client("bedrock-runtime")
+# Bounded fan-out for chunk downloads; tune per deployment through the Lambda environment
+CHUNK_FETCH_CONCURRENCY = int(os.environ.get('CHUNK_FETCH_CONCURRENCY', '16'))
+CHUNK_FETCH_TIMEOUT_SECS = float(os.environ.get('CHUNK_FETCH_TIMEOUT_SECS', '10'))
+# Overall budget for one request's chunk downloads, kept under API Gateway's 29 s limit
+CHUNK_FETCH_DEADLINE_SECS = float(os.environ.get('CHUNK_FETCH_DEADLINE_SECS', '15'))
+
+# Token budget for the transcript embedded in the system prompt.
+# VIDEO_CONTEXT_TRUNCATION is 'recent' (keep the latest sections) or 'sample' (keep evenly spaced sections).
+VIDEO_CONTEXT_TOKEN_BUDGET = int(os.environ.get('VIDEO_CONTEXT_TOKEN_BUDGET', '150000'))
+VIDEO_CONTEXT_TRUNCATION = os.environ.get('VIDEO_CONTEXT_TRUNCATION', 'recent')
+CHARS_PER_TOKEN = 4
+
+# Context selection: 'auto' retrieves relevant windows unless the question is summary-style,
+# 'retrieval' always retrieves, 'full' always sends the whole transcript. Clients may override
+# per request with contextMode.
+VIDEO_CONTEXT_MODE = os.environ.get('VIDEO_CONTEXT_MODE', 'auto')
+RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', '5'))
+RETRIEVAL_NEIGHBOURS = int(os.environ.get('RETRIEVAL_NEIGHBOURS', '1'))
+# Transcripts this small are sent whole; retrieval only pays off for long videos
+RETRIEVAL_MIN_CONTEXT_TOKENS = int(os.environ.get('RETRIEVAL_MIN_CONTEXT_TOKENS', '8000'))
+CONTEXT_MODES = ('auto', 'retrieval', 'full')
+
+# Fetched transcripts are kept per execution for follow-up questions on a warm container.
+# An empty VIDEO_CONTEXT_SPILL_DIR disables the /tmp spill.
+VIDEO_CONTEXT_CACHE_MAX_BYTES = int(os.environ.get('VIDEO_CONTEXT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+VIDEO_CONTEXT_SPILL_DIR = os.environ.get('VIDEO_CONTEXT_SPILL_DIR', '/tmp/video-context-cache')
+VIDEO_CONTEXT_SPILL_MAX_BYTES = int(os.environ.get('VIDEO_CONTEXT_SPILL_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Only the last CHAT_HISTORY_KEEP_TURNS turns are replayed verbatim; older turns are folded
+# into a running summary capped at CHAT_HISTORY_SUMMARY_TOKEN_CAP tokens.
+CHAT_HISTORY_KEEP_TURNS = int(os.environ.get('CHAT_HISTORY_KEEP_TURNS', '6'))
+CHAT_HISTORY_SUMMARY_TOKEN_CAP = int(os.environ.get('CHAT_HISTORY_SUMMARY_TOKEN_CAP', '1500'))
+
+def s3_client():
+    return get_client(
+        's3',
+        max_pool_connections=CHUNK_FETCH_CONCURRENCY,
+        connect_timeout=CHUNK_FETCH_TIMEOUT_SECS,
+        read_timeout=CHUNK_FETCH_TIMEOUT_SECS,
+        retries={'max_attempts': 3, 'mode': 'standard'}
+    )
+
+def bedrock_client():
+    return get_client('bedrock-runtime')
+
+transcript_cache = TranscriptCache(
+    VIDEO_CONTEXT_CACHE_MAX_BYTES,
+    spill_dir=VIDEO_CONTEXT_SPILL_DIR or None,
+    spill_max_bytes=VIDEO_CONTEXT_SPILL_MAX_BYTES
+)
+
+# Load inference settings during init, off the first request's critical path
+prefetch_inference_settings()
 
-dynamodb = boto3.resource('dynamodb')
 
 # System template for Bedrock AI
 system_template = """The following is a friendly conversation between a Human (H) and an AI Assistant (AI) about a Video. There is no video provided to you but only a transcript of the video. Always remember the following points when having a conversation,
@@ -50,46 +108,184 @@ ALWAYS prioritize user readability experience when providing a response.
 """
 
 def list_transcript_files(bucket, prefix):
-    """List all .json files in the given S3 bucket and prefix."""
+    """Map all chunk_start .json (or .json.gz) files in the given S3 bucket and prefix to their ETags, across every listing page."""
     try:
-        response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
-        files = [
-            item['Key'] for item in response.get('Contents', [])
-            if item['Key'].endswith('.json') and 'chunk_start' in item['Key']
-        ]
-        logging.info(f"Found {len(files)} transcript files at s3://{bucket}/{prefix}: {files}")
+        files = {
+            obj['Key']: obj['ETag']
+            for obj in iter_chunk_objects(s3_client(), bucket, prefix, is_transcript_key)
+        }
+        logging.info(f"Found {len(files)} transcript files at s3://{bucket}/{prefix}")
         return files
     except Exception as e:
         logging.error(f"Error listing transcript files in s3://{bucket}/{prefix}: {e}")
-        return []
+        return {}
 
-def merge_transcripts(bucket, keys):
-    """Merge transcript files into a single video_context string."""
-    results = []
-    for key in sorted(keys):
-        try:
-            obj = s3_client.get_object(Bucket=bucket, Key=key)
-            content = obj['Body'].read().decode('utf-8')
-            data = json.loads(content)
-            if isinstance(data, list):
-                results.extend(data)
+def fetch_chunk(bucket, key):
+    """Download one transcript chunk and return its entries as a list, or None if it could not be read."""
+    try:
+        obj = s3_client().get_object(Bucket=bucket, Key=key)
+        raw = obj['Body'].read()
+        record_call(len(raw))
+        data = json.loads(decode_chunk_body(raw).decode('utf-8'))
+    except json.JSONDecodeError as e:
+        logging.warning(f"Skipping invalid JSON in {key}: {e}")
+        return []
+    except Exception as e:
+        logging.error(f"Error fetching transcript {key}: {e}")
+        return None
+    return data if isinstance(data, list) else [data]
+
+def fetch_chunks(bucket, keys):
+    """Download chunks concurrently; returns ({key: entries} in chunk_start order, missing keys).
+
+    Every fetch shares one CHUNK_FETCH_DEADLINE_SECS deadline counted from submission.
+    Chunks that fail or are not downloaded by then, including ones still queued behind
+    the fan-out, are returned as missing.
+    """
+    ordered_keys = sorted(keys, key=chunk_sort_key)
+    chunks = {}
+    missing = []
+    if not ordered_keys:
+        return chunks, missing
+    executor = ThreadPoolExecutor(max_workers=min(CHUNK_FETCH_CONCURRENCY, len(ordered_keys)))
+    try:
+        futures = [(key, executor.submit(fetch_chunk, bucket, key)) for key in ordered_keys]
+        deadline = time.monotonic() + CHUNK_FETCH_DEADLINE_SECS
+        for key, future in futures:
+            try:
+                entries = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                future.cancel()
+                entries = None
+            if entries is None:
+                missing.append(key)
             else:
-                results.append(data)
-        except json.JSONDecodeError as e:
-            logging.warning(f"Skipping invalid JSON in {key}: {e}")
-        except Exception as e:
-            logging.error(f"Error fetching transcript {key}: {e}")
+                chunks[key] = entries
+        if missing:
+            logging.warning(f"{len(missing)} of {len(ordered_keys)} transcripts not fetched within {CHUNK_FETCH_DEADLINE_SECS}s")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return chunks, missing
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for context budgeting."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def select_sections(section_tokens, token_budget, truncation):
+    """Pick the indices of the sections to keep so their tokens fit within token_budget."""
+    count = len(section_tokens)
+    if truncation == 'sample':
+        total = sum(section_tokens)
+        keep_count = max(1, count * token_budget // max(total, 1))
+        while keep_count > 0:
+            step = count / keep_count
+            indices = sorted({int(i * step) for i in range(keep_count)})
+            used = sum(section_tokens[i] for i in indices)
+            if used <= token_budget:
+                return indices
+            keep_count = min(keep_count - 1, keep_count * token_budget // used)
+        return []
 
-    video_context = ""
+    # 'recent': walk back from the end of the video while the budget lasts
+    indices = []
+    used = 0
+    for i in range(count - 1, -1, -1):
+        if used + section_tokens[i] > token_budget:
+            break
+        used += section_tokens[i]
+        indices.append(i)
+    return indices[::-1]
+
+def build_video_context(results, token_budget=VIDEO_CONTEXT_TOKEN_BUDGET, truncation=VIDEO_CONTEXT_TRUNCATION):
+    """Assemble video_context in one pass and enforce the token budget.
+
+    Returns the context string and stats reporting tokens used versus dropped.
+    """
+    sections = []
     for item in results:
         if isinstance(item, dict):
             for key in sorted(item):
-                video_context += f"**************{key}**************\n"
-                video_context += f"{item[key]}\n\n"
+                sections.append(f"**************{key}**************\n{item[key]}\n\n")
         else:
-            logging.warning(f"Unexpected item type in results: {type(item)} -> {item}")
+            logging.warning(f"Unexpected item type in results: {type(item)}")
 
-    return video_context
+    section_tokens = [estimate_tokens(section) for section in sections]
+    total_tokens = sum(section_tokens)
+    if total_tokens <= token_budget:
+        kept = range(len(sections))
+    else:
+        kept = select_sections(section_tokens, token_budget, truncation)
+
+    parts = [sections[i] for i in kept]
+    used_tokens = sum(section_tokens[i] for i in kept)
+    dropped_sections = len(sections) - len(parts)
+    if dropped_sections:
+        policy = "evenly sampled sections" if truncation == 'sample' else "the most recent sections"
+        parts.insert(0, f"[Transcript truncated to fit the context window: {dropped_sections} of {len(sections)} sections omitted, keeping {policy}.]\n\n")
+
+    stats = {
+        "tokenBudget": token_budget,
+        "totalTokens": total_tokens,
+        "usedTokens": used_tokens,
+        "droppedTokens": total_tokens - used_tokens,
+        "keptSections": len(kept),
+        "droppedSections": dropped_sections,
+        "truncation": truncation if dropped_sections else None
+    }
+    return "".join(parts), stats
+
+def select_context_chunks(chunks, user_query, context_mode):
+    """Pick the chunks to send to the model and report which mode was applied."""
+    if context_mode == 'full' or not chunks:
+        return chunks, 'full'
+    if context_mode == 'auto':
+        if is_summary_question(user_query):
+            return chunks, 'full'
+        transcript_chars = sum(len(json.dumps(entries)) for entries in chunks.values())
+        if transcript_chars // CHARS_PER_TOKEN <= RETRIEVAL_MIN_CONTEXT_TOKENS:
+            return chunks, 'full'
+    selected = select_relevant_chunks(chunks, user_query, RETRIEVAL_TOP_K, RETRIEVAL_NEIGHBOURS)
+    if not selected:
+        logging.info("No transcript chunks matched the question, falling back to the full transcript")
+        return chunks, 'full'
+    return selected, 'retrieval'
+
+def load_transcript_chunks(bucket, prefix, chunk_etags):
+    """Return ({key: entries}, cache source, missing keys) for the listed chunks.
+
+    A warm container answers from transcript_cache when the listing's ETags still match;
+    otherwise the chunks are downloaded and cached if every one of them arrived.
+    """
+    cache_key = f"s3://{bucket}/{prefix}"
+    fingerprint = listing_fingerprint(chunk_etags)
+    chunks, source = transcript_cache.get(cache_key, fingerprint)
+    if chunks is not None:
+        return chunks, source, []
+
+    with phase('chunk_download'):
+        chunks, missing = fetch_chunks(bucket, chunk_etags)
+    if not missing:
+        transcript_cache.put(cache_key, fingerprint, chunks)
+    return chunks, source, missing
+
+def merge_transcripts(chunks, user_query, context_mode=VIDEO_CONTEXT_MODE):
+    """Merge transcript chunks into a video_context string plus budgeting stats.
+
+    Only the chunks relevant to user_query are included unless context_mode asks for
+    the full transcript.
+    """
+    selected, applied_mode = select_context_chunks(chunks, user_query, context_mode)
+
+    results = []
+    for entries in selected.values():
+        results.extend(entries)
+    video_context, stats = build_video_context(results)
+    stats.update({
+        "contextMode": applied_mode,
+        "selectedChunks": len(selected),
+        "totalChunks": len(chunks)
+    })
+    return video_context, stats
 
 def normalize_conversation(conversation):
     """Convert conversation to Bedrock-compatible format."""
@@ -123,6 +319,192 @@ def format_to_markdown(response_text):
     
     return markdown
 
+def build_response(status_code, payload):
+    """API Gateway proxy response with the chat endpoint's CORS headers."""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE',
+            'Access-Control-Allow-Credentials': 'true'
+        },
+        'body': json.dumps(payload)
+    }
+
+def compact_conversation(body):
+    """Normalize the incoming conversation and split it into the replayed turns and running summary.
+
+    conversationSummaryTurns says how many leading turns of conversation the incoming
+    conversationSummary already covers, so they are not summarized twice. Responses carry
+    the compacted conversation and the matching count, so posting them back stays bounded.
+    """
+    message_list = normalize_conversation(body.get('conversation', []))
+    try:
+        summarized_turns = int(body.get('conversationSummaryTurns') or 0)
+    except (TypeError, ValueError):
+        raise ValueError("conversationSummaryTurns must be an integer")
+    recent_messages, summary, compaction = compact_history(
+        message_list,
+        body.get('conversationSummary', ''),
+        CHAT_HISTORY_KEEP_TURNS,
+        CHAT_HISTORY_SUMMARY_TOKEN_CAP,
+        estimate_tokens,
+        summarized_turns
+    )
+    if compaction['summarizedTurns']:
+        logging.info(f"Compacted conversation history: {json.dumps(compaction)}")
+    return {
+        'compacted_messages': recent_messages,
+        'conversation_summary': summary,
+        'compaction': compaction
+    }
+
+def prepare_chat(body):
+    """Validate a chat request and build the Bedrock call for it.
+
+    Returns (early_response, chat_state). early_response is a (statusCode, payload) pair
+    for requests answered without Bedrock (greetings, missing transcripts); otherwise
+    chat_state carries the converse arguments and what finish_chat needs.
+    """
+    # Extract required fields
+    required_fields = ['videoId', 'executionArn', 's3_dest_uri_w_prefix', 'UserQuery', 'modelId', 'inferenceConfig']
+    for field in required_fields:
+        if field not in body:
+            raise ValueError(f"Missing required field: {field}")
+
+    videoId = body['videoId']
+    executionArn = body['executionArn']
+    s3_dest_uri_w_prefix = body['s3_dest_uri_w_prefix']
+
+    logging.info(f"Extracted videoId: {videoId}, executionArn: {executionArn}, s3_dest_uri_w_prefix: {s3_dest_uri_w_prefix}")
+
+    # Validate S3 URI format
+    expected_prefix = f"s3://cache-us-east-1-054037105643-15bd31e070bd/batch-videos/{videoId}/{executionArn}/chunks/"
+    if s3_dest_uri_w_prefix != expected_prefix:
+        raise ValueError(f"Invalid S3 URI format. Expected: {expected_prefix}, Got: {s3_dest_uri_w_prefix}")
+
+    # Check for casual greetings; they need neither the settings item nor S3
+    user_query = body['UserQuery'].lower().strip()
+    greetings = ['hi', 'hello', 'hey', 'greetings']
+    is_greeting = any(greeting == user_query for greeting in greetings)
+
+    if is_greeting:
+        assistant_response = (
+            "# Welcome to Spectra!\n\n"
+            "Hello! I'm here to assist you with video analysis. "
+            "Ask anything about the video or start a conversation, and I'll provide a detailed response.\n\n"
+        )
+        chat_state = {'body': body, **compact_conversation(body)}
+        user_message = {"role": "user", "content": [{"text": body['UserQuery']}]}
+        chat_state['compacted_messages'].append(user_message)
+        return (200, finish_chat(chat_state, assistant_response, assistant_response)), None
+
+    # Extract bucket and prefix
+    # transcript_bucket_name = "cache-us-east-1-054037105643-15bd31e070bd"
+    # transcript_prefix = s3_dest_uri_w_prefix.replace(f"s3://{transcript_bucket_name}/", "")
+    # logging.info(f"Checking transcripts in s3://{transcript_bucket_name}/{transcript_prefix}")
+    
+    
+    with phase('settings'):
+        cache_bucket = get_inference_setting('cache_bucket')
+    
+    logging.info("cache_bucket: %s", cache_bucket)
+    
+    transcript_bucket_name = cache_bucket
+    transcript_prefix = s3_dest_uri_w_prefix.replace(f"s3://{transcript_bucket_name}/", "")
+    logging.info(f"Checking transcripts in s3://{transcript_bucket_name}/{transcript_prefix}")
+
+    # List and merge all transcript files
+    with phase('s3_list'):
+        transcript_etags = list_transcript_files(transcript_bucket_name, transcript_prefix)
+    if not transcript_etags:
+        error_msg = f"No transcript files found for videoId: {videoId}, executionArn: {executionArn} at {transcript_prefix}. Ensure the executionArn matches the S3 path."
+        logging.error(error_msg)
+        return (400, {'error': error_msg}), None
+
+    context_mode = body.get('contextMode', VIDEO_CONTEXT_MODE)
+    if context_mode not in CONTEXT_MODES:
+        raise ValueError(f"Invalid contextMode: {context_mode}. Expected one of {', '.join(CONTEXT_MODES)}")
+
+    # Merge the relevant transcript chunks into video_context
+    chunks, cache_source, missing = load_transcript_chunks(transcript_bucket_name, transcript_prefix, transcript_etags)
+    with phase('merge'):
+        video_context, context_stats = merge_transcripts(chunks, body['UserQuery'], context_mode)
+    context_stats["transcriptCache"] = cache_source
+    context_stats["missingChunks"] = missing
+    logging.info(f"Built video_context: {json.dumps(context_stats)}")
+
+    # Prepare system prompt with merged video_context
+    system_list = [{"text": system_template.replace("{video_context}", video_context)}]
+
+    # Handle conversation history: replay recent turns, summarize the rest
+    history = compact_conversation(body)
+    if history['conversation_summary']:
+        system_list.append({"text": (
+            "Summary of the earlier part of this conversation (older turns are not repeated verbatim):\n"
+            f"<conversation_summary>\n{history['conversation_summary']}\n</conversation_summary>"
+        )})
+    
+    # Add Markdown formatting instructions to the user query
+    additional_queries = (
+        "\n\nPlease provide the response in Markdown format with headers and small paragraphs for clarity. "
+        "Place any incidents or major events (e.g., accidents, injuries, robberies, or significant occurrences) under a `## Major Incident` header. "
+        "Wrap the entire `## Major Incident` section (including the header and its content) and any incident-related paragraphs (e.g., those describing the incident or its impact) in `<highlight>...</highlight>` tags to indicate they should be highlighted in the frontend. "
+        "Under `## Major Incident`, use numbered lists (e.g., `1. Item`) for chronological or sequential events to clearly outline the incident timeline. "
+        "For non-incident sections, use small paragraphs instead of bullet points to describe details (e.g., setting, context, or summary). "
+        "Use key-value pairs (e.g., `**Key**: Description`) for structured details outside of `## Major Incident`. "
+        "Use blockquotes (e.g., `> Summary`) to emphasize key summaries or conclusions. "
+        "Use horizontal rules (`---`) to separate distinct sections if needed."
+    )
+    modified_user_query = body['UserQuery'] + additional_queries
+    user_message = {"role": "user", "content": [{"text": modified_user_query}]}
+    history['compacted_messages'].append(user_message)
+
+    converse_args = {
+        "modelId": body["modelId"],
+        "messages": list(history['compacted_messages']),
+        "system": system_list,
+        "inferenceConfig": {
+            "temperature": body["inferenceConfig"]["temperature"],
+            "topP": body["inferenceConfig"]["topP"],
+            "maxTokens": body["inferenceConfig"]["maxTokens"]
+        }
+    }
+    return None, {
+        'body': body,
+        **history,
+        'converse_args': converse_args,
+        'context_stats': context_stats
+    }
+
+def finish_chat(chat_state, assistant_response, display_response):
+    """Append the assistant turn and build the conversation envelope returned to the client."""
+    body = chat_state['body']
+
+    # Append AI response to conversation
+    assistant_message = {"role": "assistant", "content": [{"text": assistant_response}]}
+    chat_state['compacted_messages'].append(assistant_message)
+
+    # Update chat response; conversation is replaced below, so a shallow copy of the body is enough
+    chat_response = dict(body)
+    convo_last_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    chat_response.pop("UserQuery", None)
+    # Only the replayed turns (Bedrock format); older ones live on in conversationSummary, and
+    # the leading conversationSummaryTurns turns of this list are already in it
+    chat_response["conversation"] = chat_state['compacted_messages']
+    chat_response["conversationSummary"] = chat_state['conversation_summary']
+    chat_response["conversationSummaryTurns"] = chat_state['compaction']['summaryCoversTurns']
+    chat_response["historyCompaction"] = chat_state['compaction']
+    chat_response["chatLastTime"] = convo_last_time
+    chat_response["assistantResponse"] = display_response
+    if 'context_stats' in chat_state:
+        chat_response["videoContextStats"] = chat_state['context_stats']
+    if not chat_response.get("chatTransactionId"):
+        chat_response["chatTransactionId"] = str(uuid.uuid4().hex)
+    return chat_response
+
+@instrumented('chat')
 def handler(event, context):
     try:
         logging.info(f"Received event: {json.dumps(event)}")
@@ -130,143 +512,15 @@ def handler(event, context):
         # Parse request body
         body = json.loads(event['body']) if isinstance(event.get('body'), str) else event.get('body', {})
 
-        # Extract required fields
-        required_fields = ['videoId', 'executionArn', 's3_dest_uri_w_prefix', 'UserQuery', 'modelId', 'inferenceConfig']
-        for field in required_fields:
-            if field not in body:
-                raise ValueError(f"Missing required field: {field}")
-
-        videoId = body['videoId']
-        executionArn = body['executionArn']
-        s3_dest_uri_w_prefix = body['s3_dest_uri_w_prefix']
-
-        logging.info(f"Extracted videoId: {videoId}, executionArn: {executionArn}, s3_dest_uri_w_prefix: {s3_dest_uri_w_prefix}")
-
-        # Validate S3 URI format
-        expected_prefix = f"s3://cache-us-east-1-054037105643-15bd31e070bd/batch-videos/{videoId}/{executionArn}/chunks/"
-        if s3_dest_uri_w_prefix != expected_prefix:
-            raise ValueError(f"Invalid S3 URI format. Expected: {expected_prefix}, Got: {s3_dest_uri_w_prefix}")
-
-        # Extract bucket and prefix
-        # transcript_bucket_name = "cache-us-east-1-054037105643-15bd31e070bd"
-        # transcript_prefix = s3_dest_uri_w_prefix.replace(f"s3://{transcript_bucket_name}/", "")
-        # logging.info(f"Checking transcripts in s3://{transcript_bucket_name}/{transcript_prefix}")
-        
-        
-        table_name = os.environ.get('INFERENCE_SETTINGS_TABLE_NAME', 'inference-settings')
-        logging.info("Using DynamoDB table: %s", table_name)
-        table = dynamodb.Table(table_name)
-        
-        # Check if the video entry exists in DynamoDB
-        try:
-            inference_record = table.get_item(
-                Key={'inference_setting_id': '1'}  # Partition key is a string
-            )
-        except dynamodb.meta.client.exceptions.ResourceNotFoundException:
-            logging.error("DynamoDB table %s does not exist", table_name)
-            raise Exception(f"DynamoDB table {table_name} does not exist")
-        
-        item = inference_record.get('Item')
-        if not item:
-            raise Exception("Inference setting not found for inference_setting_id: 1")
-        cache_bucket = item.get('cache_bucket')
-        if not cache_bucket:
-            raise Exception("cache_bucket not found in item")
-        
-        logging.info("cache_bucket: %s", cache_bucket)
-        
-        transcript_bucket_name = cache_bucket
-        transcript_prefix = s3_dest_uri_w_prefix.replace(f"s3://{transcript_bucket_name}/", "")
-        logging.info(f"Checking transcripts in s3://{transcript_bucket_name}/{transcript_prefix}")
-
-        # Check for casual greetings
-        user_query = body['UserQuery'].lower().strip()
-        greetings = ['hi', 'hello', 'hey', 'greetings']
-        is_greeting = any(greeting == user_query for greeting in greetings)
-
-        if is_greeting:
-            assistant_response = (
-                "# Welcome to Spectra!\n\n"
-                "Hello! I'm here to assist you with video analysis. "
-                "Ask anything about the video or start a conversation, and I'll provide a detailed response.\n\n"
-            )
-            message_list = normalize_conversation(body.get('conversation', []))
-            message_list.append({"role": "user", "content": [{"text": body['UserQuery']}]})
-
-            chat_response = copy.deepcopy(body)
-            message_list.append({"role": "assistant", "content": [{"text": assistant_response}]})
-            convo_last_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            chat_response.pop("UserQuery", None)
-            chat_response["conversation"] = message_list
-            chat_response["chatLastTime"] = convo_last_time
-            chat_response["assistantResponse"] = assistant_response
-            if not chat_response.get("chatTransactionId"):
-                chat_response["chatTransactionId"] = str(uuid.uuid4().hex)
-
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE',
-                    'Access-Control-Allow-Credentials': 'true'
-                },
-                'body': json.dumps(chat_response)
-            }
-
-        # List and merge all transcript files
-        transcript_keys = list_transcript_files(transcript_bucket_name, transcript_prefix)
-        if not transcript_keys:
-            error_msg = f"No transcript files found for videoId: {videoId}, executionArn: {executionArn} at {transcript_prefix}. Ensure the executionArn matches the S3 path."
-            logging.error(error_msg)
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': error_msg}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE',
-                    'Access-Control-Allow-Credentials': 'true'
-                }
-            }
-
-        # Merge transcripts into video_context
-        video_context = merge_transcripts(transcript_bucket_name, transcript_keys)
-        logging.info(f"Parsed video_context: {video_context}")
-
-        # Prepare system prompt with merged video_context
-        system_list = [{"text": system_template.replace("{video_context}", video_context)}]
-
-        # Handle conversation history
-        chat_response = copy.deepcopy(body)
-        message_list = normalize_conversation(body.get('conversation', []))
-        
-        # Add Markdown formatting instructions to the user query
-        additional_queries = (
-            "\n\nPlease provide the response in Markdown format with headers and small paragraphs for clarity. "
-            "Place any incidents or major events (e.g., accidents, injuries, robberies, or significant occurrences) under a `## Major Incident` header. "
-            "Wrap the entire `## Major Incident` section (including the header and its content) and any incident-related paragraphs (e.g., those describing the incident or its impact) in `<highlight>...</highlight>` tags to indicate they should be highlighted in the frontend. "
-            "Under `## Major Incident`, use numbered lists (e.g., `1. Item`) for chronological or sequential events to clearly outline the incident timeline. "
-            "For non-incident sections, use small paragraphs instead of bullet points to describe details (e.g., setting, context, or summary). "
-            "Use key-value pairs (e.g., `**Key**: Description`) for structured details outside of `## Major Incident`. "
-            "Use blockquotes (e.g., `> Summary`) to emphasize key summaries or conclusions. "
-            "Use horizontal rules (`---`) to separate distinct sections if needed."
-        )
-        modified_user_query = body['UserQuery'] + additional_queries
-        message_list.append({"role": "user", "content": [{"text": modified_user_query}]})
+        early_response, chat_state = prepare_chat(body)
+        if early_response:
+            return build_response(*early_response)
 
         # Call Bedrock AI for inference
         logging.info(f"Calling Bedrock with modelId: {body['modelId']}")
-        response = client.converse(
-            modelId=body["modelId"],
-            messages=message_list,
-            system=system_list,
-            inferenceConfig={
-                "temperature": body["inferenceConfig"]["temperature"],
-                "topP": body["inferenceConfig"]["topP"],
-                "maxTokens": body["inferenceConfig"]["maxTokens"]
-            }
-        )
+        with phase('bedrock'):
+            record_call()
+            response = bedrock_client().converse(**chat_state['converse_args'])
 
         # Extract AI response
         if response and 'output' in response and 'message' in response['output']:
@@ -275,49 +529,10 @@ def handler(event, context):
             logging.info(f"Assistant response (Markdown): {markdown_response}")
         else:
             logging.error("No response from AI model")
-            return {
-                'statusCode': 500,
-                'body': json.dumps({'error': 'No response from AI model'}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE',
-                    'Access-Control-Allow-Credentials': 'true'
-                }
-            }
-
-        # Append AI response to conversation
-        message_list.append({"role": "assistant", "content": [{"text": assistant_response}]})
-
-        # Update chat response
-        convo_last_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        chat_response.pop("UserQuery", None)
-        chat_response["conversation"] = message_list  # Keep Bedrock format
-        chat_response["chatLastTime"] = convo_last_time
-        chat_response["assistantResponse"] = markdown_response
-        if not chat_response.get("chatTransactionId"):
-            chat_response["chatTransactionId"] = str(uuid.uuid4().hex)
-
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE',
-                'Access-Control-Allow-Credentials': 'true'
-            },
-            'body': json.dumps(chat_response)
-        }
+            return build_response(500, {'error': 'No response from AI model'})
+
+        return build_response(200, finish_chat(chat_state, assistant_response, markdown_response))
 
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE',
-                'Access-Control-Allow-Credentials': 'true'
-            }
-        }
\ No newline at end of file
+        return build_response(500, {'error': str(e)})
@@ -0,0 +1,81 @@
+"""Bounded chat history: recent turns verbatim, older turns folded into a running summary."""
+import re
+
+HIGHLIGHT_TAG_PATTERN = re.compile(r"</?highlight>")
+MARKDOWN_NOISE_PATTERN = re.compile(r"[#*>`]+|^-{3,}$", re.MULTILINE)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def message_text(message):
+    """Plain text of a Bedrock-format message."""
+    return " ".join(part.get("text", "") for part in message.get("content", []) if isinstance(part, dict))
+
+
+def split_turns(messages):
+    """Group messages into turns, each starting at a user message."""
+    turns = []
+    for message in messages:
+        if message.get("role") == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def condense(text, max_chars):
+    """Collapse markdown and whitespace and cut text to max_chars."""
+    text = HIGHLIGHT_TAG_PATTERN.sub("", text)
+    text = MARKDOWN_NOISE_PATTERN.sub("", text)
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + "…"
+    return text
+
+
+def summarize_turn(turn, max_chars):
+    """One summary line per message of a turn."""
+    lines = []
+    for message in turn:
+        text = message_text(message)
+        if message.get("role") == "user":
+            # Stored user turns carry the Markdown formatting instructions after a blank line
+            question = text.split("\n\n", 1)[0]
+            lines.append(f"User asked: {condense(question, max_chars)}")
+        else:
+            lines.append(f"Assistant answered: {condense(text, max_chars)}")
+    return lines
+
+
+def compact_history(messages, summary, keep_turns, summary_token_cap, estimate_tokens, summarized_turns=0, line_chars=300):
+    """Keep the last keep_turns turns verbatim and fold older ones into the running summary.
+
+    summarized_turns is how many leading turns of messages the incoming summary already
+    covers; those are not summarized again. Turns it covers that are still recent are
+    replayed anyway. The summary is capped at summary_token_cap by dropping its oldest lines
+    first. Returns (recent_messages, summary, stats), where stats["summaryCoversTurns"] is
+    how many leading turns of recent_messages the summary covers, the count to send back
+    with recent_messages as the next request's conversation.
+    """
+    turns = split_turns(messages)
+    split_at = max(len(turns) - keep_turns, 0)
+    covered = min(max(summarized_turns, 0), len(turns))
+    older, recent = turns[covered:split_at], turns[split_at:]
+
+    lines = [line for line in (summary or "").splitlines() if line.strip()]
+    for turn in older:
+        lines.extend(summarize_turn(turn, line_chars))
+
+    dropped_lines = 0
+    while lines and estimate_tokens("\n".join(lines)) > summary_token_cap:
+        lines.pop(0)
+        dropped_lines += 1
+
+    summary = "\n".join(lines)
+    stats = {
+        "keptTurns": len(recent),
+        "summarizedTurns": len(older),
+        "summaryCoversTurns": max(covered - split_at, 0),
+        "summaryTokens": estimate_tokens(summary) if summary else 0,
+        "droppedSummaryLines": dropped_lines
+    }
+    return [message for turn in recent for message in turn], summary, stats
@@ -0,0 +1,3 @@
+#!/bin/sh
+# Entrypoint for the streaming chat function; the Lambda Web Adapter proxies requests to this server.
+PYTHONPATH=/opt/python:$LAMBDA_TASK_ROOT exec python3 stream_server.py
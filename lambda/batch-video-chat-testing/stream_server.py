@@ -0,0 +1,91 @@
+"""Streaming chat entrypoint served behind the AWS Lambda Web Adapter.
+
+The Python managed runtime cannot write a streamed response itself, so this function
+runs a small HTTP server (started by run.sh) and the Web Adapter forwards function URL
+requests to it in RESPONSE_STREAM mode. Answers are written as newline-delimited JSON
+frames: {"type": "delta", "text": ...} per token batch from Bedrock converse_stream,
+then one closing {"type": "final", "statusCode": ..., "data": <conversation envelope>}
+(or {"type": "error", ...}).
+"""
+import importlib
+import json
+import logging
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from phase_metrics import measure_invocation, phase, record_call
+
+chat = importlib.import_module('batch-video-chat-testing')
+
+PORT = int(os.environ.get('PORT', '8080'))
+
+
+class ChatStreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # Readiness check from the Web Adapter
+        payload = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        with measure_invocation('chat_stream'):
+            self.stream_answer()
+
+    def stream_answer(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            logging.info(f"Received streaming chat request for videoId: {body.get('videoId')}")
+
+            early_response, chat_state = chat.prepare_chat(body)
+            if early_response:
+                status_code, payload = early_response
+                self.write_frame({'type': 'final', 'statusCode': status_code, 'data': payload})
+                return
+
+            logging.info(f"Calling Bedrock converse_stream with modelId: {body['modelId']}")
+            parts = []
+            with phase('bedrock'):
+                record_call()
+                response = chat.bedrock_client().converse_stream(**chat_state['converse_args'])
+                for event in response['stream']:
+                    text = event.get('contentBlockDelta', {}).get('delta', {}).get('text')
+                    if text:
+                        parts.append(text)
+                        self.write_frame({'type': 'delta', 'text': text})
+                    elif 'metadata' in event:
+                        chat_state['context_stats']['usage'] = event['metadata'].get('usage', {})
+
+            assistant_response = "".join(parts)
+            if not assistant_response:
+                self.write_frame({'type': 'final', 'statusCode': 500, 'data': {'error': 'No response from AI model'}})
+                return
+            markdown_response = chat.format_to_markdown(assistant_response)
+            chat_response = chat.finish_chat(chat_state, assistant_response, markdown_response)
+            self.write_frame({'type': 'final', 'statusCode': 200, 'data': chat_response})
+        except Exception as e:
+            logging.error(f"Unexpected error while streaming: {e}")
+            self.write_frame({'type': 'error', 'statusCode': 500, 'error': str(e)})
+        finally:
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+
+    def write_frame(self, frame):
+        data = (json.dumps(frame) + '\n').encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.INFO)
+    ThreadingHTTPServer(('127.0.0.1', PORT), ChatStreamHandler).serve_forever()
@@ -0,0 +1,112 @@
+"""Warm-container cache of fetched transcript chunks, with an optional /tmp spill."""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+
+def listing_fingerprint(chunk_etags):
+    """Digest of a chunk listing ({key: etag}); changes whenever any chunk is added or rewritten."""
+    digest = hashlib.sha256()
+    for key in sorted(chunk_etags):
+        digest.update(f"{key}\0{chunk_etags[key]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """LRU of {key: entries} chunk maps per execution, bounded by serialized size in bytes.
+
+    Entries are validated against the listing fingerprint on every lookup, so a stale
+    transcript is never served. When spill_dir is set, entries are also written to disk
+    (bounded by spill_max_bytes) and read back after they fall out of memory.
+    """
+
+    def __init__(self, max_bytes, spill_dir=None, spill_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, cache_key, fingerprint):
+        """Return (chunks, source) where source is 'memory', 'disk' or 'miss'."""
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry and entry['fingerprint'] == fingerprint:
+                self.entries.move_to_end(cache_key)
+                return entry['chunks'], 'memory'
+
+        payload = self._read_spill(cache_key)
+        if payload and payload.get('fingerprint') == fingerprint:
+            chunks = payload['chunks']
+            self._remember(cache_key, fingerprint, chunks, len(json.dumps(chunks)))
+            return chunks, 'disk'
+        return None, 'miss'
+
+    def put(self, cache_key, fingerprint, chunks):
+        payload = json.dumps({'fingerprint': fingerprint, 'chunks': chunks})
+        self._remember(cache_key, fingerprint, chunks, len(payload))
+        self._write_spill(cache_key, payload)
+
+    def _remember(self, cache_key, fingerprint, chunks, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(cache_key, None)
+            if previous:
+                self.total_bytes -= previous['size']
+            self.entries[cache_key] = {'fingerprint': fingerprint, 'chunks': chunks, 'size': size}
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted['size']
+
+    def _spill_path(self, cache_key):
+        name = hashlib.sha256(cache_key.encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, f"{name}.json")
+
+    def _read_spill(self, cache_key):
+        if not self.spill_dir:
+            return None
+        try:
+            with open(self._spill_path(cache_key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable transcript spill for {cache_key}: {e}")
+            return None
+
+    def _write_spill(self, cache_key, payload):
+        if not self.spill_dir or len(payload) > self.spill_max_bytes:
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = self._spill_path(cache_key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            self._trim_spill()
+        except Exception as e:
+            logging.warning(f"Failed to spill transcript for {cache_key} to {self.spill_dir}: {e}")
+
+    def _trim_spill(self):
+        """Delete the least recently written spill files until the directory fits spill_max_bytes."""
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.spill_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,92 @@
+"""In-process BM25 index over per-chunk transcript text, used to pick chat context."""
+import math
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have how i in is it its of on or "
+    "that the there this to was were what when where which who why will with you video".split()
+)
+
+# Questions about the video as a whole need the full transcript rather than a few windows
+SUMMARY_QUERY_PATTERN = re.compile(
+    r"\b(summar\w*|overview|overall|recap|timeline|whole|entire|full video|"
+    r"describe the video|what happen\w*|everything)\b",
+    re.IGNORECASE,
+)
+
+
+def tokenize(text):
+    """Lower-case word tokens without stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_text(entries):
+    """Flatten one chunk's transcript entries into plain text."""
+    parts = []
+    for item in entries:
+        if isinstance(item, dict):
+            for key in sorted(item):
+                parts.append(str(item[key]))
+    return " ".join(parts)
+
+
+def is_summary_question(query):
+    """True when the question is about the video as a whole."""
+    return bool(SUMMARY_QUERY_PATTERN.search(query))
+
+
+class TranscriptIndex:
+    """Okapi BM25 over chunks ({key: entries}), preserving chunk_start order."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.keys = list(chunks)
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(chunk_text(entries))) for entries in chunks.values()]
+        self.doc_lengths = [sum(freqs.values()) for freqs in self.term_freqs]
+        self.avg_doc_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        self.doc_freqs = Counter()
+        for freqs in self.term_freqs:
+            self.doc_freqs.update(freqs.keys())
+
+    def idf(self, term):
+        doc_count = len(self.keys)
+        doc_freq = self.doc_freqs.get(term, 0)
+        return math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def search(self, query, top_k):
+        """Indices of the top_k chunks with a positive score, best first."""
+        terms = set(tokenize(query))
+        if not terms or not self.avg_doc_length:
+            return []
+        idfs = {term: self.idf(term) for term in terms if term in self.doc_freqs}
+        scores = []
+        for index, freqs in enumerate(self.term_freqs):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[index] / self.avg_doc_length)
+            for term, idf in idfs.items():
+                tf = freqs.get(term)
+                if tf:
+                    score += idf * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((score, index))
+        scores.sort(key=lambda pair: (-pair[0], pair[1]))
+        return [index for _, index in scores[:top_k]]
+
+
+def select_relevant_chunks(chunks, query, top_k, neighbours):
+    """Top-k chunks for query plus `neighbours` chunks either side, in chunk order.
+
+    Returns None when nothing in the transcript matches the question.
+    """
+    index = TranscriptIndex(chunks)
+    hits = index.search(query, top_k)
+    if not hits:
+        return None
+    selected = set()
+    for hit in hits:
+        selected.update(range(max(0, hit - neighbours), min(len(index.keys), hit + neighbours + 1)))
+    return {index.keys[i]: chunks[index.keys[i]] for i in sorted(selected)}
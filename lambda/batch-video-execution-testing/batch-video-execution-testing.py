@@ -1,102 +1,496 @@
 import json
 import uuid
-import requests
-import boto3
 import logging
+import math
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from chunk_store import EXECUTION_MANIFEST_NAME, split_s3_uri
+from aws_clients import get_client
+from inference_client import InferenceClient, is_request_error, is_unconfirmed_submission
+from inference_settings import get_inference_setting, get_inference_settings, prefetch_inference_settings
+from phase_metrics import instrumented, phase, record_call
 
 # Set up logging
 logging.getLogger().setLevel(logging.INFO)
-dynamodb = boto3.resource('dynamodb')
 
+# 'async' enqueues submissions on SUBMISSION_QUEUE_URL for worker_handler; a request can
+# override it with "submission_mode" in its body
+SUBMISSION_MODE = os.environ.get('SUBMISSION_MODE', 'sync')
+SUBMISSION_QUEUE_URL = os.environ.get('SUBMISSION_QUEUE_URL')
+SUBMISSION_MODES = ('sync', 'async')
+# Must match the queue's maxReceiveCount: the receive that fails for the last time marks the
+# execution FAILED before SQS parks the message in the dead-letter queue
+SUBMISSION_MAX_RECEIVE_COUNT = int(os.environ.get('SUBMISSION_MAX_RECEIVE_COUNT', '3'))
+# Written with If-None-Match so a redelivered message does not start a second inference job
+SUBMISSION_CLAIM_NAME = 'submission_claim.json'
+# Left of the worker's Lambda timeout after its POST gives up, to release the claim or record the outcome
+WORKER_DEADLINE_MARGIN_SECS = float(os.environ.get('WORKER_DEADLINE_MARGIN_SECS', '5'))
+
+INFERENCE_REQUEST_TIMEOUT_SECS = int(os.environ.get('INFERENCE_REQUEST_TIMEOUT_SECS', '60'))
+INFERENCE_MAX_RETRIES = int(os.environ.get('INFERENCE_MAX_RETRIES', '2'))
+INFERENCE_BREAKER_THRESHOLD = int(os.environ.get('INFERENCE_BREAKER_THRESHOLD', '3'))
+INFERENCE_BREAKER_COOLDOWN_SECS = float(os.environ.get('INFERENCE_BREAKER_COOLDOWN_SECS', '30'))
+
+# {"videos": [...]} bulk submissions: jobs per request, and how many are in flight at once
+BULK_SUBMISSION_MAX_VIDEOS = int(os.environ.get('BULK_SUBMISSION_MAX_VIDEOS', '200'))
+BULK_SUBMISSION_CONCURRENCY = int(os.environ.get('BULK_SUBMISSION_CONCURRENCY', '8'))
+# API Gateway drops the integration after 29 s whatever the Lambda timeout, so sync bulk
+# submissions must answer within it; no job is started with less than the minimum left
+API_INTEGRATION_TIMEOUT_SECS = float(os.environ.get('API_INTEGRATION_TIMEOUT_SECS', '29'))
+BULK_SUBMISSION_RESPONSE_MARGIN_SECS = float(os.environ.get('BULK_SUBMISSION_RESPONSE_MARGIN_SECS', '1'))
+BULK_SUBMISSION_MIN_JOB_SECS = float(os.environ.get('BULK_SUBMISSION_MIN_JOB_SECS', '5'))
+SQS_BATCH_SIZE = 10
+
+_inference_client = None
+_inference_client_lock = threading.Lock()
+
+def s3_client():
+    return get_client('s3', max_pool_connections=max(BULK_SUBMISSION_CONCURRENCY, 10))
+
+def sqs_client():
+    return get_client('sqs')
+
+def inference_client():
+    """Shared across invocations of a warm container: keep-alive connections and endpoint health."""
+    global _inference_client
+    if _inference_client is None:
+        with _inference_client_lock:
+            if _inference_client is None:
+                _inference_client = InferenceClient(
+                    max_retries=INFERENCE_MAX_RETRIES,
+                    failure_threshold=INFERENCE_BREAKER_THRESHOLD,
+                    cooldown_secs=INFERENCE_BREAKER_COOLDOWN_SECS,
+                    timeout=INFERENCE_REQUEST_TIMEOUT_SECS,
+                    pool_size=max(BULK_SUBMISSION_CONCURRENCY, 10)
+                )
+    return _inference_client
+
+# Load inference settings during init, off the first request's critical path
+prefetch_inference_settings()
+
+def request_setting(input_data, name):
+    """name from the request body, else from its InferenceParams block."""
+    value = input_data.get(name)
+    if value is None and isinstance(input_data.get('InferenceParams'), dict):
+        value = input_data['InferenceParams'].get(name)
+    return value
+
+def chunk_duration_secs(input_data):
+    """Chunk length the backend will cut the video into: the request's, else the inference settings'."""
+    chunk_duration = request_setting(input_data, 'chunk_duration_in_secs')
+    if chunk_duration is None:
+        try:
+            chunk_duration = get_inference_settings().get('chunk_duration_in_secs')
+        except Exception as e:
+            logging.warning("Could not read chunk_duration_in_secs from inference settings: %s", str(e))
+    return chunk_duration
+
+def expected_chunk_count(input_data, chunk_duration):
+    """Chunks the execution should produce, from expected_chunk_count or the video duration.
+
+    Returns None when neither is known; the status endpoint then falls back to the number
+    of chunk videos it has seen.
+    """
+    expected = request_setting(input_data, 'expected_chunk_count')
+    if expected:
+        return int(expected)
+    duration = request_setting(input_data, 'video_duration_in_secs')
+    if duration and chunk_duration:
+        return math.ceil(float(duration) / float(chunk_duration))
+    return None
+
+def execution_location(input_data, runtime_prefix):
+    """(bucket, execution folder key) from s3_dest_uri_w_prefix, or None if it lacks runtime_prefix."""
+    s3_uri = input_data.get('s3_dest_uri_w_prefix')
+    if not isinstance(s3_uri, str) or runtime_prefix not in s3_uri:
+        logging.warning("s3_dest_uri_w_prefix has no runtime_prefix: %s", s3_uri)
+        return None
+    bucket, key = split_s3_uri(s3_uri)
+    return bucket, key[:key.index(runtime_prefix) + len(runtime_prefix)]
+
+def write_execution_manifest(input_data, runtime_prefix, submitted_at, **details):
+    """Record what the execution should produce under its runtime_prefix, for status progress.
+
+    details (e.g. status and error for a submission that failed every retry) are added to it.
+    """
+    location = execution_location(input_data, runtime_prefix)
+    if location is None:
+        return None
+    bucket, execution_folder = location
+    manifest_key = f"{execution_folder}/{EXECUTION_MANIFEST_NAME}"
+    chunk_duration = chunk_duration_secs(input_data)
+    manifest = {
+        'executionId': runtime_prefix,
+        'expectedChunks': expected_chunk_count(input_data, chunk_duration),
+        'chunk_duration_in_secs': chunk_duration,
+        'submittedAt': submitted_at,
+        **details
+    }
+    manifest_body = json.dumps(manifest)
+    record_call(len(manifest_body))
+    s3_client().put_object(
+        Bucket=bucket,
+        Key=manifest_key,
+        Body=manifest_body,
+        ContentType='application/json'
+    )
+    logging.info("Wrote execution manifest s3://%s/%s: %s", bucket, manifest_key, json.dumps(manifest))
+    return manifest
+
+def build_response(status_code, payload):
+    return {
+        'statusCode': status_code,
+        'body': json.dumps(payload),
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Credentials': 'true'
+        }
+    }
+
+def apply_runtime_prefix(input_data):
+    """Generate the execution's runtime_prefix and substitute it into s3_dest_uri_w_prefix."""
+    # Generate runtime prefix
+    runtime_prefix = str(uuid.uuid4())
+    logging.info("Generated runtime_prefix: %s", runtime_prefix)
+    
+    # Update s3_dest_uri_w_prefix with runtime prefix
+    if 's3_dest_uri_w_prefix' in input_data:
+        s3_uri = input_data['s3_dest_uri_w_prefix']
+        if isinstance(s3_uri, str) and '{runtime_prefix}' in s3_uri:
+            try:
+                input_data['s3_dest_uri_w_prefix'] = s3_uri.format(runtime_prefix=runtime_prefix)
+                logging.info("Updated s3_dest_uri_w_prefix: %s", input_data['s3_dest_uri_w_prefix'])
+            except ValueError as e:
+                logging.error("String formatting error for s3_dest_uri_w_prefix: %s", str(e))
+                raise Exception(f"Invalid s3_dest_uri_w_prefix format: {s3_uri}")
+        else:
+            logging.warning("s3_dest_uri_w_prefix lacks {runtime_prefix} or is not a string, skipping formatting: %s", s3_uri)
+            # Optionally append runtime_prefix if needed
+            # input_data['s3_dest_uri_w_prefix'] = f"{s3_uri.rstrip('/')}/{runtime_prefix}/"
+    return runtime_prefix
+
+def inference_endpoints():
+    """Backends from the inference_endpoints setting, else the single inference_endpoint."""
+    endpoints = get_inference_settings().get('inference_endpoints')
+    return endpoints if endpoints else get_inference_setting('inference_endpoint')
+
+def post_to_inference(input_data, deadline=None):
+    """POST the job to a process_video endpoint; raises for transport and HTTP errors."""
+    with phase('settings'):
+        endpoints = inference_endpoints()
+    
+    logging.info("process_video endpoints: %s", endpoints)
+    
+    # Make POST request through the pooled client, which picks the endpoint and retries
+    logging.info("Sending POST request to process_video endpoint")
+    try:
+        with phase('inference'):
+            response = inference_client().post(endpoints, input_data, deadline=deadline)
+    finally:
+        logging.info("Inference endpoint stats: %s", json.dumps(inference_client().emit_endpoint_metrics()))
+    logging.info("Received response from process_video: %s", response.text)
+    return response
+
+def record_manifest(input_data, runtime_prefix, submitted_at):
+    # Progress reporting is best effort; a missing manifest must not fail the submission
+    try:
+        with phase('manifest_write'):
+            write_execution_manifest(input_data, runtime_prefix, submitted_at)
+    except Exception as e:
+        logging.error("Failed to write execution manifest: %s", str(e))
+
+def error_code(e):
+    return str(getattr(e, 'response', {}).get('Error', {}).get('Code'))
+
+def claim_submission(job):
+    """Claim the job's execution before posting it; False if an earlier delivery already holds it.
+
+    Jobs whose s3_dest_uri_w_prefix has nowhere to hold a claim are always submitted.
+    """
+    location = execution_location(job['input_data'], job['runtime_prefix'])
+    if location is None:
+        return True
+    bucket, execution_folder = location
+    record_call()
+    try:
+        s3_client().put_object(
+            Bucket=bucket,
+            Key=f"{execution_folder}/{SUBMISSION_CLAIM_NAME}",
+            Body=json.dumps({'claimedAt': datetime.now(timezone.utc).isoformat()}),
+            ContentType='application/json',
+            IfNoneMatch='*'
+        )
+    except s3_client().exceptions.ClientError as e:
+        if error_code(e) == 'PreconditionFailed':
+            return False
+        raise
+    return True
+
+def release_submission(job):
+    """Drop the claim after a failed POST so the redelivered message can try again."""
+    location = execution_location(job['input_data'], job['runtime_prefix'])
+    if location is None:
+        return
+    bucket, execution_folder = location
+    try:
+        record_call()
+        s3_client().delete_object(Bucket=bucket, Key=f"{execution_folder}/{SUBMISSION_CLAIM_NAME}")
+    except Exception as e:
+        logging.error("Failed to release submission claim for %s: %s", job['runtime_prefix'], str(e))
+
+def record_submission_state(job, status, error):
+    """Record a queued submission's outcome in its manifest: FAILED for good, or UNCONFIRMED after a read timeout."""
+    try:
+        with phase('manifest_write'):
+            write_execution_manifest(job['input_data'], job['runtime_prefix'], job.get('submitted_at'),
+                                     status=status, error=error)
+    except Exception as e:
+        logging.error("Failed to mark %s %s in its execution manifest: %s", job['runtime_prefix'], status, str(e))
+
+def worker_deadline(context):
+    """time.monotonic() by which the worker's POST must end, leaving WORKER_DEADLINE_MARGIN_SECS of its timeout."""
+    if context is None:
+        return None
+    return time.monotonic() + context.get_remaining_time_in_millis() / 1000 - WORKER_DEADLINE_MARGIN_SECS
+
+def job_message(input_data, runtime_prefix, submitted_at):
+    return json.dumps({
+        'runtime_prefix': runtime_prefix,
+        'submitted_at': submitted_at,
+        'input_data': input_data
+    })
+
+def enqueue_job(input_data, runtime_prefix, submitted_at):
+    """Queue the job for worker_handler and return the SQS message id."""
+    message_body = job_message(input_data, runtime_prefix, submitted_at)
+    with phase('enqueue'):
+        record_call(len(message_body))
+        response = sqs_client().send_message(QueueUrl=SUBMISSION_QUEUE_URL, MessageBody=message_body)
+    logging.info("Queued runtime_prefix %s as message %s", runtime_prefix, response['MessageId'])
+    return response['MessageId']
+
+def bulk_result(index, job, status, status_code, runtime_prefix=None, **details):
+    result = {
+        'index': index,
+        'status': status,
+        'statusCode': status_code,
+        'runtime_prefix': runtime_prefix,
+        's3_dest_uri_w_prefix': job.get('s3_dest_uri_w_prefix') if isinstance(job, dict) else None
+    }
+    result.update(details)
+    return result
+
+def submit_bulk_job(index, job, deadline):
+    """Submit one job of a sync bulk request; never raises."""
+    runtime_prefix = None
+    try:
+        runtime_prefix = apply_runtime_prefix(job)
+        submitted_at = datetime.now(timezone.utc).isoformat()
+        response = post_to_inference(job, deadline)
+        record_manifest(job, runtime_prefix, submitted_at)
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        return bulk_result(index, job, 'accepted', response.status_code, runtime_prefix, response=body)
+    except Exception as e:
+        if is_request_error(e):
+            status_code = getattr(getattr(e, 'response', None), 'status_code', None) or 502
+            return bulk_result(index, job, 'rejected', status_code, runtime_prefix, error=f"Failed to process video: {str(e)}")
+        return bulk_result(index, job, 'rejected', 400, runtime_prefix, error=str(e))
+
+def response_deadline(received_at, context):
+    """time.monotonic() by which a sync response must be built: the API Gateway limit or the Lambda's, if sooner."""
+    budget = API_INTEGRATION_TIMEOUT_SECS
+    if context is not None:
+        budget = min(budget, (time.monotonic() - received_at) + context.get_remaining_time_in_millis() / 1000)
+    return received_at + budget - BULK_SUBMISSION_RESPONSE_MARGIN_SECS
+
+def submit_bulk_sync(jobs, context, received_at):
+    """Post jobs with at most BULK_SUBMISSION_CONCURRENCY in flight.
+
+    The semaphore holds back dispatch until a slot frees up. Every POST is cut off at the
+    response deadline, and jobs dispatched with less than BULK_SUBMISSION_MIN_JOB_SECS left
+    are rejected instead of started.
+    """
+    results = [None] * len(jobs)
+    slots = threading.BoundedSemaphore(BULK_SUBMISSION_CONCURRENCY)
+    deadline = response_deadline(received_at, context)
+
+    def run(index, job):
+        try:
+            results[index] = submit_bulk_job(index, job, deadline)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=BULK_SUBMISSION_CONCURRENCY) as executor:
+        for index, job in enumerate(jobs):
+            slots.acquire()
+            if deadline - time.monotonic() < BULK_SUBMISSION_MIN_JOB_SECS:
+                slots.release()
+                results[index] = bulk_result(index, job, 'rejected', 503, error="Not submitted before the request deadline; resubmit")
+                continue
+            executor.submit(run, index, job)
+    return results
+
+def submit_bulk_async(jobs):
+    """Queue jobs with SendMessageBatch and write manifests for the ones SQS accepted."""
+    results = [None] * len(jobs)
+    queued = []
+    for index, job in enumerate(jobs):
+        try:
+            queued.append((index, job, apply_runtime_prefix(job), datetime.now(timezone.utc).isoformat()))
+        except Exception as e:
+            results[index] = bulk_result(index, job, 'rejected', 400, error=str(e))
+
+    accepted = []
+    for start in range(0, len(queued), SQS_BATCH_SIZE):
+        batch = queued[start:start + SQS_BATCH_SIZE]
+        entries = [
+            {'Id': str(index), 'MessageBody': job_message(job, runtime_prefix, submitted_at)}
+            for index, job, runtime_prefix, submitted_at in batch
+        ]
+        try:
+            with phase('enqueue'):
+                record_call(sum(len(entry['MessageBody']) for entry in entries))
+                response = sqs_client().send_message_batch(QueueUrl=SUBMISSION_QUEUE_URL, Entries=entries)
+        except Exception as e:
+            logging.error("Failed to queue bulk batch at %d: %s", start, str(e))
+            response = {'Failed': [{'Id': entry['Id'], 'Message': str(e)} for entry in entries]}
+        sent = {entry['Id']: entry['MessageId'] for entry in response.get('Successful', [])}
+        failed = {entry['Id']: entry.get('Message') or entry.get('Code') for entry in response.get('Failed', [])}
+        for index, job, runtime_prefix, submitted_at in batch:
+            if str(index) in sent:
+                results[index] = bulk_result(index, job, 'accepted', 202, runtime_prefix, messageId=sent[str(index)])
+                accepted.append((job, runtime_prefix, submitted_at))
+            else:
+                results[index] = bulk_result(index, job, 'rejected', 503, runtime_prefix,
+                                             error=f"Failed to queue video: {failed.get(str(index))}")
+
+    with ThreadPoolExecutor(max_workers=BULK_SUBMISSION_CONCURRENCY) as executor:
+        list(executor.map(lambda args: record_manifest(*args), accepted))
+    return results
+
+def bulk_handler(input_data, submission_mode, context, received_at):
+    """{"videos": [job, ...], ...}: other top-level fields are defaults merged into every job."""
+    videos = input_data.pop('videos')
+    if not videos:
+        return build_response(400, {'error': "videos must be a non-empty list of jobs"})
+    if len(videos) > BULK_SUBMISSION_MAX_VIDEOS:
+        return build_response(400, {'error': f"At most {BULK_SUBMISSION_MAX_VIDEOS} videos per request, got {len(videos)}"})
+
+    jobs = [{**input_data, **video} if isinstance(video, dict) else video for video in videos]
+    invalid = [index for index, job in enumerate(jobs) if not isinstance(job, dict)]
+    if invalid:
+        return build_response(400, {'error': f"videos entries must be objects (invalid indexes: {invalid})"})
+
+    logging.info("Submitting %d videos in %s mode", len(jobs), submission_mode)
+    results = submit_bulk_async(jobs) if submission_mode == 'async' else submit_bulk_sync(jobs, context, received_at)
+    accepted = sum(1 for result in results if result['status'] == 'accepted')
+    return build_response(202 if submission_mode == 'async' else 200, {
+        'accepted': accepted,
+        'rejected': len(results) - accepted,
+        'results': results
+    })
+
+@instrumented('execution')
 def handler(event, context):
+    received_at = time.monotonic()
     try:
         logging.info("Received event: %s", json.dumps(event))
         
         # Extract input data from the event body
         input_data = json.loads(event['body']) if isinstance(event.get('body'), str) else event.get('body', {})
         logging.info("Parsed input_data: %s", json.dumps(input_data))
+
+        submission_mode = input_data.pop('submission_mode', SUBMISSION_MODE)
+        if submission_mode not in SUBMISSION_MODES:
+            return build_response(400, {'error': f"submission_mode must be one of {', '.join(SUBMISSION_MODES)}"})
+        if submission_mode == 'async' and not SUBMISSION_QUEUE_URL:
+            return build_response(400, {'error': "Async submission is not configured (SUBMISSION_QUEUE_URL is unset)"})
+
+        if isinstance(input_data.get('videos'), list):
+            return bulk_handler(input_data, submission_mode, context, received_at)
         
-        # Generate runtime prefix
-        runtime_prefix = str(uuid.uuid4())
-        logging.info("Generated runtime_prefix: %s", runtime_prefix)
-        
-        # Update s3_dest_uri_w_prefix with runtime prefix
-        if 's3_dest_uri_w_prefix' in input_data:
-            s3_uri = input_data['s3_dest_uri_w_prefix']
-            if isinstance(s3_uri, str) and '{runtime_prefix}' in s3_uri:
-                try:
-                    input_data['s3_dest_uri_w_prefix'] = s3_uri.format(runtime_prefix=runtime_prefix)
-                    logging.info("Updated s3_dest_uri_w_prefix: %s", input_data['s3_dest_uri_w_prefix'])
-                except ValueError as e:
-                    logging.error("String formatting error for s3_dest_uri_w_prefix: %s", str(e))
-                    raise Exception(f"Invalid s3_dest_uri_w_prefix format: {s3_uri}")
-            else:
-                logging.warning("s3_dest_uri_w_prefix lacks {runtime_prefix} or is not a string, skipping formatting: %s", s3_uri)
-                # Optionally append runtime_prefix if needed
-                # input_data['s3_dest_uri_w_prefix'] = f"{s3_uri.rstrip('/')}/{runtime_prefix}/"
-        
-        table_name = os.environ.get('INFERENCE_SETTINGS_TABLE_NAME', 'inference-settings')
-        logging.info("Using DynamoDB table: %s", table_name)
-        table = dynamodb.Table(table_name)
-        
-        # Check if the video entry exists in DynamoDB
+        runtime_prefix = apply_runtime_prefix(input_data)
+        submitted_at = datetime.now(timezone.utc).isoformat()
+
+        if submission_mode == 'async':
+            # The manifest is written at enqueue time so status reports the execution while it waits
+            message_id = enqueue_job(input_data, runtime_prefix, submitted_at)
+            record_manifest(input_data, runtime_prefix, submitted_at)
+            return build_response(202, {
+                'status': 'QUEUED',
+                'runtime_prefix': runtime_prefix,
+                's3_dest_uri_w_prefix': input_data.get('s3_dest_uri_w_prefix'),
+                'messageId': message_id
+            })
+
         try:
-            inference_record = table.get_item(
-                Key={'inference_setting_id': '1'}  # Partition key is a string
-            )
-        except dynamodb.meta.client.exceptions.ResourceNotFoundException:
-            logging.error("DynamoDB table %s does not exist", table_name)
-            raise Exception(f"DynamoDB table {table_name} does not exist")
-        
-        item = inference_record.get('Item')
-        if not item:
-            raise Exception("Inference setting not found for inference_setting_id: 1")
-        inference_endpoint = item.get('inference_endpoint')
-        if not inference_endpoint:
-            raise Exception("inference_endpoint not found in item")
-        
-        logging.info("process_video endpoint: %s", inference_endpoint)
-        
-        # Make POST request to the specified URL
-        logging.info("Sending POST request to process_video endpoint")
-        response = requests.post(
-            inference_endpoint,
-            json=input_data,
-            timeout=60
-        )
-        response.raise_for_status()
-        logging.info("Received response from process_video: %s", response.text)
+            response = post_to_inference(input_data, response_deadline(received_at, context))
+        except Exception as e:
+            if not is_unconfirmed_submission(e):
+                raise
+            # The backend may have accepted the job, so keep the execution visible to status
+            logging.error("No answer from process_video before the request deadline: %s", str(e))
+            record_manifest(input_data, runtime_prefix, submitted_at)
+            return build_response(504, {
+                'error': f"Inference endpoint did not answer in time; the job may still run: {str(e)}",
+                'runtime_prefix': runtime_prefix,
+                's3_dest_uri_w_prefix': input_data.get('s3_dest_uri_w_prefix')
+            })
+
+        # Written only once the job is accepted, so a rejected submission leaves no execution folder
+        record_manifest(input_data, runtime_prefix, submitted_at)
         
-        return {
-            'statusCode': response.status_code,
-            'body': json.dumps(response.json()),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Credentials': 'true'
-            }
-        }
+        return build_response(response.status_code, response.json())
     
-    except requests.exceptions.RequestException as e:
-        logging.error("Error in POST request: %s", str(e))
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': f"Failed to process video: {str(e)}"}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Credentials': 'true'
-            }
-        }
     except Exception as e:
+        if is_request_error(e):
+            logging.error("Error in POST request: %s", str(e))
+            return build_response(500, {'error': f"Failed to process video: {str(e)}"})
         logging.error("Unexpected error: %s", str(e))
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': f"Unexpected error: {str(e)}"}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Credentials': 'true'
-            }
-        }
\ No newline at end of file
+        return build_response(500, {'error': f"Unexpected error: {str(e)}"})
+
+@instrumented('execution_worker')
+def worker_handler(event, context):
+    """Drain queued submissions into the inference endpoint.
+
+    Failed messages are reported in batchItemFailures so SQS redelivers only those; after
+    the queue's maxReceiveCount they move to the dead-letter queue, and the last failure is
+    recorded in the execution manifest. Each job is claimed before it is posted, so a message
+    delivered again after a successful POST is acknowledged without submitting it twice. The
+    claim is released only when the job was certainly not accepted; after a read timeout it is
+    kept, the manifest records the submission as UNCONFIRMED and the message is acknowledged.
+    """
+    batch_item_failures = []
+    for record in event.get('Records', []):
+        job = None
+        receive_count = int(record.get('attributes', {}).get('ApproximateReceiveCount', 1))
+        try:
+            job = json.loads(record['body'])
+            logging.info("Submitting queued runtime_prefix %s (receive count %d)", job['runtime_prefix'], receive_count)
+            if not claim_submission(job):
+                logging.warning("runtime_prefix %s was already submitted, skipping message %s",
+                                job['runtime_prefix'], record.get('messageId'))
+                continue
+            try:
+                post_to_inference(job['input_data'], worker_deadline(context))
+            except Exception as e:
+                if is_unconfirmed_submission(e):
+                    logging.error("No answer for runtime_prefix %s, keeping its claim: %s", job['runtime_prefix'], str(e))
+                    record_submission_state(job, 'UNCONFIRMED', f"Inference endpoint did not answer; the job may still run: {str(e)}")
+                    continue
+                release_submission(job)
+                raise
+        except Exception as e:
+            logging.error("Failed to submit message %s: %s", record.get('messageId'), str(e))
+            if isinstance(job, dict) and receive_count >= SUBMISSION_MAX_RECEIVE_COUNT:
+                record_submission_state(job, 'FAILED', f"Failed to process video: {str(e)}")
+            batch_item_failures.append({'itemIdentifier': record['messageId']})
+    return {'batchItemFailures': batch_item_failures}
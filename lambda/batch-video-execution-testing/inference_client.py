@@ -0,0 +1,235 @@
+"""Pooled HTTP client for the inference endpoints, with retries, circuit breaking and weighted routing."""
+import logging
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+from phase_metrics import record_call, record_metrics
+
+RETRYABLE_STATUS_CODES = frozenset({500, 502, 503, 504})
+
+
+def is_request_error(error):
+    """True for requests exceptions; never imports requests just to check."""
+    requests = sys.modules.get('requests')
+    return requests is not None and isinstance(error, requests.exceptions.RequestException)
+
+
+def is_unconfirmed_submission(error):
+    """True for a read timeout: the request was sent, so the backend may have accepted the job."""
+    requests = sys.modules.get('requests')
+    return (requests is not None and isinstance(error, requests.exceptions.Timeout)
+            and not isinstance(error, requests.exceptions.ConnectionError))
+
+
+def normalize_endpoints(value):
+    """[{'url': ..., 'weight': ...}] from a URL, a list of URLs/dicts, or a {name: url} map."""
+    if isinstance(value, str):
+        value = [value]
+    elif isinstance(value, dict):
+        value = list(value.values())
+    endpoints = []
+    for entry in value or []:
+        if isinstance(entry, str):
+            endpoints.append({'url': entry, 'weight': 1.0})
+        elif isinstance(entry, dict) and entry.get('url'):
+            endpoints.append({'url': entry['url'], 'weight': float(entry.get('weight', 1))})
+    return endpoints
+
+
+class EndpointHealth:
+    """Recent latency of successful requests and error rate of one endpoint, and its circuit state."""
+
+    def __init__(self, url, window):
+        self.url = url
+        self.latencies = deque(maxlen=window)
+        self.latency_ewma = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record(self, latency, failed, alpha):
+        # Fast failures would otherwise make a broken endpoint look like the quickest one
+        self.requests += 1
+        if not failed:
+            self.latencies.append(latency)
+            self.latency_ewma = latency if self.latency_ewma is None else alpha * latency + (1 - alpha) * self.latency_ewma
+        self.error_rate = alpha * (1.0 if failed else 0.0) + (1 - alpha) * self.error_rate
+        self.trial_in_flight = False
+        if failed:
+            self.failures += 1
+            self.consecutive_failures += 1
+        else:
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def circuit(self, now, cooldown):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if now - self.opened_at >= cooldown else 'open'
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    def snapshot(self, now, cooldown):
+        def millis(seconds):
+            return None if seconds is None else round(seconds * 1000, 1)
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'errorRate': round(self.error_rate, 3),
+            'latencyEwmaMs': millis(self.latency_ewma),
+            'p50Ms': millis(self.percentile(0.5)),
+            'p95Ms': millis(self.percentile(0.95)),
+            'circuit': self.circuit(now, cooldown)
+        }
+
+
+class InferenceClient:
+    """Keep-alive session shared by every request in a warm container.
+
+    Each attempt goes to an endpoint picked at random, weighted by its configured weight over
+    its recent latency and error rate. An endpoint with failure_threshold consecutive failures
+    is skipped for cooldown_secs, then let through for one trial request. Connection errors
+    and 5xx responses are retried with full-jitter backoff, preferring another endpoint; read
+    timeouts are not retried because the backend may already have accepted the job.
+    """
+
+    def __init__(self, max_retries=2, backoff_base=0.2, backoff_cap=2.0, failure_threshold=3,
+                 cooldown_secs=30.0, timeout=60, pool_size=10, latency_window=100, alpha=0.2):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.failure_threshold = failure_threshold
+        self.cooldown_secs = cooldown_secs
+        self.timeout = timeout
+        self.latency_window = latency_window
+        self.alpha = alpha
+        self.health = {}
+        self.lock = threading.Lock()
+        # Imported here so handlers that never post (async enqueue) do not load requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _health(self, url):
+        if url not in self.health:
+            self.health[url] = EndpointHealth(url, self.latency_window)
+        return self.health[url]
+
+    def _score(self, endpoint, health, default_latency):
+        latency = health.latency_ewma if health.latency_ewma is not None else default_latency
+        return endpoint['weight'] / max(latency, 0.001) * max(1.0 - health.error_rate, 0.05)
+
+    def choose_endpoint(self, endpoints, exclude=()):
+        """Pick the next endpoint URL; falls back to the longest-open circuit if all are open."""
+        now = time.monotonic()
+        with self.lock:
+            candidates = [endpoint for endpoint in endpoints if endpoint['url'] not in exclude] or endpoints
+            healths = {endpoint['url']: self._health(endpoint['url']) for endpoint in candidates}
+            available = []
+            for endpoint in candidates:
+                health = healths[endpoint['url']]
+                circuit = health.circuit(now, self.cooldown_secs)
+                if circuit == 'closed' or (circuit == 'half_open' and not health.trial_in_flight):
+                    available.append(endpoint)
+            if not available:
+                url = min(healths.values(), key=lambda health: health.opened_at).url
+                logging.warning("All inference endpoint circuits are open, trying %s", url)
+                return url
+
+            known = [healths[e['url']].latency_ewma for e in available if healths[e['url']].latency_ewma is not None]
+            default_latency = sum(known) / len(known) if known else 1.0
+            weights = [self._score(endpoint, healths[endpoint['url']], default_latency) for endpoint in available]
+            url = random.choices(available, weights=weights)[0]['url']
+            health = healths[url]
+            if health.circuit(now, self.cooldown_secs) == 'half_open':
+                health.trial_in_flight = True
+            return url
+
+    def _record(self, url, latency, failed):
+        with self.lock:
+            health = self._health(url)
+            health.record(latency, failed, self.alpha)
+            if failed and health.consecutive_failures >= self.failure_threshold:
+                if health.opened_at is None:
+                    logging.warning("Opening circuit for inference endpoint %s after %d failures",
+                                    url, health.consecutive_failures)
+                health.opened_at = time.monotonic()
+
+    def _backoff(self, attempt):
+        time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt))))
+
+    def post(self, endpoints, json_body, deadline=None):
+        """POST json_body to one of endpoints and return the response; raises like requests.
+
+        deadline (a time.monotonic() value) caps every attempt's timeout, and no attempt is
+        started once it has passed.
+        """
+        import requests
+        endpoints = normalize_endpoints(endpoints)
+        if not endpoints:
+            raise ValueError("No inference endpoints configured")
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            timeout = self.timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    # Nothing was sent, so this is no more ambiguous than a failed connect
+                    raise requests.exceptions.ConnectTimeout("Request deadline passed before the inference request was sent")
+            url = self.choose_endpoint(endpoints, exclude=tried)
+            tried.add(url)
+            started = time.monotonic()
+            record_call()
+            try:
+                response = self.session.post(url, json=json_body, timeout=timeout)
+            except requests.exceptions.ConnectionError as e:
+                self._record(url, time.monotonic() - started, failed=True)
+                logging.warning("Connection to %s failed (attempt %d): %s", url, attempt + 1, str(e))
+                if attempt == self.max_retries:
+                    raise
+                self._backoff(attempt)
+                continue
+            except requests.exceptions.RequestException:
+                self._record(url, time.monotonic() - started, failed=True)
+                raise
+
+            failed = response.status_code in RETRYABLE_STATUS_CODES
+            self._record(url, time.monotonic() - started, failed=failed)
+            if failed and attempt < self.max_retries:
+                logging.warning("%s returned %d (attempt %d), retrying", url, response.status_code, attempt + 1)
+                self._backoff(attempt)
+                continue
+            response.raise_for_status()
+            return response
+
+    def endpoint_stats(self):
+        """Per-endpoint request counts, error rate, latency and circuit state."""
+        now = time.monotonic()
+        with self.lock:
+            return {url: health.snapshot(now, self.cooldown_secs) for url, health in self.health.items()}
+
+    def emit_endpoint_metrics(self):
+        """Report each endpoint's health as EMF metrics of the current invocation, with an Endpoint dimension."""
+        stats = self.endpoint_stats()
+        for url, snapshot in stats.items():
+            record_metrics({'Endpoint': url}, {
+                'EndpointErrorRate': (snapshot['errorRate'], 'None'),
+                'EndpointLatencyEwma': (snapshot['latencyEwmaMs'], 'Milliseconds'),
+                'EndpointLatencyP50': (snapshot['p50Ms'], 'Milliseconds'),
+                'EndpointLatencyP95': (snapshot['p95Ms'], 'Milliseconds'),
+                'EndpointCircuitOpen': (0 if snapshot['circuit'] == 'closed' else 1, 'Count')
+            })
+        return stats
@@ -1,224 +1,359 @@
-import boto3
 import json
 import logging
 import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
 
-s3_client = boto3.client("s3")
-dynamodb = boto3.resource('dynamodb')
+from aws_clients import get_client, get_resource
+from chunk_store import (
+    chunk_base_name,
+    decode_chunk_body,
+    execution_manifest_key,
+    find_internal_server_error_in_bytes,
+    is_chunk_video_key,
+    is_transcript_key,
+    iter_chunk_objects
+)
+from inference_settings import get_inference_setting, prefetch_inference_settings
+from phase_metrics import instrumented, phase, record_call
 
-def handler(event, context):
-    # bucket_name = "cache-us-east-1-054037105643-15bd31e070bd"
-    
-    table_name = os.environ.get('INFERENCE_SETTINGS_TABLE_NAME', 'inference-settings')
-    logging.info("Using DynamoDB table: %s", table_name)
-    table = dynamodb.Table(table_name)
-        
-    # Check if the video entry exists in DynamoDB
+# Per-chunk arrival/error state written by batch-video-status-indexer from S3 notifications
+STATUS_INDEX_TABLE_NAME = os.environ.get('STATUS_INDEX_TABLE_NAME')
+
+# Bounded fan-out for the chunk error scan
+ERROR_SCAN_CONCURRENCY = int(os.environ.get('ERROR_SCAN_CONCURRENCY', '16'))
+
+# POST batch-status: executions per request, and how many are resolved at once
+BATCH_STATUS_MAX_ITEMS = int(os.environ.get('BATCH_STATUS_MAX_ITEMS', '50'))
+BATCH_STATUS_CONCURRENCY = int(os.environ.get('BATCH_STATUS_CONCURRENCY', '8'))
+
+# Manifests change only when a queued submission fails or goes unconfirmed, before any chunks;
+# warm containers keep the ones they have read and re-read them while an execution has none
+MANIFEST_CACHE_MAX_ENTRIES = int(os.environ.get('MANIFEST_CACHE_MAX_ENTRIES', '256'))
+
+def s3_client():
+    return get_client("s3", max_pool_connections=ERROR_SCAN_CONCURRENCY + BATCH_STATUS_CONCURRENCY)
+
+manifest_cache = {}
+manifest_cache_lock = threading.Lock()
+
+# Load inference settings during init, off the first request's critical path
+prefetch_inference_settings()
+
+def build_response(status_code, payload):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST"
+        },
+        "body": json.dumps(payload)
+    }
+
+def status_payload(status, video_id, execution_id, failed_chunks=None, progress=None, error=None):
+    data = {
+        "status": status,
+        "videoId": video_id,
+        "executionId": execution_id
+    }
+    if error:
+        data["error"] = error
+    if failed_chunks:
+        data["failedChunks"] = failed_chunks
+    if progress:
+        data["progress"] = progress
+    return {"data": data}
+
+def load_execution_manifest(bucket_name, video_id, execution_id, refresh=False):
+    """Manifest written at submission by batch-video-execution-testing, or None if there is none."""
+    manifest_key = execution_manifest_key(video_id, execution_id)
+    with manifest_cache_lock:
+        if not refresh and manifest_key in manifest_cache:
+            return manifest_cache[manifest_key]
     try:
-        inference_record = table.get_item(
-            Key={'inference_setting_id': '1'}  # Partition key is a string
-        )
-    except dynamodb.meta.client.exceptions.ResourceNotFoundException:
-        logging.error("DynamoDB table %s does not exist", table_name)
-        raise Exception(f"DynamoDB table {table_name} does not exist")
-        
-    item = inference_record.get('Item')
-    if not item:
-        raise Exception("Inference setting not found for inference_setting_id: 1")
-    cache_bucket = item.get('cache_bucket')
-    if not cache_bucket:
-        raise Exception("cache_bucket not found in item")
-        
-    logging.info("cache_bucket: %s", cache_bucket)
-    
-    bucket_name = cache_bucket
+        with phase("manifest"):
+            record_call()
+            s3_response = s3_client().get_object(Bucket=bucket_name, Key=manifest_key)
+            manifest = json.loads(s3_response["Body"].read())
+    except s3_client().exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        print(f"Error reading execution manifest {manifest_key}: {str(e)}")
+        return None
+    with manifest_cache_lock:
+        if len(manifest_cache) >= MANIFEST_CACHE_MAX_ENTRIES:
+            manifest_cache.pop(next(iter(manifest_cache)))
+        manifest_cache[manifest_key] = manifest
+    return manifest
 
-    # Extract videoId and executionUUID from path parameters
-    video_id = event.get("pathParameters", {}).get("videoId")
-    execution_UUID = event.get("pathParameters", {}).get("executionId")
-    
-    if not video_id or not execution_UUID:
-        print(f"Error: Missing videoId or executionUUID (videoId={video_id}, executionUUID={execution_UUID})")
-        return {
-            "statusCode": 400,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "OPTIONS,GET"
-            },
-            "body": json.dumps({"error": "videoId or executionUUID is missing"})
-        }
+def parse_timestamp(value):
+    """Aware datetime from an S3 LastModified datetime or an ISO-8601 string."""
+    if isinstance(value, datetime):
+        timestamp = value
+    else:
+        timestamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+def execution_progress(manifest, completion_times, chunk_videos=0, now=None):
+    """Completed/expected chunks, throughput and ETA from chunk transcript write times.
+
+    expectedChunks comes from the manifest when the submission knew it, otherwise from the
+    chunk videos cut so far (a lower bound until chunking finishes); expectedChunksSource
+    says which. Throughput is measured from the manifest's submittedAt when there is one,
+    otherwise between the first and last completed chunk.
+    """
+    now = now or datetime.now(timezone.utc)
+    times = sorted(parse_timestamp(value) for value in completion_times if value)
+    completed = len(times)
+    expected = (manifest or {}).get("expectedChunks")
+    source = "manifest" if expected else None
+    if not expected and chunk_videos:
+        expected, source = chunk_videos, "chunkVideos"
+    progress = {
+        "completedChunks": completed,
+        "expectedChunks": expected,
+        "expectedChunksSource": source,
+        "chunksPerMinute": None,
+        "etaSeconds": None
+    }
+    if expected:
+        progress["percentComplete"] = round(100.0 * min(completed, expected) / expected, 1)
+
+    if manifest and manifest.get("submittedAt"):
+        started_at, counted = parse_timestamp(manifest["submittedAt"]), completed
+    elif completed > 1:
+        started_at, counted = times[0], completed - 1
+    else:
+        return progress
+    if not times:
+        return progress
+    elapsed = (times[-1] - started_at).total_seconds()
+    if elapsed <= 0 or counted <= 0:
+        return progress
+
+    rate = counted / elapsed
+    progress["chunksPerMinute"] = round(rate * 60, 2)
+    if expected:
+        remaining = max(expected - completed, 0)
+        finish_at = times[-1] + timedelta(seconds=remaining / rate)
+        progress["etaSeconds"] = max(int((finish_at - now).total_seconds()), 0)
+        progress["estimatedCompletionAt"] = finish_at.isoformat()
+    return progress
+
+def query_status_index(video_id, execution_id):
+    """All indexed chunk items for an execution (empty when the index has none)."""
+    from boto3.dynamodb.conditions import Key
+    table = get_resource('dynamodb').Table(STATUS_INDEX_TABLE_NAME)
+    query_args = {"KeyConditionExpression": Key("execution_key").eq(f"{video_id}/{execution_id}")}
+    items = []
+    while True:
+        response = table.query(**query_args)
+        record_call()
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+def status_from_index(items):
+    """Same RUNNING/FAILED/SUCCEEDED rules as the S3 scan, answered from index items.
+
+    Returns (status, failed_chunks, completion_times).
+    """
+    video_chunks = {item["chunk_id"] for item in items if item.get("has_video")}
+    transcript_chunks = {item["chunk_id"] for item in items if item.get("has_transcript")}
+    completion_times = [item.get("transcript_at") for item in items if item.get("has_transcript")]
+    if not video_chunks or video_chunks - transcript_chunks:
+        return "RUNNING", [], completion_times
+    # Same {"key", "entry"} shape as find_failed_chunks; items indexed before failed_entry was
+    # recorded have no entry
+    failed_chunks = [{"key": item.get("transcript_key"), "entry": item.get("failed_entry")}
+                     for item in items if item.get("failed")]
+    if failed_chunks:
+        return "FAILED", failed_chunks, completion_times
+    return "SUCCEEDED", [], completion_times
+
+def scan_chunk_for_error(bucket_name, json_file):
+    """Key of the failing entry in one chunk transcript, or None if it is clean."""
+    s3_response = s3_client().get_object(Bucket=bucket_name, Key=json_file)
+    raw = s3_response["Body"].read()
+    record_call(len(raw))
+    return find_internal_server_error_in_bytes(decode_chunk_body(raw))
+
+def find_failed_chunks(bucket_name, json_files):
+    """Scan chunk transcripts concurrently and stop at the first failure.
 
+    Outstanding fetches are cancelled once a failed chunk is found; every failed chunk
+    seen by then is reported. Read errors propagate to the caller.
+    """
+    failed_chunks = []
+    if not json_files:
+        return failed_chunks
+    executor = ThreadPoolExecutor(max_workers=min(ERROR_SCAN_CONCURRENCY, len(json_files)))
+    try:
+        futures = {executor.submit(scan_chunk_for_error, bucket_name, json_file): json_file for json_file in json_files}
+        pending = set(futures)
+        while pending and not failed_chunks:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error_key = future.result()
+                if error_key is not None:
+                    failed_chunks.append({"key": futures[future], "entry": error_key})
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return failed_chunks
+
+def status_from_s3(bucket_name, video_id, execution_UUID):
+    """Work out execution status by listing the execution prefix and reading chunk transcripts."""
     # Construct S3 folder path
     folder_prefix = f"batch-videos/{video_id}/{execution_UUID}/"
     chunks_prefix = f"{folder_prefix}chunks/"
     print(f"Listing objects in s3://{bucket_name}/{folder_prefix}")
 
     try:
-        # Check if the folder exists
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=folder_prefix, MaxKeys=1)
-        print(f"List objects response: {response}")
+        # Check if the folder exists; stop after the first key
+        with phase("s3_list"):
+            first_object = next(iter_chunk_objects(s3_client(), bucket_name, folder_prefix, page_size=1), None)
         
-        if "Contents" not in response:
+        if first_object is None:
             print(f"No folder found: {folder_prefix}")
-            return {
-                "statusCode": 404,
-                "headers": {
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "OPTIONS,GET"
-                },
-                "body": json.dumps({
-                    "data": {
-                        "status": "NO_SUCH_EXECUTION",
-                        "videoId": video_id,
-                        "executionId": execution_UUID
-                    }
-                })
-            }
-
-        # Check for chunks folder and contents
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=chunks_prefix)
-        print(f"List chunks response: {response}")
+            return 404, status_payload("NO_SUCH_EXECUTION", video_id, execution_UUID)
+
+        # Stream the chunks listing page by page, keeping only chunk videos and transcripts;
+        # transcript LastModified times give progress without reading chunk bodies
+        found_chunks = False
+        mp4_base_names = set()
+        json_files = []
+        completion_times = []
+        with phase("s3_list"):
+            for obj in iter_chunk_objects(s3_client(), bucket_name, chunks_prefix):
+                found_chunks = True
+                key = obj["Key"]
+                if is_chunk_video_key(key):
+                    mp4_base_names.add(chunk_base_name(key))
+                elif is_transcript_key(key):
+                    json_files.append(key)
+                    completion_times.append(obj.get("LastModified"))
+        print(f"Found {len(mp4_base_names)} .mp4 and {len(json_files)} .json chunk files in: {chunks_prefix}")
+
+        progress = execution_progress(load_execution_manifest(bucket_name, video_id, execution_UUID), completion_times,
+                                      len(mp4_base_names))
         
-        if "Contents" not in response:
+        if not found_chunks:
             print(f"No chunks folder or contents found: {chunks_prefix}")
-            return {
-                "statusCode": 200,
-                "headers": {
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "OPTIONS,GET"
-                },
-                "body": json.dumps({
-                    "data": {
-                        "status": "RUNNING",
-                        "videoId": video_id,
-                        "executionId": execution_UUID
-                    }
-                })
-            }
-
-        # Collect .mp4 and .json files
-        mp4_files = []
-        json_files = []
-        for obj in response.get("Contents", []):
-            key = obj["Key"]
-            if key.endswith(".mp4"):
-                mp4_files.append(key)
-                print(f"Found .mp4 file: {key}")
-            elif key.endswith(".json"):
-                json_files.append(key)
-                print(f"Found .json file: {key}")
-
-        if not mp4_files:
+            # A queued submission that failed every retry never produces chunks
+            manifest = load_execution_manifest(bucket_name, video_id, execution_UUID, refresh=True)
+            if manifest and manifest.get("status") == "FAILED":
+                return 200, status_payload("FAILED", video_id, execution_UUID, progress=progress, error=manifest.get("error"))
+            # An UNCONFIRMED submission may still produce chunks, so it stays RUNNING with its error
+            return 200, status_payload("RUNNING", video_id, execution_UUID, progress=progress,
+                                       error=(manifest or {}).get("error"))
+
+        if not mp4_base_names:
             print(f"No .mp4 files found in: {chunks_prefix}")
-            return {
-                "statusCode": 200,
-                "headers": {
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "OPTIONS,GET"
-                },
-                "body": json.dumps({
-                    "data": {
-                        "status": "RUNNING",
-                        "videoId": video_id,
-                        "executionId": execution_UUID
-                    }
-                })
-            }
+            return 200, status_payload("RUNNING", video_id, execution_UUID, progress=progress)
 
         # Check for matching .json files
-        mp4_base_names = {key.rsplit("/", 1)[-1].rsplit(".", 1)[0].removeprefix("det_") for key in mp4_files}
-        json_base_names = {key.rsplit("/", 1)[-1].rsplit(".", 1)[0].replace("ts_", "", 1) for key in json_files}
+        json_base_names = {chunk_base_name(key) for key in json_files}
         missing_json = mp4_base_names - json_base_names
         
         if missing_json:
             print(f"Missing .json files for .mp4 files: {missing_json}")
-            return {
-                "statusCode": 200,
-                "headers": {
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "OPTIONS,GET"
-                },
-                "body": json.dumps({
-                    "data": {
-                        "status": "RUNNING",
-                        "videoId": video_id,
-                        "executionId": execution_UUID
-                    }
-                })
-            }
-
-        # Check each .json file for errors
-        status = "SUCCEEDED"
-        for json_file in json_files:
-            print(f"Fetching .json file: s3://{bucket_name}/{json_file}")
-            try:
-                s3_response = s3_client.get_object(Bucket=bucket_name, Key=json_file)
-                json_content = s3_response["Body"].read().decode("utf-8")
-                json_data = json.loads(json_content)
-                print(f"JSON content: {json_content[:100]}...")
-                
-                # Check for Internal Server Error in time-based keys or vllm.result
-                for key, value in json_data.items():
-                    # Case 1: Direct string value is "Internal Server Error"
-                    if isinstance(value, str) and value == "Internal Server Error":
-                        status = "FAILED"
-                        print(f"Found Internal Server Error in key {key} of {json_file}, setting status: {status}")
-                        break
-                    # Case 2: vllm.result array contains "Internal Server Error"
-                    elif isinstance(value, dict):
-                        vllm = value.get("vllm", {})
-                        if isinstance(vllm, dict):  # Ensure vllm is a dict before accessing result
-                            vllm_result = vllm.get("result", [])
-                            if isinstance(vllm_result, list) and "Internal Server Error" in vllm_result:
-                                status = "FAILED"
-                                print(f"Found Internal Server Error in vllm.result of {json_file}, setting status: {status}")
-                                break
-                        # If vllm is a string, skip without error
-                if status == "FAILED":
-                    break
-
-            except Exception as e:
-                print(f"Error reading .json file {json_file}: {str(e)}")
-                return {
-                    "statusCode": 500,
-                    "headers": {
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Headers": "Content-Type",
-                        "Access-Control-Allow-Methods": "OPTIONS,GET"
-                    },
-                    "body": json.dumps({"error": f"Failed to read transcript: {str(e)}"})
-                }
+            return 200, status_payload("RUNNING", video_id, execution_UUID, progress=progress)
+
+        # Check the .json files for errors concurrently, stopping at the first failed chunk
+        try:
+            with phase("error_scan"):
+                failed_chunks = find_failed_chunks(bucket_name, json_files)
+        except Exception as e:
+            print(f"Error reading .json files in {chunks_prefix}: {str(e)}")
+            return 500, {"error": f"Failed to read transcript: {str(e)}"}
 
+        status = "FAILED" if failed_chunks else "SUCCEEDED"
+        for failed_chunk in failed_chunks:
+            print(f"Found Internal Server Error in key {failed_chunk['entry']} of {failed_chunk['key']}")
         print(f"Determined status: {status}")
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "OPTIONS,GET"
-            },
-            "body": json.dumps({
-                "data": {
-                    "status": status,
-                    "videoId": video_id,
-                    "executionId": execution_UUID
-                }
-            })
-        }
+        return 200, status_payload(status, video_id, execution_UUID, failed_chunks, progress)
 
     except Exception as e:
         print(f"Error listing objects in folder {folder_prefix}: {str(e)}")
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "OPTIONS,GET"
-            },
-            "body": json.dumps({"error": f"Failed to fetch files: {str(e)}"})
-        }
\ No newline at end of file
+        return 500, {"error": f"Failed to fetch files: {str(e)}"}
+
+def resolve_status(bucket_name, video_id, execution_UUID):
+    """Status of one execution as (status_code, payload)."""
+    # A single query answers executions the indexer has seen; anything else (executions that
+    # predate the indexer, or with no chunks yet) falls back to scanning S3.
+    if STATUS_INDEX_TABLE_NAME:
+        try:
+            with phase("index_query"):
+                items = query_status_index(video_id, execution_UUID)
+            if items:
+                status, failed_chunks, completion_times = status_from_index(items)
+                print(f"Determined status from index ({len(items)} chunks): {status}")
+                chunk_videos = sum(1 for item in items if item.get("has_video"))
+                progress = execution_progress(load_execution_manifest(bucket_name, video_id, execution_UUID), completion_times,
+                                              chunk_videos)
+                return 200, status_payload(status, video_id, execution_UUID, failed_chunks, progress)
+        except Exception as e:
+            print(f"Error querying status index {STATUS_INDEX_TABLE_NAME}, falling back to S3: {str(e)}")
+
+    return status_from_s3(bucket_name, video_id, execution_UUID)
+
+def resolve_batch_item(bucket_name, item):
+    """One batch-status result: the item's status data, or its error, plus its own statusCode."""
+    video_id = item.get("videoId") if isinstance(item, dict) else None
+    execution_UUID = item.get("executionId") if isinstance(item, dict) else None
+    result = {"videoId": video_id, "executionId": execution_UUID}
+    if not isinstance(video_id, str) or not isinstance(execution_UUID, str) or not video_id or not execution_UUID:
+        result.update({"statusCode": 400, "error": "videoId or executionId is missing"})
+        return result
+    try:
+        status_code, payload = resolve_status(bucket_name, video_id, execution_UUID)
+    except Exception as e:
+        print(f"Error resolving status for {video_id}/{execution_UUID}: {str(e)}")
+        status_code, payload = 500, {"error": f"Failed to fetch status: {str(e)}"}
+    result["statusCode"] = status_code
+    result.update(payload.get("data", payload))
+    return result
+
+def batch_status_handler(event, bucket_name):
+    """POST {"executions": [{"videoId": ..., "executionId": ...}, ...]}, resolved concurrently."""
+    try:
+        body = json.loads(event.get("body") or "{}") if isinstance(event.get("body"), str) else (event.get("body") or {})
+    except json.JSONDecodeError:
+        return build_response(400, {"error": "Request body must be JSON"})
+    executions = body.get("executions") if isinstance(body, dict) else None
+    if not isinstance(executions, list) or not executions:
+        return build_response(400, {"error": "executions must be a non-empty list of {videoId, executionId}"})
+    if len(executions) > BATCH_STATUS_MAX_ITEMS:
+        return build_response(400, {"error": f"At most {BATCH_STATUS_MAX_ITEMS} executions per request, got {len(executions)}"})
+
+    print(f"Resolving status for {len(executions)} executions")
+    with ThreadPoolExecutor(max_workers=min(BATCH_STATUS_CONCURRENCY, len(executions))) as executor:
+        results = list(executor.map(lambda item: resolve_batch_item(bucket_name, item), executions))
+    return build_response(200, {"data": {"results": results, "count": len(results)}})
+
+@instrumented("status")
+def handler(event, context):
+    # bucket_name = "cache-us-east-1-054037105643-15bd31e070bd"
+    
+    with phase("settings"):
+        cache_bucket = get_inference_setting('cache_bucket')
+        
+    logging.info("cache_bucket: %s", cache_bucket)
+    
+    bucket_name = cache_bucket
+
+    if event.get("httpMethod") == "POST":
+        return batch_status_handler(event, bucket_name)
+
+    # Extract videoId and executionUUID from path parameters
+    video_id = (event.get("pathParameters") or {}).get("videoId")
+    execution_UUID = (event.get("pathParameters") or {}).get("executionId")
+    
+    if not video_id or not execution_UUID:
+        print(f"Error: Missing videoId or executionUUID (videoId={video_id}, executionUUID={execution_UUID})")
+        return build_response(400, {"error": "videoId or executionUUID is missing"})
+
+    return build_response(*resolve_status(bucket_name, video_id, execution_UUID))
@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+from urllib.parse import unquote_plus
+
+from aws_clients import get_client, get_resource
+from chunk_store import (
+    chunk_base_name,
+    decode_chunk_body,
+    find_internal_server_error_in_bytes,
+    is_chunk_video_key,
+    is_transcript_key,
+    parse_chunk_key
+)
+
+# Set up logging
+logging.getLogger().setLevel(logging.INFO)
+
+STATUS_INDEX_TABLE_NAME = os.environ.get('STATUS_INDEX_TABLE_NAME', 'batch-video-execution-status')
+
+def s3_client():
+    return get_client('s3')
+
+def transcript_error_entry(bucket, key):
+    """Read a chunk transcript and return the key of its Internal Server Error entry, or None."""
+    obj = s3_client().get_object(Bucket=bucket, Key=key)
+    try:
+        return find_internal_server_error_in_bytes(decode_chunk_body(obj['Body'].read()))
+    except json.JSONDecodeError as e:
+        logging.warning("Invalid JSON in s3://%s/%s: %s", bucket, key, e)
+        return None
+
+def index_chunk(table, bucket, key, event_time):
+    """Record one chunk object's arrival (and error state for transcripts)."""
+    execution = parse_chunk_key(key)
+    if not execution:
+        return
+    video_id, execution_id = execution
+    item_key = {'execution_key': f"{video_id}/{execution_id}", 'chunk_id': chunk_base_name(key)}
+
+    if is_chunk_video_key(key):
+        table.update_item(
+            Key=item_key,
+            UpdateExpression="SET has_video = :true, video_key = :key, video_at = :at",
+            ExpressionAttributeValues={':true': True, ':key': key, ':at': event_time}
+        )
+    elif is_transcript_key(key):
+        error_entry = transcript_error_entry(bucket, key)
+        failed = error_entry is not None
+        # failed_entry is kept so index-based status reports the same failedChunks as the S3 scan
+        table.update_item(
+            Key=item_key,
+            UpdateExpression="SET has_transcript = :true, transcript_key = :key, transcript_at = :at, "
+                             "failed = :failed, failed_entry = :entry",
+            ExpressionAttributeValues={':true': True, ':key': key, ':at': event_time, ':failed': failed,
+                                       ':entry': error_entry}
+        )
+        if failed:
+            logging.info("Indexed failed transcript s3://%s/%s", bucket, key)
+
+def handler(event, context):
+    """Index chunk objects as they land in S3 so status polls can answer with one query."""
+    table = get_resource('dynamodb').Table(STATUS_INDEX_TABLE_NAME)
+    records = event.get('Records', [])
+    for record in records:
+        bucket = record['s3']['bucket']['name']
+        key = unquote_plus(record['s3']['object']['key'])
+        # Let failures raise so the asynchronous invocation is retried
+        index_chunk(table, bucket, key, record.get('eventTime', ''))
+    logging.info("Indexed %d S3 records", len(records))
@@ -1,11 +1,47 @@
+import base64
+import gzip
 import json
-import boto3
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from decimal import Decimal
 import logging
 
-dynamodb = boto3.resource('dynamodb')
-s3_client = boto3.client('s3')
+from aws_clients import get_client
+from chunk_store import chunk_sort_key, chunk_start_seconds, decode_chunk_body, is_transcript_key, iter_chunk_objects
+from inference_settings import get_inference_setting, prefetch_inference_settings
+from phase_metrics import instrumented, phase, record_call
+
+# Bounded fan-out for chunk downloads; tune per deployment through the Lambda environment
+CHUNK_FETCH_CONCURRENCY = int(os.environ.get('CHUNK_FETCH_CONCURRENCY', '16'))
+CHUNK_FETCH_TIMEOUT_SECS = float(os.environ.get('CHUNK_FETCH_TIMEOUT_SECS', '10'))
+# Overall budget for one request's chunk downloads, kept under API Gateway's 29 s limit
+CHUNK_FETCH_DEADLINE_SECS = float(os.environ.get('CHUNK_FETCH_DEADLINE_SECS', '20'))
+
+# Merged transcript kept next to the chunks/ folder, with the chunk ETags it was built from
+MERGED_TRANSCRIPT_ARTIFACT = 'merged_transcript.json'
+
+# Page sizes for the cursor-paginated transcript variant
+DEFAULT_PAGE_LIMIT = int(os.environ.get('TRANSCRIPT_PAGE_LIMIT', '20'))
+MAX_PAGE_LIMIT = int(os.environ.get('TRANSCRIPT_MAX_PAGE_LIMIT', '100'))
+
+# Responses are gzipped for clients sending Accept-Encoding: gzip together with an Accept of
+# GZIP_MEDIA_TYPE, which the API lists as a binary media type so it decodes the base64 body
+GZIP_MEDIA_TYPE = 'application/gzip'
+TRANSCRIPT_GZIP_MIN_BYTES = int(os.environ.get('TRANSCRIPT_GZIP_MIN_BYTES', '1024'))
+TRANSCRIPT_GZIP_LEVEL = int(os.environ.get('TRANSCRIPT_GZIP_LEVEL', '6'))
+
+def s3_client():
+    return get_client(
+        's3',
+        max_pool_connections=CHUNK_FETCH_CONCURRENCY,
+        connect_timeout=CHUNK_FETCH_TIMEOUT_SECS,
+        read_timeout=CHUNK_FETCH_TIMEOUT_SECS,
+        retries={'max_attempts': 3, 'mode': 'standard'}
+    )
+
+# Load inference settings during init, off the first request's critical path
+prefetch_inference_settings()
 
 # DEST_BUCKET = 'cache-us-east-1-054037105643-15bd31e070bd'
 
@@ -16,27 +52,211 @@ class DecimalEncoder(json.JSONEncoder):
         return super(DecimalEncoder, self).default(obj)
 
 def list_transcript_files(bucket, prefix):
-    """List all JSON transcript files in the specified S3 prefix."""
-    response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
-    return [
-        item['Key'] for item in response.get('Contents', [])
-        if item['Key'].endswith('.json') and 'chunk_start' in item['Key']
+    """Map every JSON transcript file in the specified S3 prefix to its ETag, across every listing page."""
+    return {
+        obj['Key']: obj['ETag']
+        for obj in iter_chunk_objects(s3_client(), bucket, prefix, is_transcript_key)
+    }
+
+def fetch_chunk(bucket, key):
+    """Download one transcript chunk and return its entries as a list."""
+    obj = s3_client().get_object(Bucket=bucket, Key=key)
+    raw = obj['Body'].read()
+    record_call(len(raw))
+    try:
+        data = json.loads(decode_chunk_body(raw).decode('utf-8'))
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Skipping invalid JSON in {key}: {e}")
+        return []
+    return data if isinstance(data, list) else [data]
+
+def fetch_chunks(bucket, keys):
+    """Download chunks concurrently; returns ({key: entries} in chunk_start order, missing keys).
+
+    Every fetch shares one CHUNK_FETCH_DEADLINE_SECS deadline counted from submission.
+    Chunks not downloaded by then, including ones still queued behind the fan-out, are
+    returned as missing instead of being waited on.
+    """
+    ordered_keys = sorted(keys, key=chunk_sort_key)
+    chunks = {}
+    missing = []
+    if not ordered_keys:
+        return chunks, missing
+    executor = ThreadPoolExecutor(max_workers=min(CHUNK_FETCH_CONCURRENCY, len(ordered_keys)))
+    try:
+        futures = [(key, executor.submit(fetch_chunk, bucket, key)) for key in ordered_keys]
+        deadline = time.monotonic() + CHUNK_FETCH_DEADLINE_SECS
+        for key, future in futures:
+            try:
+                chunks[key] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                future.cancel()
+                missing.append(key)
+        if missing:
+            print(f"⚠️ {len(missing)} of {len(ordered_keys)} chunks not fetched within {CHUNK_FETCH_DEADLINE_SECS}s")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return chunks, missing
+
+def merged_artifact_key(prefix):
+    """Key of the merged transcript artifact for a chunks/ prefix."""
+    return f"{prefix.rstrip('/').rsplit('/', 1)[0]}/{MERGED_TRANSCRIPT_ARTIFACT}"
+
+def load_merged_artifact(bucket, key):
+    """Read a previously persisted merged transcript, or None if there is no usable one."""
+    try:
+        obj = s3_client().get_object(Bucket=bucket, Key=key)
+        raw = obj['Body'].read()
+        record_call(len(raw))
+        artifact = json.loads(raw.decode('utf-8'))
+    except s3_client().exceptions.NoSuchKey:
+        record_call()
+        return None
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable merged transcript s3://{bucket}/{key}: {e}")
+        return None
+    if not isinstance(artifact.get('manifest'), dict) or not isinstance(artifact.get('chunks'), dict):
+        return None
+    return artifact
+
+def load_transcript_chunks(bucket, prefix, chunk_etags):
+    """Return ({key: entries}, missing keys) for the listed chunks, downloading only new or changed ones.
+
+    The merged artifact stores each chunk's entries with the ETag it was read at. When
+    every listed ETag matches the manifest the artifact is served as-is; otherwise only
+    the stale chunks are fetched and the artifact is rewritten.
+    """
+    artifact_key = merged_artifact_key(prefix)
+    with phase('artifact_read'):
+        artifact = load_merged_artifact(bucket, artifact_key) or {'manifest': {}, 'chunks': {}}
+    manifest = artifact['manifest']
+    cached_chunks = artifact['chunks']
+
+    stale_keys = [
+        key for key, etag in chunk_etags.items()
+        if manifest.get(key) != etag or key not in cached_chunks
     ]
+    stale = set(stale_keys)
+    chunks = {key: cached_chunks[key] for key in chunk_etags if key not in stale}
+    missing = []
+    if stale_keys or len(manifest) != len(chunk_etags):
+        print(f"Merging {len(stale_keys)} new or changed chunks into s3://{bucket}/{artifact_key}")
+        with phase('chunk_download'):
+            fetched, missing = fetch_chunks(bucket, stale_keys)
+        chunks.update(fetched)
+        # Chunks that timed out stay out of the manifest so the next request retries them
+        with phase('artifact_write'):
+            artifact_body = json.dumps({
+                'manifest': {key: chunk_etags[key] for key in chunks},
+                'chunks': chunks
+            })
+            record_call(len(artifact_body))
+            try:
+                s3_client().put_object(
+                    Bucket=bucket,
+                    Key=artifact_key,
+                    Body=artifact_body,
+                    ContentType='application/json'
+                )
+            except Exception as e:
+                print(f"⚠️ Failed to persist merged transcript s3://{bucket}/{artifact_key}: {e}")
+
+    return {key: chunks[key] for key in sorted(chunks, key=chunk_sort_key)}, missing
+
+def parse_page_params(body):
+    """Validate cursor/limit from the request body; the cursor is a chunk index."""
+    try:
+        cursor = int(body.get('cursor') or 0)
+        limit = int(body.get('limit') or DEFAULT_PAGE_LIMIT)
+    except (TypeError, ValueError):
+        raise ValueError('cursor and limit must be integers')
+    if cursor < 0:
+        raise ValueError('cursor must not be negative')
+    if not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_LIMIT}')
+    return cursor, limit
+
+def paginate_transcript(bucket, chunk_keys, cursor, limit):
+    """Fetch one page of chunks, in chunk_start order, as native JSON objects."""
+    ordered_keys = sorted(chunk_keys, key=chunk_sort_key)
+    page_keys = ordered_keys[cursor:cursor + limit]
+    with phase('chunk_download'):
+        fetched, missing = fetch_chunks(bucket, page_keys)
+
+    chunks = []
+    for index, key in enumerate(page_keys, start=cursor):
+        chunk = {'index': index, 'chunkStart': chunk_start_seconds(key), 'key': key}
+        if key in fetched:
+            chunk['results'] = fetched[key]
+        else:
+            chunk['error'] = 'Timed out fetching chunk'
+        chunks.append(chunk)
 
-def merge_transcripts(bucket, keys):
-    """Merge transcript files from S3 into a single response."""
+    next_index = cursor + len(page_keys)
+    return {
+        'chunks': chunks,
+        'totalChunks': len(ordered_keys),
+        'partial': bool(missing),
+        'nextCursor': str(next_index) if next_index < len(ordered_keys) else None
+    }
+
+def request_header(event, name):
+    """Case-insensitive request header lookup."""
+    for header, value in (event.get('headers') or {}).items():
+        if header.lower() == name.lower():
+            return value
+    return None
+
+def header_tokens(value):
+    """Lower-cased media types or codings in a header, leaving out any sent with q=0."""
+    tokens = set()
+    for part in (value or '').split(','):
+        token, *params = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    pass
+        if token and quality > 0:
+            tokens.add(token.lower())
+    return tokens
+
+def accepts_gzip(event):
+    """True when the client accepts a gzip-encoded body that API Gateway will pass as binary."""
+    return ('gzip' in header_tokens(request_header(event, 'Accept-Encoding'))
+            and GZIP_MEDIA_TYPE in header_tokens(request_header(event, 'Accept')))
+
+def transcript_response(event, payload):
+    """200 response for payload, gzipped and base64-encoded when the client accepts it."""
+    with phase('serialize'):
+        body = json.dumps(payload, cls=DecimalEncoder)
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'OPTIONS,POST',
+        'Vary': 'Accept-Encoding'
+    }
+    if len(body) < TRANSCRIPT_GZIP_MIN_BYTES or not accepts_gzip(event):
+        return {'statusCode': 200, 'headers': headers, 'body': body}
+
+    with phase('compress'):
+        compressed = gzip.compress(body.encode('utf-8'), compresslevel=TRANSCRIPT_GZIP_LEVEL)
+    headers['Content-Encoding'] = 'gzip'
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': base64.b64encode(compressed).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+def merge_transcripts(chunks):
+    """Merge transcript chunks ({key: entries}) into a single response."""
     results = []
-    for key in sorted(keys):
-        obj = s3_client.get_object(Bucket=bucket, Key=key)
-        content = obj['Body'].read().decode('utf-8')
-        try:
-            data = json.loads(content)
-            if isinstance(data, list):
-                results.extend(data)
-            else:
-                results.append(data)
-        except json.JSONDecodeError as e:
-            print(f"⚠️ Skipping invalid JSON in {key}: {e}")
+    for entries in chunks.values():
+        results.extend(entries)
 
     # Create final format
     merged_output = {
@@ -96,6 +316,7 @@ def merge_transcripts(bucket, keys):
     }
     return merged_output
 
+@instrumented('transcript')
 def handler(event, context):
     """Handle POST request to retrieve merged transcript for a videoId."""
     try:
@@ -115,37 +336,37 @@ def handler(event, context):
                 'body': json.dumps({'error': 'videoId is required'})
             }
 
+        # Cursor/limit select the paginated variant, returning one page of chunks
+        paginated = 'cursor' in body or 'limit' in body
+        if paginated:
+            try:
+                cursor, limit = parse_page_params(body)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Methods': 'OPTIONS,POST'
+                    },
+                    'body': json.dumps({'error': str(e)})
+                }
+
         # Construct the S3 prefix for transcripts
         prefix = f"batch-videos/{video_id}/{execution_uuid}/chunks/" if execution_uuid else f"batch-videos/{video_id}/chunks/"
         
-        table_name = os.environ.get('INFERENCE_SETTINGS_TABLE_NAME', 'inference-settings')
-        logging.info("Using DynamoDB table: %s", table_name)
-        table = dynamodb.Table(table_name)
-        
-        # Check if the video entry exists in DynamoDB
-        try:
-            inference_record = table.get_item(
-                Key={'inference_setting_id': '1'}  # Partition key is a string
-            )
-        except dynamodb.meta.client.exceptions.ResourceNotFoundException:
-            logging.error("DynamoDB table %s does not exist", table_name)
-            raise Exception(f"DynamoDB table {table_name} does not exist")
-        
-        item = inference_record.get('Item')
-        if not item:
-            raise Exception("Inference setting not found for inference_setting_id: 1")
-        cache_bucket = item.get('cache_bucket')
-        if not cache_bucket:
-            raise Exception("cache_bucket not found in item")
+        with phase('settings'):
+            cache_bucket = get_inference_setting('cache_bucket')
         
         logging.info("cache_bucket: %s", cache_bucket)
         
         DEST_BUCKET=cache_bucket
 
         # List transcript files
-        transcript_keys = list_transcript_files(DEST_BUCKET, prefix)
+        with phase('s3_list'):
+            transcript_etags = list_transcript_files(DEST_BUCKET, prefix)
 
-        if not transcript_keys:
+        if not transcript_etags:
             return {
                 'statusCode': 404,
                 'headers': {
@@ -156,21 +377,25 @@ def handler(event, context):
                 'body': json.dumps({'error': 'No transcript files found for the given videoId'})
             }
 
+        if paginated:
+            page = paginate_transcript(DEST_BUCKET, transcript_etags, cursor, limit)
+            return transcript_response(event, {
+                'videoId': video_id,
+                **page
+            })
+
         # Merge transcripts
-        merged_transcript = merge_transcripts(DEST_BUCKET, transcript_keys)
+        chunks, missing = load_transcript_chunks(DEST_BUCKET, prefix, transcript_etags)
+        with phase('merge'):
+            merged_transcript = merge_transcripts(chunks)
 
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'OPTIONS,POST'
-            },
-            'body': json.dumps({
-                'videoId': video_id,
-                'transcript': merged_transcript
-            }, cls=DecimalEncoder)
-        }
+        # A partial transcript says so and names the chunks to retry rather than passing as complete
+        return transcript_response(event, {
+            'videoId': video_id,
+            'transcript': merged_transcript,
+            'partial': bool(missing),
+            'missingChunks': missing
+        })
 
     except json.JSONDecodeError:
         return {
@@ -0,0 +1,91 @@
+"""Aho-Corasick matcher that finds every configured event phrase in one pass over a text."""
+from collections import deque
+
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def transcript_text(value):
+    """Concatenate every string in a parsed transcript chunk, in document order."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return "\n".join(transcript_text(item) for item in value.values())
+    if isinstance(value, list):
+        return "\n".join(transcript_text(item) for item in value)
+    return ""
+
+
+class EventMatcher:
+    """Case-insensitive whole-word matcher over a fixed list of event phrases.
+
+    The automaton is built once per events list; matching a text costs one pass over it
+    regardless of how many events are configured.
+    """
+
+    def __init__(self, events):
+        self.events = [event for event in dict.fromkeys(events) if event.strip()]
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        # Length of each inserted pattern, which is what a match spans in the lower-cased text
+        self.pattern_lengths = []
+        for index, event in enumerate(self.events):
+            pattern = event.strip().lower()
+            self.pattern_lengths.append(len(pattern))
+            self._add(pattern, index)
+        self._link()
+
+    def _add(self, pattern, index):
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append(index)
+
+    def _link(self):
+        """Breadth-first failure links; each state inherits the outputs of its failure state."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        """Yield (event, start, end) for every whole-word occurrence of an event in text."""
+        lowered = text.lower()
+        state = 0
+        for position, char in enumerate(lowered):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for index in self.output[state]:
+                end = position + 1
+                start = end - self.pattern_lengths[index]
+                if start > 0 and is_word_char(lowered[start - 1]) and is_word_char(lowered[start]):
+                    continue
+                if end < len(lowered) and is_word_char(lowered[end]) and is_word_char(lowered[end - 1]):
+                    continue
+                yield self.events[index], start, end
+
+    def count(self, text, snippet_chars=60):
+        """{event: {'count': n, 'snippet': first match in context}} for the events found in text."""
+        found = {}
+        # Offsets index the lower-cased text, which only differs in length for a few scripts
+        source = text if len(text.lower()) == len(text) else text.lower()
+        for event, start, end in self.find(text):
+            if event not in found:
+                snippet = source[max(start - snippet_chars, 0):end + snippet_chars]
+                found[event] = {'count': 0, 'snippet': " ".join(snippet.split())}
+            found[event]['count'] += 1
+        return found
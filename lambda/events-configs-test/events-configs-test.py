@@ -1,114 +1,211 @@
 import json
-import boto3
 import os
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_clients import get_client
+from chunk_store import chunk_sort_key, chunk_start_seconds, decode_chunk_body, is_transcript_key, iter_chunk_objects
+from event_matcher import EventMatcher, transcript_text
+from inference_settings import get_inference_setting
+from phase_metrics import instrumented, phase, record_call
+
+# Bounded fan-out for reading chunk transcripts during event detection
+EVENT_SCAN_CONCURRENCY = int(os.environ.get('EVENT_SCAN_CONCURRENCY', '16'))
 
-S3 = boto3.client('s3')
 BUCKET = "spectracdkstack-batchvideobucketa35fe309-p3omgtksdngd"
 KEY = "artifacts/event_detection/events_to_detect.json"
 
+# How long a warm container serves its cached copy before revalidating with If-None-Match
+EVENTS_CACHE_TTL_SECS = float(os.environ.get('EVENTS_CACHE_TTL_SECS', '5'))
+
+events_cache = {'etag': None, 'body': None, 'checked_at': 0.0}
+events_cache_lock = threading.Lock()
+
+# Compiled once per events-file ETag
+matcher_cache = {'etag': None, 'matcher': None}
+
+def s3_client():
+    return get_client('s3', max_pool_connections=EVENT_SCAN_CONCURRENCY)
+
+def build_response(status_code, body, methods, etag=None):
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': methods,
+        'Access-Control-Allow-Headers': 'Content-Type,If-Match,If-None-Match',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+    if etag:
+        headers['ETag'] = etag
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': body
+    }
+
+def request_header(event, name):
+    """Case-insensitive request header lookup."""
+    for header, value in (event.get('headers') or {}).items():
+        if header.lower() == name.lower():
+            return value
+    return None
+
+def error_code(e):
+    return str(e.response.get('Error', {}).get('Code'))
+
+def load_events():
+    """(body, etag) of the events file, revalidated against S3 at most once per TTL.
+
+    Raises s3_client().exceptions.NoSuchKey when the file does not exist.
+    """
+    with events_cache_lock:
+        if events_cache['body'] is not None and time.monotonic() - events_cache['checked_at'] < EVENTS_CACHE_TTL_SECS:
+            return events_cache['body'], events_cache['etag']
+
+        get_args = {'Bucket': BUCKET, 'Key': KEY}
+        if events_cache['etag']:
+            get_args['IfNoneMatch'] = events_cache['etag']
+        try:
+            resp = s3_client().get_object(**get_args)
+        except s3_client().exceptions.ClientError as e:
+            record_call()
+            if error_code(e) not in ('304', 'NotModified'):
+                raise
+            logging.info("Events file unchanged (ETag %s)", events_cache['etag'])
+        else:
+            raw = resp['Body'].read()
+            record_call(len(raw))
+            events_cache['body'] = raw.decode('utf-8')
+            events_cache['etag'] = resp['ETag']
+        events_cache['checked_at'] = time.monotonic()
+        return events_cache['body'], events_cache['etag']
+
+def remember_events(body, etag):
+    with events_cache_lock:
+        events_cache.update({'etag': etag, 'body': body, 'checked_at': time.monotonic()})
+
+def current_matcher():
+    """(matcher, etag) for the current events file, recompiled only when its ETag changes."""
+    data, etag = load_events()
+    with events_cache_lock:
+        if matcher_cache['matcher'] is None or matcher_cache['etag'] != etag:
+            events = json.loads(data).get('events', [])
+            matcher_cache.update({'etag': etag, 'matcher': EventMatcher(events)})
+            logging.info("Compiled matcher for %d events (ETag %s)", len(events), etag)
+        return matcher_cache['matcher'], etag
+
+def scan_chunk(matcher, bucket, key):
+    """{event: {'count', 'snippet'}} for one chunk transcript."""
+    resp = s3_client().get_object(Bucket=bucket, Key=key)
+    raw = resp['Body'].read()
+    record_call(len(raw))
+    try:
+        data = json.loads(decode_chunk_body(raw).decode('utf-8'))
+    except json.JSONDecodeError as e:
+        logging.warning("Skipping invalid JSON in %s: %s", key, e)
+        return {}
+    return matcher.count(transcript_text(data))
+
+def detect_events(video_id, execution_id):
+    """Per-event hit lists, in chunk_start order, over every chunk transcript of an execution."""
+    with phase('events_config'):
+        matcher, etag = current_matcher()
+    with phase('settings'):
+        bucket = get_inference_setting('cache_bucket')
+    prefix = f"batch-videos/{video_id}/{execution_id}/chunks/"
+    with phase('s3_list'):
+        keys = sorted(
+            (obj['Key'] for obj in iter_chunk_objects(s3_client(), bucket, prefix, predicate=is_transcript_key)),
+            key=chunk_sort_key
+        )
+    events = {name: {'totalHits': 0, 'hits': []} for name in matcher.events}
+    if keys and matcher.events:
+        with phase('event_scan'), ThreadPoolExecutor(max_workers=min(EVENT_SCAN_CONCURRENCY, len(keys))) as executor:
+            for key, found in zip(keys, executor.map(lambda key: scan_chunk(matcher, bucket, key), keys)):
+                for name, hit in found.items():
+                    events[name]['totalHits'] += hit['count']
+                    events[name]['hits'].append({'key': key, 'chunk_start': chunk_start_seconds(key), **hit})
+    return {
+        'videoId': video_id,
+        'executionId': execution_id,
+        'eventsETag': etag,
+        'scannedChunks': len(keys),
+        'events': events
+    }
+
+@instrumented('events')
 def handler(event, context):
     method = event.get('httpMethod')
     if not method:
-         return {
-                'statusCode': 404,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'OPTIONS,GET'
-                },
-                'body': json.dumps({'error':  'Invalid event structure'})
-            }
+        return build_response(404, json.dumps({'error':  'Invalid event structure'}), 'OPTIONS,GET')
+    path_parameters = event.get('pathParameters') or {}
+    if method == 'GET' and path_parameters.get('executionId'):
+        # /videos/{videoId}/executions/{executionId}/events-test
+        try:
+            result = detect_events(path_parameters.get('videoId'), path_parameters['executionId'])
+            return build_response(200, json.dumps({'data': result}), 'OPTIONS,GET')
+        except s3_client().exceptions.NoSuchKey:
+            return build_response(404, json.dumps({'error':  'Events file not found'}), 'OPTIONS,GET')
+        except Exception as e:
+            logging.error("Failed to detect events: %s", str(e))
+            return build_response(500, json.dumps({'error':  f'Failed to detect events: {str(e)}'}), 'OPTIONS,GET')
     if method == 'GET':
         try:
-            resp = S3.get_object(Bucket=BUCKET, Key=KEY)
-            data = resp['Body'].read().decode('utf-8')
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'OPTIONS,GET'
-                },
-                'body': data
-            }
-        except S3.exceptions.NoSuchKey:
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'OPTIONS,GET'
-                },
-                'body': json.dumps({'error':  'Events file not found'})
-            }
+            with phase('events_config'):
+                data, etag = load_events()
+            if etag and request_header(event, 'If-None-Match') == etag:
+                return build_response(304, '', 'OPTIONS,GET', etag)
+            return build_response(200, data, 'OPTIONS,GET', etag)
+        except s3_client().exceptions.NoSuchKey:
+            return build_response(404, json.dumps({'error':  'Events file not found'}), 'OPTIONS,GET')
         except Exception as e:
-            return {
-                'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'OPTIONS,POST'
-                },
-                'body': json.dumps({'error':  f'Failed to retrieve events: {str(e)}'})
-            }
+            return build_response(500, json.dumps({'error':  f'Failed to retrieve events: {str(e)}'}), 'OPTIONS,GET')
     if method == 'PUT':
-        # Define CORS headers
-        cors_headers = {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'OPTIONS,GET,PUT'
-        }
+        methods = 'OPTIONS,GET,PUT'
         try:
-            body = json.loads(event.get('body', '{}'))
+            # Optimistic concurrency: the editor must send the ETag it last read, or
+            # If-None-Match: * to create the file when it does not exist yet
+            if_match = request_header(event, 'If-Match')
+            create_only = request_header(event, 'If-None-Match') == '*'
+            if not if_match and not create_only:
+                return build_response(428, json.dumps({'error': 'If-Match header with the current ETag is required'}), methods)
+            condition = {'IfMatch': if_match} if if_match else {'IfNoneMatch': '*'}
+
+            body = json.loads(event.get('body') or '{}')
             logging.info("Parsed body: %s", json.dumps(body))
             if 'events' not in body or not isinstance(body['events'], list):
                 logging.error("Invalid payload: events must be a list")
-                return {
-                    'statusCode': 400,
-                    'headers': cors_headers,
-                    'body': json.dumps({'error': 'Invalid payload: events must be a list'})
-                }
+                return build_response(400, json.dumps({'error': 'Invalid payload: events must be a list'}), methods)
             # Validate that all elements in the events array are strings
             if not all(isinstance(item, str) for item in body['events']):
                 logging.error("Invalid payload: all events must be strings")
-                return {
-                    'statusCode': 400,
-                    'headers': cors_headers,
-                    'body': json.dumps({'error': 'Invalid payload: all events must be strings'})
-                }
-            S3.put_object(
-                Bucket=BUCKET,
-                Key=KEY,
-                Body=json.dumps({'events': body['events']}),
-                ContentType='application/json'
-            )
+                return build_response(400, json.dumps({'error': 'Invalid payload: all events must be strings'}), methods)
+
+            data = json.dumps({'events': body['events']})
+            try:
+                with phase('events_write'):
+                    record_call(len(data))
+                    resp = s3_client().put_object(
+                        Bucket=BUCKET,
+                        Key=KEY,
+                        Body=data,
+                        ContentType='application/json',
+                        **condition
+                    )
+            except s3_client().exceptions.ClientError as e:
+                if error_code(e) in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409'):
+                    logging.info("Rejected update with stale condition %s", condition)
+                    return build_response(412, json.dumps({'error': 'Events were changed by someone else; reload and retry'}), methods)
+                raise
+            remember_events(data, resp['ETag'])
             logging.info("Successfully updated S3 object")
-            return {
-                'statusCode': 200,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'Updated'})
-            }
+            return build_response(200, json.dumps({'message': 'Updated'}), methods, resp['ETag'])
         except json.JSONDecodeError:
             logging.error("Invalid JSON payload")
-            return {
-                'statusCode': 400,
-                'headers': cors_headers,
-                'body': json.dumps({'error': 'Invalid JSON payload'})
-            }
+            return build_response(400, json.dumps({'error': 'Invalid JSON payload'}), methods)
         except Exception as e:
             logging.error("Failed to update events: %s", str(e))
-            return {
-                'statusCode': 500,
-                'headers': cors_headers,
-                'body': json.dumps({'error': f'Failed to update events: {str(e)}'})
-            }
-    return {
-        'statusCode': 405,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'OPTIONS,PUT'
-        },
-        'body': json.dumps({'error': f'Failed to update events: {str(e)}'})
-    }
\ No newline at end of file
+            return build_response(500, json.dumps({'error': f'Failed to update events: {str(e)}'}), methods)
+    return build_response(405, json.dumps({'error': f'Method {method} not allowed'}), 'OPTIONS,GET,PUT')
@@ -0,0 +1,39 @@
+"""Lazily built, memoized boto3 clients and resources for the batch-video lambdas.
+
+boto3 is imported and each client constructed on first use, so a cold start only pays
+for the SDK clients the request actually touches.
+"""
+import json
+import threading
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def get_client(service, **config):
+    """boto3 client for service, built once per distinct botocore Config keyword set."""
+    cache_key = ('client', service, json.dumps(config, sort_keys=True))
+    client = _clients.get(cache_key)
+    if client is None:
+        with _lock:
+            client = _clients.get(cache_key)
+            if client is None:
+                import boto3
+                from botocore.config import Config
+                client = boto3.client(service, config=Config(**config)) if config else boto3.client(service)
+                _clients[cache_key] = client
+    return client
+
+
+def get_resource(service):
+    """boto3 service resource, built once."""
+    cache_key = ('resource', service, '')
+    resource = _clients.get(cache_key)
+    if resource is None:
+        with _lock:
+            resource = _clients.get(cache_key)
+            if resource is None:
+                import boto3
+                resource = boto3.resource(service)
+                _clients[cache_key] = resource
+    return resource
@@ -0,0 +1,121 @@
+"""Helpers shared by the batch-video lambdas for walking chunk objects in S3."""
+import gzip
+import json
+import re
+
+from phase_metrics import record_call
+
+CHUNK_START_PATTERN = re.compile(r'chunk_start\D*(\d+(?:\.\d+)?)')
+
+# batch-videos/{videoId}/{executionId}/chunks/{name}
+CHUNK_KEY_PATTERN = re.compile(r'^batch-videos/(?P<video_id>[^/]+)/(?P<execution_id>[^/]+)/chunks/(?P<name>[^/]+)$')
+
+# Written by batch-video-execution-testing next to chunks/ when an execution is submitted
+EXECUTION_MANIFEST_NAME = 'execution_manifest.json'
+
+INTERNAL_SERVER_ERROR = "Internal Server Error"
+INTERNAL_SERVER_ERROR_BYTES = INTERNAL_SERVER_ERROR.encode('utf-8')
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def is_transcript_key(key):
+    """True for chunk transcript JSON objects (…chunk_start….json or ….json.gz)."""
+    return key.removesuffix('.gz').endswith('.json') and 'chunk_start' in key
+
+
+def decode_chunk_body(raw):
+    """Raw bytes of a chunk object, gunzipped when it was stored gzip-compressed.
+
+    Detected from the gzip header rather than the key, so .json.gz objects and .json
+    objects uploaded with Content-Encoding: gzip both read as plain JSON bytes.
+    """
+    return gzip.decompress(raw) if raw[:2] == GZIP_MAGIC else raw
+
+
+def is_chunk_video_key(key):
+    """True for rendered chunk videos (det_*.mp4)."""
+    name = key.rsplit('/', 1)[-1]
+    return name.startswith('det_') and name.endswith('.mp4')
+
+
+def split_s3_uri(uri):
+    """(bucket, key) for an s3://bucket/key URI."""
+    if not uri.startswith('s3://'):
+        raise ValueError(f"Not an S3 URI: {uri}")
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def execution_manifest_key(video_id, execution_id):
+    """Key of the manifest for batch-videos/{videoId}/{executionId}/."""
+    return f"batch-videos/{video_id}/{execution_id}/{EXECUTION_MANIFEST_NAME}"
+
+
+def parse_chunk_key(key):
+    """(video_id, execution_id) for a key under an execution's chunks/ folder, else None."""
+    match = CHUNK_KEY_PATTERN.match(key)
+    return (match.group('video_id'), match.group('execution_id')) if match else None
+
+
+def chunk_base_name(key):
+    """Name shared by a chunk's det_*.mp4 video and its ts_*.json transcript."""
+    stem = key.rsplit('/', 1)[-1].removesuffix('.gz').rsplit('.', 1)[0]
+    if is_chunk_video_key(key):
+        return stem.removeprefix('det_')
+    return stem.replace('ts_', '', 1)
+
+
+def find_internal_server_error(json_data):
+    """Key of the first entry reporting an inference "Internal Server Error", else None.
+
+    Entries either hold the error string directly or carry it in vllm.result.
+    """
+    if not isinstance(json_data, dict):
+        return None
+    for key, value in json_data.items():
+        # Case 1: Direct string value is "Internal Server Error"
+        if isinstance(value, str) and value == INTERNAL_SERVER_ERROR:
+            return key
+        # Case 2: vllm.result array contains "Internal Server Error"
+        if isinstance(value, dict):
+            vllm = value.get("vllm", {})
+            if isinstance(vllm, dict):  # vllm may also be a plain string
+                vllm_result = vllm.get("result", [])
+                if isinstance(vllm_result, list) and INTERNAL_SERVER_ERROR in vllm_result:
+                    return key
+    return None
+
+
+def find_internal_server_error_in_bytes(raw):
+    """find_internal_server_error for a raw chunk body, parsing JSON only when the marker is present."""
+    if INTERNAL_SERVER_ERROR_BYTES not in raw:
+        return None
+    return find_internal_server_error(json.loads(raw))
+
+
+def chunk_start_seconds(key):
+    """Numeric chunk_start encoded in a chunk key, or None if the key has none."""
+    match = CHUNK_START_PATTERN.search(key.rsplit('/', 1)[-1])
+    return float(match.group(1)) if match else None
+
+
+def chunk_sort_key(key):
+    """Order chunk keys by their numeric chunk_start, falling back to the key itself."""
+    start = chunk_start_seconds(key)
+    return (float('inf') if start is None else start, key)
+
+
+def iter_chunk_objects(s3_client, bucket, prefix, predicate=None, page_size=1000):
+    """Yield S3 object summaries under prefix, following continuation tokens lazily.
+
+    Pages are only requested as the caller consumes the generator, so breaking out
+    of the loop (or taking next()) stops further list_objects_v2 calls.
+    """
+    paginator = s3_client.get_paginator('list_objects_v2')
+    pages = paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={'PageSize': page_size})
+    for page in pages:
+        record_call()
+        for obj in page.get('Contents', []):
+            if predicate is None or predicate(obj['Key']):
+                yield obj
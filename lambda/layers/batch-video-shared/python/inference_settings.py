@@ -0,0 +1,85 @@
+"""Per-container cache of the inference-settings item shared by the batch-video lambdas."""
+import logging
+import os
+import threading
+import time
+
+from aws_clients import get_resource
+from phase_metrics import record_call
+
+INFERENCE_SETTING_ID = '1'
+INFERENCE_SETTINGS_TTL_SECS = float(os.environ.get('INFERENCE_SETTINGS_TTL_SECS', '300'))
+
+_lock = threading.Lock()
+_cached_item = None
+_fetched_at = 0.0
+# Attribute name -> when a forced re-read last confirmed it is missing
+_missing_since = {}
+
+
+def get_inference_settings(force_refresh=False):
+    """Return the inference-settings item, reading DynamoDB at most once per TTL.
+
+    Concurrent callers on a cold cache share a single get_item.
+    """
+    global _cached_item, _fetched_at
+    with _lock:
+        if (not force_refresh and _cached_item is not None
+                and time.monotonic() - _fetched_at < INFERENCE_SETTINGS_TTL_SECS):
+            return _cached_item
+
+        dynamodb = get_resource('dynamodb')
+        table_name = os.environ.get('INFERENCE_SETTINGS_TABLE_NAME', 'inference-settings')
+        logging.info("Loading inference settings from DynamoDB table: %s", table_name)
+        table = dynamodb.Table(table_name)
+        record_call()
+        try:
+            inference_record = table.get_item(
+                Key={'inference_setting_id': INFERENCE_SETTING_ID}  # Partition key is a string
+            )
+        except dynamodb.meta.client.exceptions.ResourceNotFoundException:
+            logging.error("DynamoDB table %s does not exist", table_name)
+            raise Exception(f"DynamoDB table {table_name} does not exist")
+
+        item = inference_record.get('Item')
+        if not item:
+            raise Exception(f"Inference setting not found for inference_setting_id: {INFERENCE_SETTING_ID}")
+        _cached_item = item
+        _fetched_at = time.monotonic()
+        return item
+
+
+def get_inference_setting(name, force_refresh=False):
+    """Return one attribute of the settings item.
+
+    A cached item missing the attribute is re-read once before giving up, so newly added
+    settings are picked up without waiting for the TTL. A confirmed absence is itself cached
+    for the TTL, so callers that tolerate a missing setting do not re-read on every call.
+    """
+    value = get_inference_settings(force_refresh).get(name)
+    if not value and not force_refresh:
+        confirmed_at = _missing_since.get(name)
+        if confirmed_at is None or time.monotonic() - confirmed_at >= INFERENCE_SETTINGS_TTL_SECS:
+            value = get_inference_settings(force_refresh=True).get(name)
+            if not value:
+                _missing_since[name] = time.monotonic()
+    if not value:
+        raise Exception(f"{name} not found in item")
+    _missing_since.pop(name, None)
+    return value
+
+
+def _prefetch():
+    try:
+        get_inference_settings()
+    except Exception as e:
+        logging.warning("Could not prefetch inference settings: %s", e)
+
+
+def prefetch_inference_settings():
+    """Warm the cache from a background thread started during Lambda init.
+
+    Init does not wait for boto3 or DynamoDB, requests that never read the settings never
+    block on them, and failures are logged and retried on first use.
+    """
+    threading.Thread(target=_prefetch, name="inference-settings-prefetch", daemon=True).start()
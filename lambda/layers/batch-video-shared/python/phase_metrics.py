@@ -0,0 +1,182 @@
+"""Per-phase latency and downstream-call metrics for the batch-video lambdas.
+
+A handler wrapped with @instrumented(name) times every phase(...) block entered while it
+runs and counts the downstream calls and bytes reported through record_call(). When the
+handler returns, one CloudWatch Embedded Metric Format line per phase is printed to stdout,
+with Handler and Phase dimensions, so CloudWatch Logs turns them into metrics without any
+PutMetricData calls. The whole invocation is reported as the "total" phase. Other
+measurements, such as the inference endpoints' health, are reported through
+record_metrics() in the same output under dimensions of their own.
+
+Lambda runs one invocation at a time per container, so the measured invocation is held in
+module state and calls made from a handler's worker threads are attributed to it as well.
+Open phases are tracked per thread: a worker thread's calls go to the phases it opens
+itself, or else to the phase the invoking thread has open (e.g. a fan-out timed as one
+phase around the executor).
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'BatchVideoTesting')
+PHASE_METRICS_ENABLED = os.environ.get('PHASE_METRICS_ENABLED', 'true').lower() != 'false'
+TOTAL_PHASE = 'total'
+
+_lock = threading.Lock()
+_active = None
+
+
+class Invocation:
+    """Phase timings and call counters for one handler invocation."""
+
+    def __init__(self, handler_name):
+        self.handler_name = handler_name
+        self.phases = {}
+        # (dimension items) -> {metric name: (value, unit)}, the latest values reported
+        self.metrics = {}
+        self.local = threading.local()
+        # Stack of the thread that started the invocation, the fallback for worker threads
+        self.root_phases = self.open_phases()
+
+    def open_phases(self):
+        """This thread's stack of open phase names."""
+        stack = getattr(self.local, 'phases', None)
+        if stack is None:
+            stack = self.local.phases = []
+        return stack
+
+    def current_phase(self):
+        """Innermost phase open on this thread, else on the invoking thread, else None."""
+        stack = self.open_phases() or self.root_phases
+        return stack[-1] if stack else None
+
+    def totals(self, name):
+        return self.phases.setdefault(name, {'Latency': 0.0, 'DownstreamCalls': 0, 'DownstreamBytes': 0})
+
+    def emf_lines(self):
+        """One EMF JSON document per phase, in the order the phases were first entered."""
+        timestamp = int(time.time() * 1000)
+        lines = []
+        for name, totals in self.phases.items():
+            lines.append(json.dumps({
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': METRICS_NAMESPACE,
+                        'Dimensions': [['Handler', 'Phase']],
+                        'Metrics': [
+                            {'Name': 'Latency', 'Unit': 'Milliseconds'},
+                            {'Name': 'DownstreamCalls', 'Unit': 'Count'},
+                            {'Name': 'DownstreamBytes', 'Unit': 'Bytes'}
+                        ]
+                    }]
+                },
+                'Handler': self.handler_name,
+                'Phase': name,
+                'Latency': round(totals['Latency'], 3),
+                'DownstreamCalls': totals['DownstreamCalls'],
+                'DownstreamBytes': totals['DownstreamBytes']
+            }))
+        for dimensions, metrics in self.metrics.items():
+            document = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': METRICS_NAMESPACE,
+                        'Dimensions': [['Handler'] + [name for name, _ in dimensions]],
+                        'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in metrics.items()]
+                    }]
+                },
+                'Handler': self.handler_name
+            }
+            document.update(dimensions)
+            document.update({name: value for name, (value, _) in metrics.items()})
+            lines.append(json.dumps(document))
+        return lines
+
+
+@contextmanager
+def measure_invocation(handler_name):
+    """Measure everything inside the block as one invocation of handler_name and emit it on exit."""
+    global _active
+    if not PHASE_METRICS_ENABLED:
+        yield None
+        return
+    invocation = Invocation(handler_name)
+    with _lock:
+        previous, _active = _active, invocation
+    try:
+        with phase(TOTAL_PHASE):
+            yield invocation
+    finally:
+        with _lock:
+            _active = previous
+        for line in invocation.emf_lines():
+            print(line, flush=True)
+
+
+def instrumented(handler_name):
+    """Decorator measuring each call of a Lambda handler as one invocation of handler_name."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with measure_invocation(handler_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def phase(name):
+    """Time the block as phase name; repeated phases of one invocation are summed.
+
+    Outside an instrumented invocation the block runs unmeasured.
+    """
+    invocation = _active
+    if invocation is None:
+        yield
+        return
+    stack = invocation.open_phases()
+    with _lock:
+        invocation.totals(name)
+        stack.append(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        with _lock:
+            invocation.totals(name)['Latency'] += elapsed
+            stack.pop()
+
+
+def record_metrics(dimensions, metrics):
+    """Report metrics ({name: (value, unit)}) under dimensions ({name: value}) with this invocation's.
+
+    Reporting the same dimensions again replaces the earlier values, so a gauge sampled
+    after every call is emitted once per invocation. Metrics whose value is None are left out.
+    """
+    invocation = _active
+    if invocation is None:
+        return
+    values = {name: (value, unit) for name, (value, unit) in metrics.items() if value is not None}
+    if not values:
+        return
+    with _lock:
+        invocation.metrics[tuple(dimensions.items())] = values
+
+
+def record_call(nbytes=0, calls=1):
+    """Count downstream calls (and the bytes they moved) against the innermost open phase and the total."""
+    invocation = _active
+    if invocation is None:
+        return
+    with _lock:
+        current = invocation.current_phase()
+        for name in {current, TOTAL_PHASE} if current else ():
+            totals = invocation.totals(name)
+            totals['DownstreamCalls'] += calls
+            totals['DownstreamBytes'] += nbytes
@@ -1,16 +1,49 @@
 import aws_cdk as cdk
 from aws_cdk import (
     aws_apigateway as apigateway,
-    aws_iam as iam
+    aws_lambda as _lambda
 )
 
-def build_batch_chat_testing_api_gateway(scope, batch_video_chat_test_lambda, batch_video_execution_test_lambda, batch_video_transcript_test_lambda, batch_video_get_status_by_id_test_lambda, events_config_test_lambda):
+# Cached GET responses are keyed on the execution they describe
+EXECUTION_CACHE_KEYS = ["method.request.path.videoId", "method.request.path.executionId"]
+
+STATUS_PATH = "/videos/{videoId}/executions/{executionId}/status-test"
+EVENTS_DETECT_PATH = "/videos/{videoId}/executions/{executionId}/events-test"
+
+def stage_options(cache_settings):
+    """Stage cache with a TTL per cached GET method, or None when caching is off.
+
+    The cache cluster is billed by the hour, so cdk.json leaves it off. events-configs is
+    never cached: its ETag must be current for the If-Match check on PUT.
+    """
+    if not cache_settings or not cache_settings.get("enabled"):
+        return None
+    ttl_secs = cache_settings.get("ttl_secs", {})
+    cached_methods = {
+        f"{STATUS_PATH}/GET": ttl_secs.get("status", 5),
+        f"{EVENTS_DETECT_PATH}/GET": ttl_secs.get("events_detect", 60)
+    }
+    return apigateway.StageOptions(
+        cache_cluster_enabled=True,
+        cache_cluster_size=str(cache_settings.get("cluster_size", "0.5")),
+        method_options={
+            path: apigateway.MethodDeploymentOptions(caching_enabled=True, cache_ttl=cdk.Duration.seconds(ttl))
+            for path, ttl in cached_methods.items()
+        }
+    )
+
+def build_batch_chat_testing_api_gateway(scope, batch_video_chat_test_lambda, batch_video_execution_test_lambda, batch_video_transcript_test_lambda, batch_video_get_status_by_id_test_lambda, events_config_test_lambda, cache_settings=None, min_compression_bytes=None, binary_media_types=None):
     api = apigateway.RestApi(
         scope, "BatchChatTestingAPI",
         rest_api_name="BatchChatTesting API",
+        deploy_options=stage_options(cache_settings),
+        # API Gateway gzips responses above this size for clients sending Accept-Encoding
+        min_compression_size=cdk.Size.bytes(min_compression_bytes) if min_compression_bytes is not None else None,
+        # base64 bodies from lambdas (gzipped transcripts) are decoded for clients accepting these types
+        binary_media_types=binary_media_types or None,
         default_cors_preflight_options=apigateway.CorsOptions(
             allow_origins=apigateway.Cors.ALL_ORIGINS,
-            allow_headers=["Content-Type", "X-Amz-Date", "Authorization", "X-Api-Key"],
+            allow_headers=["Content-Type", "X-Amz-Date", "Authorization", "X-Api-Key", "If-Match", "If-None-Match"],
             allow_methods=["OPTIONS", "POST", "GET", "PUT", "DELETE"]
         )
     )
@@ -20,13 +53,23 @@ def build_batch_chat_testing_api_gateway(scope, batch_video_chat_test_lambda, ba
     api.root.add_resource("batch-video-execution-test").add_method("POST", apigateway.LambdaIntegration(batch_video_execution_test_lambda))
     api.root.add_resource("batch-video-transcript-test").add_method("POST", apigateway.LambdaIntegration(batch_video_transcript_test_lambda))
     videos=api.root.add_resource("videos")
+    videos.add_resource("batch-status-test").add_method(
+        "POST",
+        apigateway.LambdaIntegration(batch_video_get_status_by_id_test_lambda),
+    )
     video_id = videos.add_resource("{videoId}")
     videos = video_id.add_resource("executions")
     execution_uuid = videos.add_resource("{executionId}")
     status = execution_uuid.add_resource("status-test")
     status.add_method(
         "GET",
-        apigateway.LambdaIntegration(batch_video_get_status_by_id_test_lambda),    
+        apigateway.LambdaIntegration(batch_video_get_status_by_id_test_lambda, cache_key_parameters=EXECUTION_CACHE_KEYS),
+        request_parameters={key: True for key in EXECUTION_CACHE_KEYS}
+    )
+    execution_uuid.add_resource("events-test").add_method(
+        "GET",
+        apigateway.LambdaIntegration(events_config_test_lambda, cache_key_parameters=EXECUTION_CACHE_KEYS),
+        request_parameters={key: True for key in EXECUTION_CACHE_KEYS}
     )
     events_configs=api.root.add_resource("events-configs-test")
     events_configs.add_method("GET", apigateway.LambdaIntegration(events_config_test_lambda))
@@ -34,7 +77,17 @@ def build_batch_chat_testing_api_gateway(scope, batch_video_chat_test_lambda, ba
 
     
     return api
-    
-
-
 
+def build_batch_chat_stream_url(batch_video_chat_stream_test_lambda):
+    # API Gateway REST APIs buffer integration responses, so streamed chat goes through a function URL.
+    # The URL calls Bedrock on every request, so callers must sign requests with SigV4 and hold
+    # lambda:InvokeFunctionUrl on the function.
+    return batch_video_chat_stream_test_lambda.add_function_url(
+        auth_type=_lambda.FunctionUrlAuthType.AWS_IAM,
+        invoke_mode=_lambda.InvokeMode.RESPONSE_STREAM,
+        cors=_lambda.FunctionUrlCorsOptions(
+            allowed_origins=["*"],
+            allowed_headers=["Content-Type", "X-Amz-Date", "Authorization", "X-Amz-Security-Token", "X-Amz-Content-Sha256"],
+            allowed_methods=[_lambda.HttpMethod.POST]
+        )
+    )
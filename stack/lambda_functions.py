@@ -1,73 +1,179 @@
-from aws_cdk import Duration, aws_lambda as _lambda, aws_iam as iam, aws_cognito as cognito
+from aws_cdk import Duration, aws_lambda as _lambda, aws_iam as iam
+from aws_cdk import aws_lambda_event_sources as event_sources
+from stack.queue import SUBMISSION_MAX_RECEIVE_COUNT
 import aws_cdk as cdk
 import os
 
+# Used for any setting a function's profile (or the "default" profile) in the
+# performance_profiles context leaves out; matches the Lambda defaults
+DEFAULT_PERFORMANCE_PROFILE = {
+    'memory_size': 128,
+    'architecture': 'x86_64',
+    'ephemeral_storage_mb': 512,
+    'reserved_concurrency': None,
+    'provisioned_concurrency': 0,
+    'timeout_secs': 60
+}
 
-def test_batch_video_chat_lambda_function(scope, function_name, handler_file,  lambda_role, table):
-    return _lambda.Function(
-        scope, function_name,
-        runtime=_lambda.Runtime.PYTHON_3_12,
-        handler=f"{handler_file}.handler",
-        code=_lambda.Code.from_asset(os.path.join(os.getcwd(), 'lambda', handler_file)),
-        role=lambda_role,
-        environment={
-            'INFERENCE_SETTINGS_TABLE_NAME': table.table_name
-        },
-        timeout=Duration.minutes(5),
-    )
-    
-def test_batch_video_execution_lambda_function(scope, function_name, handler_file, lambda_role, layer, table):
-    return _lambda.Function(
-        scope, function_name,
-        runtime=_lambda.Runtime.PYTHON_3_12,
-        handler=f"{handler_file}.handler",
-        code=_lambda.Code.from_asset(os.path.join(os.getcwd(), 'lambda', handler_file)),
-        role=lambda_role,
-        timeout=Duration.minutes(5),
-        environment={
-            'INFERENCE_SETTINGS_TABLE_NAME': table.table_name
-        },
-        layers=[layer]
-    )
-    
-def test_batch_video_transcript_lambda_function(scope, function_name, handler_file, lambda_role, table):
-    return _lambda.Function(
-        scope, function_name,
-        runtime=_lambda.Runtime.PYTHON_3_12,
-        handler=f"{handler_file}.handler",
-        code=_lambda.Code.from_asset(os.path.join(os.getcwd(), 'lambda', handler_file)),
-        role=lambda_role,
-        timeout=Duration.minutes(5),
-        environment={
-            'INFERENCE_SETTINGS_TABLE_NAME': table.table_name
-        },
+ARCHITECTURES = {
+    'x86_64': _lambda.Architecture.X86_64,
+    'arm64': _lambda.Architecture.ARM_64
+}
+
+WEB_ADAPTER_LAYER_ARNS = {
+    'x86_64': "arn:aws:lambda:us-east-1:753240598075:layer:LambdaAdapterLayerX86:25",
+    'arm64': "arn:aws:lambda:us-east-1:753240598075:layer:LambdaAdapterLayerArm64:25"
+}
+
+SDK_PANDAS_LAYER_ARNS = {
+    'x86_64': "arn:aws:lambda:us-east-1:336392948345:layer:AWSSDKPandas-Python312:16",
+    'arm64': "arn:aws:lambda:us-east-1:336392948345:layer:AWSSDKPandas-Python312-Arm64:16"
+}
+
+
+def performance_profile(scope, name):
+    """Profile `name` from the performance_profiles context, over its "default" entry."""
+    profiles = scope.node.try_get_context("performance_profiles") or {}
+    profile = {**DEFAULT_PERFORMANCE_PROFILE, **profiles.get("default", {}), **profiles.get(name, {})}
+    if profile['architecture'] not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture {profile['architecture']} in performance profile {name}")
+    return profile
+
+def create_shared_layer(scope):
+    return _lambda.LayerVersion(
+        scope, "BatchVideoSharedLayer",
+        code=_lambda.Code.from_asset(os.path.join(os.getcwd(), 'lambda', 'layers', 'batch-video-shared')),
+        compatible_runtimes=[_lambda.Runtime.PYTHON_3_12],
+        compatible_architectures=list(ARCHITECTURES.values()),
+        description="Helpers shared by the batch video test lambdas"
     )
-    
-def test_get_status_by_id_lambda_function(scope, function_name, handler_file, lambda_role, table):
-    return _lambda.Function(
-        scope, function_name,
-        runtime=_lambda.Runtime.PYTHON_3_12,
-        handler=f"{handler_file}.handler",
-        code=_lambda.Code.from_asset(os.path.join(os.getcwd(), 'lambda', handler_file)),
-        environment={
-            'INFERENCE_SETTINGS_TABLE_NAME': table.table_name
-        },
-        role=lambda_role,
-        timeout=Duration.minutes(1)
+
+def sdk_pandas_layer(scope, architecture):
+    construct_id = "AWSSDKPandasLayer" if architecture == 'x86_64' else f"AWSSDKPandasLayer{architecture.title()}"
+    existing = scope.node.try_find_child(construct_id)
+    return existing or _lambda.LayerVersion.from_layer_version_arn(scope, construct_id, SDK_PANDAS_LAYER_ARNS[architecture])
+
+def web_adapter_layer(scope, function_name, architecture):
+    # Python has no native response streaming; run.sh starts stream_server.py behind the
+    # Lambda Web Adapter, which relays its chunked output through the function URL.
+    return _lambda.LayerVersion.from_layer_version_arn(
+        scope, f"{function_name}WebAdapterLayer", WEB_ADAPTER_LAYER_ARNS[architecture]
     )
-    
-def test_events_lambda_function(scope, function_name, handler_file, lambda_role):
-    return _lambda.Function(
+
+def create_lambda_function(scope, function_name, handler_file, lambda_role, profile, environment=None, layers=None, handler=None):
+    """Python 3.12 function for lambda/<handler_file>, sized by a performance profile.
+
+    With provisioned concurrency the function is published behind a "live" alias, which is
+    returned so routes and event sources invoke the pre-initialized version.
+    """
+    function = _lambda.Function(
         scope, function_name,
         runtime=_lambda.Runtime.PYTHON_3_12,
-        handler=f"{handler_file}.handler",
+        handler=handler or f"{handler_file}.handler",
         code=_lambda.Code.from_asset(os.path.join(os.getcwd(), 'lambda', handler_file)),
         role=lambda_role,
-        timeout=Duration.minutes(1)
+        environment=environment,
+        layers=layers,
+        memory_size=profile['memory_size'],
+        architecture=ARCHITECTURES[profile['architecture']],
+        ephemeral_storage_size=cdk.Size.mebibytes(profile['ephemeral_storage_mb']),
+        timeout=Duration.seconds(profile['timeout_secs']),
+        reserved_concurrent_executions=profile['reserved_concurrency']
     )
-    
+    if profile['provisioned_concurrency']:
+        return _lambda.Alias(
+            scope, f"{function_name}LiveAlias",
+            alias_name="live",
+            version=function.current_version,
+            provisioned_concurrent_executions=profile['provisioned_concurrency']
+        )
+    return function
+
+def settings_environment(table):
+    return {
+        'INFERENCE_SETTINGS_TABLE_NAME': table.table_name,
+        'INFERENCE_SETTINGS_TTL_SECS': '300'
+    }
+
+def chat_environment(table):
+    return {
+        **settings_environment(table),
+        'CHUNK_FETCH_CONCURRENCY': '16',
+        'CHUNK_FETCH_TIMEOUT_SECS': '10',
+        'CHUNK_FETCH_DEADLINE_SECS': '15',
+        'VIDEO_CONTEXT_TOKEN_BUDGET': '150000',
+        'VIDEO_CONTEXT_TRUNCATION': 'recent',
+        'VIDEO_CONTEXT_MODE': 'auto',
+        'RETRIEVAL_TOP_K': '5',
+        'RETRIEVAL_NEIGHBOURS': '1',
+        'VIDEO_CONTEXT_CACHE_MAX_BYTES': str(64 * 1024 * 1024),
+        'VIDEO_CONTEXT_SPILL_DIR': '/tmp/video-context-cache',
+        'CHAT_HISTORY_KEEP_TURNS': '6',
+        'CHAT_HISTORY_SUMMARY_TOKEN_CAP': '1500'
+    }
+
+def chat_stream_environment(table):
+    return {
+        **chat_environment(table),
+        'AWS_LAMBDA_EXEC_WRAPPER': '/opt/bootstrap',
+        'AWS_LWA_INVOKE_MODE': 'response_stream',
+        'PORT': '8080'
+    }
+
+def execution_environment(table, submission_queue):
+    return {
+        **settings_environment(table),
+        'SUBMISSION_MODE': 'sync',
+        'SUBMISSION_QUEUE_URL': submission_queue.queue_url,
+        'BULK_SUBMISSION_MAX_VIDEOS': '200',
+        'BULK_SUBMISSION_CONCURRENCY': '8',
+        'API_INTEGRATION_TIMEOUT_SECS': '29'
+    }
+
+def execution_worker_environment(table):
+    return {
+        **settings_environment(table),
+        'INFERENCE_REQUEST_TIMEOUT_SECS': '60',
+        'SUBMISSION_MAX_RECEIVE_COUNT': str(SUBMISSION_MAX_RECEIVE_COUNT)
+    }
+
+def transcript_environment(table):
+    return {
+        **settings_environment(table),
+        'CHUNK_FETCH_CONCURRENCY': '16',
+        'CHUNK_FETCH_TIMEOUT_SECS': '10',
+        'CHUNK_FETCH_DEADLINE_SECS': '20'
+    }
+
+def status_environment(table, status_table):
+    return {
+        **settings_environment(table),
+        'STATUS_INDEX_TABLE_NAME': status_table.table_name,
+        'BATCH_STATUS_MAX_ITEMS': '50',
+        'BATCH_STATUS_CONCURRENCY': '8'
+    }
+
+def status_indexer_environment(status_table):
+    return {
+        'STATUS_INDEX_TABLE_NAME': status_table.table_name
+    }
+
+def events_environment(table):
+    return {
+        **settings_environment(table),
+        'EVENTS_CACHE_TTL_SECS': '5',
+        'EVENT_SCAN_CONCURRENCY': '16'
+    }
+
+def add_submission_worker_source(worker_lambda, submission_queue, max_concurrency):
+    # Cap pollers at the backend limit (SQS event sources need at least 2) so messages are not throttled into the DLQ
+    worker_lambda.add_event_source(event_sources.SqsEventSource(
+        submission_queue,
+        batch_size=1,
+        report_batch_item_failures=True,
+        max_concurrency=max(max_concurrency, 2)
+    ))
 
-    
 def create_lambda_role(scope):
     lambda_role = iam.Role(
         scope, "LambdaExecutionRole",
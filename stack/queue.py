@@ -0,0 +1,20 @@
+from aws_cdk import aws_sqs as sqs, Duration
+
+# Receives after which a submission is parked in the dead-letter queue
+SUBMISSION_MAX_RECEIVE_COUNT = 3
+
+def create_submission_queue(scope, worker_timeout):
+    dead_letter_queue = sqs.Queue(
+        scope, "BatchVideoSubmissionDLQ",
+        retention_period=Duration.days(14)
+    )
+    # Visibility timeout of six worker timeouts, as recommended for Lambda event sources
+    queue = sqs.Queue(
+        scope, "BatchVideoSubmissionQueue",
+        visibility_timeout=Duration.seconds(worker_timeout.to_seconds() * 6),
+        dead_letter_queue=sqs.DeadLetterQueue(
+            max_receive_count=SUBMISSION_MAX_RECEIVE_COUNT,
+            queue=dead_letter_queue
+        )
+    )
+    return queue, dead_letter_queue
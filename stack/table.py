@@ -6,4 +6,14 @@ def get_inference_setting_table(scope):
         scope=scope,
         id=construct_id,
         table_name="inference-settings"
-    )
\ No newline at end of file
+    )
+
+def create_execution_status_table(scope):
+    # Derived from S3 notifications and rebuildable from the chunks themselves
+    return dynamodb.Table(
+        scope, "BatchVideoExecutionStatusTable",
+        partition_key=dynamodb.Attribute(name="execution_key", type=dynamodb.AttributeType.STRING),
+        sort_key=dynamodb.Attribute(name="chunk_id", type=dynamodb.AttributeType.STRING),
+        billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        removal_policy=RemovalPolicy.DESTROY
+    )
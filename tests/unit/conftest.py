@@ -0,0 +1,16 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LAMBDA_DIR = os.path.join(ROOT, "lambda")
+
+# The handlers' helper modules are imported the way Lambda sees them: from the function
+# directory and the shared layer, both on sys.path
+for path in (
+    os.path.join(LAMBDA_DIR, "layers", "batch-video-shared", "python"),
+    os.path.join(LAMBDA_DIR, "batch-video-chat-testing"),
+    os.path.join(LAMBDA_DIR, "batch-video-execution-testing"),
+    os.path.join(LAMBDA_DIR, "events-configs-test"),
+):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,20 @@
+"""Import a handler module from its Lambda directory, whose hyphenated name is not importable."""
+import importlib.util
+import os
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "lambda")
+
+
+def load_handler_module(directory):
+    """The module lambda/<directory>/<directory>.py, with its directory on sys.path like in Lambda."""
+    path = os.path.join(LAMBDA_DIR, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    name = directory.replace("-", "_")
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(path, f"{directory}.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
@@ -1,15 +1,205 @@
+import copy
+import json
+
 import aws_cdk as core
 import aws_cdk.assertions as assertions
+import pytest
+
+from batch_testing_cdk.batch_testing_cdk_stack import DEFAULT_CACHE_BUCKET_NAME, BatchTestingCdkStack
+from stack.lambda_functions import DEFAULT_PERFORMANCE_PROFILE, performance_profile
+
+with open("cdk.json") as f:
+    CDK_CONTEXT = json.load(f)["context"]
+
+
+def synth(profile_overrides=None, **context_overrides):
+    context = copy.deepcopy(CDK_CONTEXT)
+    for name, overrides in (profile_overrides or {}).items():
+        context["performance_profiles"].setdefault(name, {}).update(overrides)
+    context.update(context_overrides)
+    app = core.App(context=context)
+    stack = BatchTestingCdkStack(app, "batch-testing-cdk")
+    return assertions.Template.from_stack(stack)
 
-from batch_testing_cdk.batch_testing_cdk_stack import BatchTestingCdkStack
 
-# example tests. To run these tests, uncomment this file along with the example
-# resource in batch_testing_cdk/batch_testing_cdk_stack.py
 def test_sqs_queue_created():
+    template = synth()
+
+    # six times the execution_worker profile's 90 s timeout
+    template.has_resource_properties("AWS::SQS::Queue", {
+        "VisibilityTimeout": 540,
+        "RedrivePolicy": {"maxReceiveCount": 3, "deadLetterTargetArn": assertions.Match.any_value()}
+    })
+
+
+def test_stack_synthesizes_without_context():
     app = core.App()
     stack = BatchTestingCdkStack(app, "batch-testing-cdk")
     template = assertions.Template.from_stack(stack)
 
-#     template.has_resource_properties("AWS::SQS::Queue", {
-#         "VisibilityTimeout": 300
-#     })
+    template.has_resource_properties("Custom::S3BucketNotifications", {
+        "BucketName": DEFAULT_CACHE_BUCKET_NAME
+    })
+
+
+def test_chat_function_uses_chat_profile():
+    template = synth()
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "batch-video-chat-testing.handler",
+        "MemorySize": 1769,
+        "Architectures": ["arm64"],
+        "EphemeralStorage": {"Size": 2048},
+        "Timeout": 300
+    })
+
+
+def test_transcript_function_sized_separately_from_chat():
+    template = synth()
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "batch-video-transcript-testing.handler",
+        "MemorySize": 1024,
+        "Architectures": ["arm64"],
+        "EphemeralStorage": {"Size": 512},
+        "Timeout": 300
+    })
+
+
+def test_worker_reserved_concurrency_defaults_to_max_concurrency():
+    template = synth()
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "batch-video-execution-testing.worker_handler",
+        "ReservedConcurrentExecutions": CDK_CONTEXT["max_concurrency"],
+        "Timeout": 90
+    })
+
+
+def test_layers_follow_architecture():
+    template = synth({"chat_stream": {"architecture": "x86_64"}})
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "batch-video-execution-testing.handler",
+        "Architectures": ["arm64"],
+        "Layers": assertions.Match.array_with([
+            "arn:aws:lambda:us-east-1:336392948345:layer:AWSSDKPandas-Python312-Arm64:16"
+        ])
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "run.sh",
+        "Architectures": ["x86_64"],
+        "Layers": assertions.Match.array_with([
+            "arn:aws:lambda:us-east-1:753240598075:layer:LambdaAdapterLayerX86:25"
+        ])
+    })
+
+
+def test_provisioned_concurrency_publishes_live_alias():
+    template = synth({"transcript": {"provisioned_concurrency": 2, "reserved_concurrency": 10}})
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "batch-video-transcript-testing.handler",
+        "ReservedConcurrentExecutions": 10
+    })
+    template.has_resource_properties("AWS::Lambda::Alias", {
+        "Name": "live",
+        "ProvisionedConcurrencyConfig": {"ProvisionedConcurrentExecutions": 2}
+    })
+
+
+def test_profile_defaults_without_context():
+    stack = core.Stack(core.App(), "profiles")
+
+    assert performance_profile(stack, "chat") == DEFAULT_PERFORMANCE_PROFILE
+
+
+def test_unknown_architecture_rejected():
+    stack = core.Stack(core.App(context={"performance_profiles": {"chat": {"architecture": "ppc64"}}}), "profiles")
+
+    with pytest.raises(ValueError):
+        performance_profile(stack, "chat")
+
+
+def test_api_compresses_large_responses():
+    template = synth()
+
+    template.has_resource_properties("AWS::ApiGateway::RestApi", {
+        "MinimumCompressionSize": CDK_CONTEXT["api_min_compression_bytes"]
+    })
+
+
+def test_api_passes_gzipped_transcripts_as_binary():
+    template = synth()
+
+    template.has_resource_properties("AWS::ApiGateway::RestApi", {
+        "BinaryMediaTypes": ["application/gzip"]
+    })
+
+
+def test_stage_cache_ttls_per_method():
+    template = synth(api_cache={**CDK_CONTEXT["api_cache"], "enabled": True})
+
+    template.has_resource_properties("AWS::ApiGateway::Stage", {
+        "CacheClusterEnabled": True,
+        "CacheClusterSize": "0.5",
+        "MethodSettings": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "ResourcePath": "/~1videos~1{videoId}~1executions~1{executionId}~1status-test",
+                "HttpMethod": "GET",
+                "CachingEnabled": True,
+                "CacheTtlInSeconds": 5
+            }),
+            assertions.Match.object_like({
+                "ResourcePath": "/~1videos~1{videoId}~1executions~1{executionId}~1events-test",
+                "HttpMethod": "GET",
+                "CachingEnabled": True,
+                "CacheTtlInSeconds": 60
+            })
+        ])
+    })
+
+
+def test_events_configs_never_cached():
+    template = synth(api_cache={**CDK_CONTEXT["api_cache"], "enabled": True})
+
+    stages = template.find_resources("AWS::ApiGateway::Stage")
+    cached_paths = [
+        setting["ResourcePath"]
+        for stage in stages.values()
+        for setting in stage["Properties"].get("MethodSettings", [])
+    ]
+    assert "/~1events-configs-test" not in cached_paths
+
+
+def test_status_cache_keyed_on_execution():
+    template = synth()
+
+    template.has_resource_properties("AWS::ApiGateway::Method", {
+        "HttpMethod": "GET",
+        "RequestParameters": {
+            "method.request.path.videoId": True,
+            "method.request.path.executionId": True
+        },
+        "Integration": assertions.Match.object_like({
+            "CacheKeyParameters": ["method.request.path.videoId", "method.request.path.executionId"]
+        })
+    })
+
+
+def test_stage_cache_off_by_default():
+    template = synth()
+
+    template.has_resource_properties("AWS::ApiGateway::Stage", {
+        "CacheClusterEnabled": assertions.Match.absent(),
+        "MethodSettings": assertions.Match.absent()
+    })
+
+
+def test_chat_stream_url_requires_iam_auth():
+    template = synth()
+
+    template.has_resource_properties("AWS::Lambda::Url", {
+        "AuthType": "AWS_IAM",
+        "InvokeMode": "RESPONSE_STREAM"
+    })
@@ -0,0 +1,98 @@
+from conversation_history import compact_history, split_turns
+
+
+def estimate_tokens(text):
+    return len(text) // 4
+
+
+def turn(index):
+    return [
+        {"role": "user", "content": [{"text": f"question {index}\n\nPlease answer in Markdown."}]},
+        {"role": "assistant", "content": [{"text": f"answer {index}"}]}
+    ]
+
+
+def conversation(first, last):
+    return [message for index in range(first, last) for message in turn(index)]
+
+
+def questions_in(messages):
+    return [message["content"][0]["text"].split("\n\n")[0] for message in messages if message["role"] == "user"]
+
+
+def test_short_history_is_replayed_whole():
+    messages = conversation(0, 3)
+
+    recent, summary, stats = compact_history(messages, "", 6, 1500, estimate_tokens)
+
+    assert recent == messages
+    assert summary == ""
+    assert stats["summarizedTurns"] == 0
+    assert stats["summaryCoversTurns"] == 0
+
+
+def test_older_turns_fold_into_summary():
+    recent, summary, stats = compact_history(conversation(0, 8), "", 6, 1500, estimate_tokens)
+
+    assert questions_in(recent) == [f"question {index}" for index in range(2, 8)]
+    assert summary.splitlines() == [
+        "User asked: question 0", "Assistant answered: answer 0",
+        "User asked: question 1", "Assistant answered: answer 1"
+    ]
+    assert stats["keptTurns"] == 6
+    assert stats["summarizedTurns"] == 2
+
+
+def test_summary_cap_drops_oldest_lines():
+    _, summary, stats = compact_history(conversation(0, 20), "", 2, 20, estimate_tokens)
+
+    assert estimate_tokens(summary) <= 20
+    assert summary.splitlines()[-1] == "Assistant answered: answer 17"
+    assert stats["droppedSummaryLines"] > 0
+
+
+def test_turns_already_summarized_are_not_summarized_again():
+    _, summary, _ = compact_history(conversation(0, 8), "User asked: question 0\nAssistant answered: answer 0",
+                                    6, 1500, estimate_tokens, summarized_turns=1)
+
+    assert summary.count("question 0") == 1
+    assert summary.count("question 1") == 1
+
+
+def test_condensed_round_trip_keeps_every_turn_once():
+    # The client posts back what it was given: the compacted conversation, summary and count
+    messages, summary, covered = [], "", 0
+    for index in range(12):
+        recent, summary, stats = compact_history(messages, summary, 6, 1500, estimate_tokens, covered)
+        messages = recent + turn(index)
+        covered = stats["summaryCoversTurns"]
+
+        seen = [line[len("User asked: "):] for line in summary.splitlines() if line.startswith("User asked: ")]
+        seen += questions_in(messages[2 * covered:])
+        assert seen == [f"question {asked}" for asked in range(index + 1)]
+        assert len(split_turns(messages)) <= 7
+
+
+def test_condensed_history_with_stale_count_loses_no_turn():
+    # keep=6, a summary of turns 0-3, and turns 4-9 plus a new one sent back
+    summary = "\n".join(f"User asked: question {index}" for index in range(4))
+    messages = conversation(4, 11)
+
+    recent, summary, stats = compact_history(messages, summary, 6, 1500, estimate_tokens, 0)
+
+    assert "User asked: question 4" in summary.splitlines()
+    assert questions_in(recent) == [f"question {index}" for index in range(5, 11)]
+    assert stats["summaryCoversTurns"] == 0
+
+
+def test_full_history_echo_counts_against_the_sent_list():
+    # A client keeping its own full log may send the count for that log instead
+    summary = "\n".join(f"User asked: question {index}" for index in range(4))
+
+    recent, summary, stats = compact_history(conversation(0, 11), summary, 6, 1500, estimate_tokens, 4)
+
+    assert [line for line in summary.splitlines() if line.startswith("User asked")] == [
+        f"User asked: question {index}" for index in range(5)
+    ]
+    assert len(split_turns(recent)) == 6
+    assert stats["summaryCoversTurns"] == 0
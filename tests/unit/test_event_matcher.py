@@ -0,0 +1,60 @@
+from event_matcher import EventMatcher, transcript_text
+
+
+def test_counts_every_event_in_one_pass():
+    matcher = EventMatcher(["fire", "parked car", "car"])
+
+    found = matcher.count("A parked car near the fire. Another car drives past the fire.")
+
+    assert found["fire"]["count"] == 2
+    assert found["parked car"]["count"] == 1
+    assert found["car"]["count"] == 2
+
+
+def test_matches_are_case_insensitive():
+    matcher = EventMatcher(["Fire"])
+
+    assert [(event, start, end) for event, start, end in matcher.find("FIRE at dawn")] == [("Fire", 0, 4)]
+
+
+def test_matches_whole_words_only():
+    matcher = EventMatcher(["fire", "car"])
+
+    assert matcher.count("The firefighter left the carpark; campfire nearby") == {}
+
+
+def test_surrounding_spaces_in_events_are_ignored():
+    matcher = EventMatcher([" fire ", "parked car "])
+
+    found = matcher.count("A parked car caught fire")
+
+    assert found[" fire "]["count"] == 1
+    assert found["parked car "]["count"] == 1
+
+
+def test_boundaries_use_the_lower_cased_pattern_length():
+    # "İ" lower-cases to two characters, so the pattern is longer than the event
+    matcher = EventMatcher(["İzmir"])
+
+    assert [(start, end) for _, start, end in matcher.find("xx i̇zmir")] == [(3, 9)]
+    assert list(matcher.find("xxi̇zmir")) == []
+
+
+def test_blank_and_duplicate_events_are_dropped():
+    matcher = EventMatcher(["fire", "", "   ", "fire"])
+
+    assert matcher.events == ["fire"]
+
+
+def test_snippet_shows_first_match_in_context():
+    matcher = EventMatcher(["fire"])
+
+    found = matcher.count("one two  fire  three four five", snippet_chars=5)
+
+    assert found["fire"]["snippet"] == "two fire thr"
+
+
+def test_transcript_text_walks_nested_values_in_order():
+    chunk = {"results": [{"text": "first"}, {"text": "second", "score": 1}], "note": "third"}
+
+    assert [line for line in transcript_text(chunk).split("\n") if line] == ["first", "second", "third"]
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+from tests.unit.lambda_modules import load_handler_module
+
+status = load_handler_module("batch-video-get-status-by-id-test")
+execution = load_handler_module("batch-video-execution-testing")
+
+SUBMITTED_AT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def minutes(*offsets):
+    return [SUBMITTED_AT + timedelta(minutes=offset) for offset in offsets]
+
+
+def test_progress_from_manifest_with_rate_and_eta():
+    manifest = {"expectedChunks": 10, "submittedAt": SUBMITTED_AT.isoformat()}
+
+    progress = status.execution_progress(manifest, minutes(1, 2, 3, 4), now=SUBMITTED_AT + timedelta(minutes=4))
+
+    assert progress["completedChunks"] == 4
+    assert progress["expectedChunks"] == 10
+    assert progress["expectedChunksSource"] == "manifest"
+    assert progress["percentComplete"] == 40.0
+    assert progress["chunksPerMinute"] == 1.0
+    assert progress["etaSeconds"] == 360
+
+
+def test_expected_chunks_fall_back_to_chunk_videos():
+    progress = status.execution_progress(None, minutes(1, 2), chunk_videos=5, now=SUBMITTED_AT + timedelta(minutes=2))
+
+    assert progress["expectedChunks"] == 5
+    assert progress["expectedChunksSource"] == "chunkVideos"
+    # Without a submission time the rate is measured between the first and last chunk
+    assert progress["chunksPerMinute"] == 1.0
+    assert progress["etaSeconds"] == 180
+
+
+def test_progress_without_any_count():
+    progress = status.execution_progress(None, [])
+
+    assert progress["expectedChunks"] is None
+    assert progress["expectedChunksSource"] is None
+    assert progress["etaSeconds"] is None
+    assert "percentComplete" not in progress
+
+
+def test_expected_chunk_count_from_request_or_inference_params():
+    assert execution.expected_chunk_count({"expected_chunk_count": "12"}, None) == 12
+    assert execution.expected_chunk_count({"video_duration_in_secs": 125}, 60) == 3
+    assert execution.expected_chunk_count({"InferenceParams": {"video_duration_in_secs": 120}}, 60) == 2
+    assert execution.expected_chunk_count({}, 60) is None
+
+
+def test_chunk_duration_defaults_to_inference_settings(monkeypatch):
+    monkeypatch.setattr(execution, "get_inference_settings", lambda: {"chunk_duration_in_secs": 30})
+
+    assert execution.chunk_duration_secs({}) == 30
+    assert execution.chunk_duration_secs({"InferenceParams": {"chunk_duration_in_secs": 10}}) == 10
+    assert execution.chunk_duration_secs({"chunk_duration_in_secs": 5}) == 5
+
+
+def test_index_failed_chunks_match_s3_scan_shape():
+    items = [
+        {"chunk_id": "0", "has_video": True, "has_transcript": True, "transcript_key": "v/e/ts_0.json",
+         "failed": True, "failed_entry": "frame_3", "transcript_at": SUBMITTED_AT.isoformat()},
+        {"chunk_id": "1", "has_video": True, "has_transcript": True, "transcript_key": "v/e/ts_1.json",
+         "failed": False, "transcript_at": SUBMITTED_AT.isoformat()},
+    ]
+
+    state, failed_chunks, _ = status.status_from_index(items)
+
+    assert state == "FAILED"
+    assert failed_chunks == [{"key": "v/e/ts_0.json", "entry": "frame_3"}]
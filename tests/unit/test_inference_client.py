@@ -0,0 +1,138 @@
+import random
+import time
+from collections import Counter
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+import phase_metrics  # noqa: E402
+from inference_client import InferenceClient, is_unconfirmed_submission, normalize_endpoints  # noqa: E402
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = "{}"
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error", response=self)
+
+
+class Session:
+    """Answers POSTs per URL from a list of status codes or exceptions, repeating the last one."""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.calls = []
+
+    def post(self, url, json=None, timeout=None):
+        self.calls.append((url, timeout))
+        queue = self.outcomes[url]
+        outcome = queue.pop(0) if len(queue) > 1 else queue[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return Response(outcome)
+
+
+def client_with(outcomes, **kwargs):
+    client = InferenceClient(backoff_base=0, backoff_cap=0, **kwargs)
+    client.session = Session(outcomes)
+    return client
+
+
+def test_normalize_endpoints_accepts_every_settings_shape():
+    assert normalize_endpoints("http://a") == [{"url": "http://a", "weight": 1.0}]
+    assert normalize_endpoints({"primary": "http://a"}) == [{"url": "http://a", "weight": 1.0}]
+    assert normalize_endpoints(["http://a", {"url": "http://b", "weight": "3"}, {"weight": 2}]) == [
+        {"url": "http://a", "weight": 1.0}, {"url": "http://b", "weight": 3.0}
+    ]
+
+
+def test_5xx_is_retried_on_another_endpoint():
+    client = client_with({"http://a": [503], "http://b": [200]}, max_retries=1)
+    random.seed(1)
+
+    response = client.post(["http://a", "http://b"], {})
+
+    assert response.status_code == 200
+    assert len({url for url, _ in client.session.calls}) == len(client.session.calls)
+
+
+def test_read_timeout_is_not_retried():
+    client = client_with({"http://a": [requests.exceptions.ReadTimeout("slow")]}, max_retries=2)
+
+    with pytest.raises(requests.exceptions.ReadTimeout) as raised:
+        client.post("http://a", {})
+
+    assert len(client.session.calls) == 1
+    assert is_unconfirmed_submission(raised.value)
+
+
+def test_circuit_opens_after_consecutive_failures_and_half_opens_after_cooldown():
+    client = client_with({"http://a": [500], "http://b": [200]}, max_retries=0, failure_threshold=2,
+                         cooldown_secs=0.2)
+    endpoints = [{"url": "http://a", "weight": 1000.0}, {"url": "http://b", "weight": 0.001}]
+    for _ in range(2):
+        client._record("http://a", 0.01, failed=True)
+
+    assert client.endpoint_stats()["http://a"]["circuit"] == "open"
+    assert {client.choose_endpoint(endpoints) for _ in range(20)} == {"http://b"}
+
+    time.sleep(0.25)
+    assert client.endpoint_stats()["http://a"]["circuit"] == "half_open"
+    # One trial request is let through; the endpoint stays out until it reports back
+    assert client.choose_endpoint(endpoints) == "http://a"
+    assert {client.choose_endpoint(endpoints) for _ in range(20)} == {"http://b"}
+    client._record("http://a", 0.01, failed=False)
+    assert client.endpoint_stats()["http://a"]["circuit"] == "closed"
+
+
+def test_routing_follows_weight_over_latency():
+    client = client_with({})
+    endpoints = [{"url": "http://a", "weight": 3.0}, {"url": "http://b", "weight": 1.0}]
+    client._record("http://a", 0.1, failed=False)
+    client._record("http://b", 0.1, failed=False)
+    random.seed(7)
+
+    picks = Counter(client.choose_endpoint(endpoints) for _ in range(4000))
+
+    assert 2.6 < picks["http://a"] / picks["http://b"] < 3.4
+
+
+def test_slow_endpoint_gets_less_traffic():
+    client = client_with({})
+    endpoints = ["http://fast", "http://slow"]
+    client._record("http://fast", 0.1, failed=False)
+    client._record("http://slow", 0.4, failed=False)
+    random.seed(7)
+
+    picks = Counter(client.choose_endpoint(normalize_endpoints(endpoints)) for _ in range(4000))
+
+    assert picks["http://fast"] > 3 * picks["http://slow"]
+
+
+def test_deadline_caps_the_timeout_and_stops_new_attempts():
+    client = client_with({"http://a": [200]}, timeout=60)
+
+    client.post("http://a", {}, deadline=time.monotonic() + 5)
+    assert client.session.calls[-1][1] <= 5
+
+    with pytest.raises(requests.exceptions.ConnectTimeout) as raised:
+        client.post("http://a", {}, deadline=time.monotonic() - 1)
+    assert len(client.session.calls) == 1
+    assert not is_unconfirmed_submission(raised.value)
+
+
+def test_endpoint_health_is_emitted_once_per_invocation(capsys):
+    client = client_with({"http://a": [200]})
+
+    with phase_metrics.measure_invocation("execution"):
+        for _ in range(3):
+            client.post("http://a", {})
+            client.emit_endpoint_metrics()
+
+    lines = [line for line in capsys.readouterr().out.splitlines() if '"Endpoint"' in line]
+    assert len(lines) == 1
+    assert '"EndpointCircuitOpen": 0' in lines[0]
@@ -0,0 +1,54 @@
+import pytest
+
+import inference_settings
+
+
+class Table:
+    def __init__(self, item):
+        self.item = item
+        self.reads = 0
+
+    def get_item(self, Key):
+        self.reads += 1
+        return {"Item": dict(self.item)}
+
+
+class DynamoDB:
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = Table({"inference_setting_id": "1", "inference_endpoint": "http://a"})
+    monkeypatch.setattr(inference_settings, "get_resource", lambda name: DynamoDB(table))
+    monkeypatch.setattr(inference_settings, "_cached_item", None)
+    monkeypatch.setattr(inference_settings, "_missing_since", {})
+    return table
+
+
+def test_settings_are_read_once_per_ttl(table):
+    for _ in range(3):
+        assert inference_settings.get_inference_setting("inference_endpoint") == "http://a"
+
+    assert table.reads == 1
+
+
+def test_missing_setting_is_rechecked_once_per_ttl(table):
+    for _ in range(3):
+        with pytest.raises(Exception, match="cache_bucket not found"):
+            inference_settings.get_inference_setting("cache_bucket")
+
+    assert table.reads == 2
+
+
+def test_missing_setting_is_picked_up_after_ttl(table, monkeypatch):
+    with pytest.raises(Exception):
+        inference_settings.get_inference_setting("cache_bucket")
+    table.item["cache_bucket"] = "bucket"
+    monkeypatch.setattr(inference_settings, "INFERENCE_SETTINGS_TTL_SECS", 0)
+
+    assert inference_settings.get_inference_setting("cache_bucket") == "bucket"
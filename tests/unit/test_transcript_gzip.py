@@ -0,0 +1,71 @@
+import base64
+import gzip
+import json
+
+import pytest
+
+from chunk_store import chunk_base_name, decode_chunk_body, is_transcript_key
+from tests.unit.lambda_modules import load_handler_module
+
+transcript = load_handler_module("batch-video-transcript-testing")
+
+LARGE_PAYLOAD = {"chunks": [{"results": "x" * 100} for _ in range(50)]}
+
+
+def event(accept=None, accept_encoding=None):
+    headers = {}
+    if accept is not None:
+        headers["accept"] = accept
+    if accept_encoding is not None:
+        headers["Accept-Encoding"] = accept_encoding
+    return {"headers": headers}
+
+
+@pytest.mark.parametrize("accept, accept_encoding, expected", [
+    ("application/gzip", "gzip, deflate, br", True),
+    ("application/json, application/gzip;q=0.5", "br;q=1.0, gzip;q=0.8", True),
+    ("application/json", "gzip", False),
+    ("application/gzip", "deflate", False),
+    ("application/gzip", "gzip;q=0", False),
+    ("application/gzip;q=0", "gzip", False),
+    (None, None, False),
+])
+def test_gzip_negotiation(accept, accept_encoding, expected):
+    assert transcript.accepts_gzip(event(accept, accept_encoding)) is expected
+
+
+def test_large_payload_is_gzipped_and_base64_encoded():
+    response = transcript.transcript_response(event("application/gzip", "gzip"), LARGE_PAYLOAD)
+
+    assert response["isBase64Encoded"] is True
+    assert response["headers"]["Content-Encoding"] == "gzip"
+    assert response["headers"]["Vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(base64.b64decode(response["body"]))) == LARGE_PAYLOAD
+
+
+def test_small_payload_is_sent_plain():
+    response = transcript.transcript_response(event("application/gzip", "gzip"), {"chunks": []})
+
+    assert "isBase64Encoded" not in response
+    assert "Content-Encoding" not in response["headers"]
+    assert json.loads(response["body"]) == {"chunks": []}
+
+
+def test_payload_is_sent_plain_without_negotiation():
+    response = transcript.transcript_response(event("application/json", "gzip"), LARGE_PAYLOAD)
+
+    assert json.loads(response["body"]) == LARGE_PAYLOAD
+
+
+def test_gzipped_chunk_objects_read_as_json():
+    body = json.dumps([{"text": "a car"}]).encode("utf-8")
+
+    assert decode_chunk_body(gzip.compress(body)) == body
+    assert decode_chunk_body(body) == body
+
+
+def test_gzipped_chunk_keys_are_transcripts():
+    key = "batch-videos/v/e/chunks/ts_chunk_start_10.json.gz"
+
+    assert is_transcript_key(key)
+    assert chunk_base_name(key) == chunk_base_name(key.removesuffix(".gz")) == "chunk_start_10"
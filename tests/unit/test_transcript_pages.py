@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from tests.unit.lambda_modules import load_handler_module
+
+transcript = load_handler_module("batch-video-transcript-testing")
+
+PREFIX = "batch-videos/video/execution/chunks/"
+KEYS = [f"{PREFIX}ts_chunk_start_{start}.json" for start in (0, 10, 20, 100, 110)]
+
+
+@pytest.fixture
+def chunk_bodies(monkeypatch):
+    def fetch_chunk(bucket, key):
+        return [{"chunk": transcript.chunk_start_seconds(key)}]
+    monkeypatch.setattr(transcript, "fetch_chunk", fetch_chunk)
+
+
+@pytest.mark.parametrize("body, expected", [
+    ({}, (0, transcript.DEFAULT_PAGE_LIMIT)),
+    ({"cursor": "3", "limit": 2}, (3, 2)),
+    ({"cursor": None, "limit": transcript.MAX_PAGE_LIMIT}, (0, transcript.MAX_PAGE_LIMIT)),
+])
+def test_page_params(body, expected):
+    assert transcript.parse_page_params(body) == expected
+
+
+@pytest.mark.parametrize("body", [
+    {"cursor": "abc"},
+    {"cursor": -1},
+    {"limit": transcript.MAX_PAGE_LIMIT + 1},
+    {"limit": -1},
+])
+def test_invalid_page_params(body):
+    with pytest.raises(ValueError):
+        transcript.parse_page_params(body)
+
+
+def test_pages_follow_chunk_start_order(chunk_bodies):
+    # Listing order is lexical, so chunk_start 100 would come before 20
+    page = transcript.paginate_transcript("bucket", sorted(KEYS), 0, 3)
+
+    assert [chunk["chunkStart"] for chunk in page["chunks"]] == [0, 10, 20]
+    assert [chunk["index"] for chunk in page["chunks"]] == [0, 1, 2]
+    assert page["chunks"][2]["results"] == [{"chunk": 20}]
+    assert page["totalChunks"] == 5
+    assert page["nextCursor"] == "3"
+    assert page["partial"] is False
+
+
+def test_last_page_has_no_next_cursor(chunk_bodies):
+    page = transcript.paginate_transcript("bucket", KEYS, 3, 3)
+
+    assert [chunk["chunkStart"] for chunk in page["chunks"]] == [100, 110]
+    assert page["nextCursor"] is None
+
+
+def test_cursor_past_the_end_is_an_empty_page(chunk_bodies):
+    page = transcript.paginate_transcript("bucket", KEYS, 10, 3)
+
+    assert page["chunks"] == []
+    assert page["nextCursor"] is None
+
+
+def test_chunks_missing_the_deadline_are_reported(monkeypatch):
+    def fetch_chunk(bucket, key):
+        if transcript.chunk_start_seconds(key) == 10:
+            time.sleep(0.5)
+        return [{"chunk": transcript.chunk_start_seconds(key)}]
+    monkeypatch.setattr(transcript, "fetch_chunk", fetch_chunk)
+    monkeypatch.setattr(transcript, "CHUNK_FETCH_DEADLINE_SECS", 0.1)
+
+    page = transcript.paginate_transcript("bucket", KEYS, 0, 3)
+
+    assert page["partial"] is True
+    assert page["chunks"][1] == {"index": 1, "chunkStart": 10, "key": KEYS[1], "error": "Timed out fetching chunk"}
+    assert page["chunks"][2]["results"] == [{"chunk": 20}]
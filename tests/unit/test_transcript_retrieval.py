@@ -0,0 +1,49 @@
+from transcript_retrieval import TranscriptIndex, is_summary_question, select_relevant_chunks, tokenize
+
+
+def chunks(*texts):
+    return {f"chunk_{index:03d}.json": [{"text": text}] for index, text in enumerate(texts)}
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What is the RED car doing, at 10:05?") == ["red", "car", "doing", "10", "05"]
+
+
+def test_search_ranks_rarer_and_repeated_terms_first():
+    index = TranscriptIndex(chunks(
+        "a truck passes the gate",
+        "a red car stops at the gate, the red car door opens",
+        "a red bicycle leans on the wall",
+        "empty street",
+    ))
+
+    assert index.search("red car", 3) == [1, 2]
+
+
+def test_search_without_known_terms_finds_nothing():
+    index = TranscriptIndex(chunks("a truck passes", "empty street"))
+
+    assert index.search("helicopter", 5) == []
+    assert index.search("what is the", 5) == []
+
+
+def test_search_on_empty_transcript():
+    assert TranscriptIndex({}).search("car", 5) == []
+
+
+def test_selection_adds_neighbours_in_chunk_order():
+    transcript = chunks("quiet", "quiet", "quiet", "a dog barks", "quiet", "quiet", "a dog runs")
+
+    selected = select_relevant_chunks(transcript, "dog", top_k=2, neighbours=1)
+
+    assert list(selected) == [f"chunk_{index:03d}.json" for index in (2, 3, 4, 5, 6)]
+
+
+def test_selection_is_none_when_nothing_matches():
+    assert select_relevant_chunks(chunks("quiet", "empty street"), "helicopter", top_k=3, neighbours=1) is None
+
+
+def test_summary_questions_need_the_whole_transcript():
+    assert is_summary_question("Can you summarize this?")
+    assert is_summary_question("What happened overall")
+    assert not is_summary_question("What colour is the car near the gate?")